@@ -1,33 +1,97 @@
+from .circulation import MAX_BATCH_SIZE, renew_copies, return_copies
+from .forms import RenewBookForm
 from .models import Author, Genre, Book, BookInstance, Language
-from django.contrib import admin
+from .pagination import EstimatedCountPaginator
+from django.contrib import admin, messages
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
+from urllib.parse import urlencode
+from collections import Counter
+import datetime
 
 # Register your models here.
 
 
-class BooksInstanceInline(admin.TabularInline):
+class CappedInlineFormSet(BaseInlineFormSet):
+    """Inline formset editing at most max_shown objects, linking to the changelist for the others."""
+    max_shown = 20
+
+    def get_queryset(self):
+        if not hasattr(self, "_capped_queryset"):
+            queryset = super().get_queryset()
+            self.total_count = queryset.count()
+            # a stable order, so that the same objects are shown and then saved
+            ordering = queryset.query.order_by or self.model._meta.ordering
+            self._capped_queryset = queryset.order_by(*ordering, "pk")[:self.max_shown]
+        return self._capped_queryset
+
+    @property
+    def is_capped(self):
+        self.get_queryset()  # counts the objects
+        return self.total_count > self.max_shown
+
+    @property
+    def changelist_url(self):
+        opts = self.model._meta
+        url = reverse(f"admin:{opts.app_label}_{opts.model_name}_changelist")
+        return f"{url}?{urlencode({f'{self.fk.name}__id__exact': self.instance.pk})}"
+
+
+class CappedTabularInline(admin.TabularInline):
+    """Tabular inline showing at most max_shown objects, with a link to all of them."""
+    formset = CappedInlineFormSet
+    template = "admin/catalog/capped_tabular.html"
+    max_shown = 20
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.max_shown = self.max_shown
+        return formset
+
+
+class BooksInstanceInline(CappedTabularInline):
     model = BookInstance
     extra = 0
+    autocomplete_fields = ["borrower"]
 
 
-class BookInline(admin.TabularInline):
+class BookInline(CappedTabularInline):
     model = Book
     extra = 0
+    autocomplete_fields = ["language"]
 
 
 class AuthorAdmin(admin.ModelAdmin):
     list_display = ("last_name", "first_name", "date_of_birth", "date_of_death")
     fields = ["first_name", "last_name", ("date_of_birth", "date_of_death")]
+    search_fields = ["last_name", "first_name"]
     inlines = [BookInline]
 
 
 class BookAdmin(admin.ModelAdmin):
     list_display = ("title", "author", "display_genre")  # display_genre is a function!
+    list_select_related = ("author",)
+    search_fields = ["title", "isbn"]
+    autocomplete_fields = ["author", "language"]
     inlines = [BooksInstanceInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # display_genre uses the prefetched genres
+        return super().get_queryset(request).prefetch_related("genre")
 
 
 class BookInstanceAdmin(admin.ModelAdmin):
     list_display = ("book", "status", "borrower", "due_back", "id")
     list_filter = ("status", "due_back")
+    list_select_related = ("book", "borrower")
+    autocomplete_fields = ["book", "borrower"]
+    # unique, so the changelist does not add -pk, and served by the on-loan index when filtering loans
+    ordering = ("due_back", "id")
+    actions = ["renew_selected", "return_selected"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     fieldsets = (
         (None, {
@@ -38,12 +102,53 @@ class BookInstanceAdmin(admin.ModelAdmin):
         }),
     )
 
+    def has_mark_returned_permission(self, request):
+        return request.user.has_perm("catalog.can_mark_returned")
+
+    def report_results(self, request, results):
+        outcomes = Counter(result.outcome for result in results)
+        level = messages.SUCCESS if all(result.succeeded for result in results) else messages.WARNING
+        self.message_user(request, ", ".join(f"{count} {outcome}" for outcome, count in outcomes.items()), level)
+
+    def get_selected_ids(self, request, queryset):
+        """Returns the ids of the selected copies, or None (with an error message) if there are too many."""
+        copy_ids = list(queryset.values_list("pk", flat=True)[:MAX_BATCH_SIZE + 1])
+        if len(copy_ids) > MAX_BATCH_SIZE:
+            self.message_user(request, f"At most {MAX_BATCH_SIZE} copies can be processed at once.", messages.ERROR)
+            return None
+        return copy_ids
+
+    def renew_selected(self, request, queryset):
+        # renew for the default period of the renewal form
+        form = RenewBookForm(data={"renewal_date": datetime.date.today() + datetime.timedelta(weeks=3)})
+        if not form.is_valid():
+            self.message_user(request, form.errors["renewal_date"][0], messages.ERROR)
+            return
+        copy_ids = self.get_selected_ids(request, queryset)
+        if copy_ids is not None:
+            self.report_results(request, renew_copies(copy_ids, form.cleaned_data["renewal_date"]))
+
+    renew_selected.short_description = "Renew selected copies for 3 weeks"
+    renew_selected.allowed_permissions = ("mark_returned",)
+
+    def return_selected(self, request, queryset):
+        copy_ids = self.get_selected_ids(request, queryset)
+        if copy_ids is not None:
+            self.report_results(request, return_copies(copy_ids))
+
+    return_selected.short_description = "Mark selected copies as returned"
+    return_selected.allowed_permissions = ("mark_returned",)
+
+
+class LanguageAdmin(admin.ModelAdmin):
+    search_fields = ["name"]
+
 
 admin.site.register(Author, AuthorAdmin)
 admin.site.register(Book, BookAdmin)
 admin.site.register(BookInstance, BookInstanceAdmin)
 admin.site.register(Genre)
-admin.site.register(Language)
+admin.site.register(Language, LanguageAdmin)
 
 
 
@@ -0,0 +1,242 @@
+import datetime
+import json
+import uuid
+
+from django.contrib.auth.decorators import permission_required
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET, require_POST
+
+from .circulation import MAX_BATCH_SIZE, checkout_copies, return_copies
+from .forms import RenewBookForm
+from .instrumentation import query_budget
+from .models import Author, Book, BookInstance, Genre
+from .pagination import InvalidCursor, KeysetPaginator
+from .replicas import replica_reads
+
+# JSON endpoints of the catalog.
+#
+# The read endpoints mirror the catalog pages. They serialize rows straight from values() querysets, without
+# building model instances, and lists come as {"fields": [...], "rows": [[...], ...]} so that field names are
+# not repeated on every row. ?fields=a,b selects the fields; lists are paginated with keyset cursors
+# (?cursor=..., see catalog/pagination.py) and ?limit=.
+#
+# The circulation endpoints take a JSON object with the IDs of the copies ("copies") and answer with the
+# outcome for each of them, so that a client can tell which copies a conflicting request got first.
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# public field name: values() lookup
+BOOK_FIELDS = {
+    "id": "id",
+    "title": "title",
+    "isbn": "isbn",
+    "summary": "summary",
+    "author": "author_id",
+    "author_first_name": "author__first_name",
+    "author_last_name": "author__last_name",
+    "language": "language__name",
+}
+BOOK_LIST_FIELDS = ("id", "title", "author", "author_first_name", "author_last_name")
+AUTHOR_FIELDS = {
+    "id": "id",
+    "first_name": "first_name",
+    "last_name": "last_name",
+    "date_of_birth": "date_of_birth",
+    "date_of_death": "date_of_death",
+}
+AUTHOR_LIST_FIELDS = ("id", "first_name", "last_name")
+COPY_FIELDS = {
+    "id": "id",
+    "imprint": "imprint",
+    "status": "status",
+    "due_back": "due_back",
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _error(message, status=400):
+    return JsonResponse({"error": message}, status=status)
+
+
+def _json(data):
+    return JsonResponse(data, encoder=DjangoJSONEncoder, json_dumps_params={"separators": (",", ":")})
+
+
+def _select_fields(request, available, default):
+    """Returns the fields listed by ?fields=, or the default ones."""
+    if not request.GET.get("fields"):
+        return list(default)
+    fields = request.GET["fields"].split(",")
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}.")
+    return fields
+
+
+def _list(request, queryset, available, default, keys):
+    fields = _select_fields(request, available, default)
+    lookups = [available[name] for name in fields]
+    try:
+        limit = min(max(int(request.GET.get("limit", DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        raise BadRequest("limit must be a number.")
+
+    # the keys are fetched too, to build the cursors
+    rows = queryset.values(*dict.fromkeys([*lookups, *keys]))
+    try:
+        page = KeysetPaginator(rows, limit, keys).page(request.GET.get("cursor"))
+    except InvalidCursor:
+        raise BadRequest("Invalid cursor.")
+    return _json({
+        "fields": fields,
+        "rows": [[row[lookup] for lookup in lookups] for row in page.object_list],
+        "next": page.next_cursor,
+        "previous": page.previous_cursor,
+    })
+
+
+def _detail(request, queryset, available):
+    fields = _select_fields(request, available, available)
+    row = queryset.values_list(*[available[name] for name in fields]).first()
+    if row is None:
+        return None
+    return dict(zip(fields, row))
+
+
+def _not_found():
+    return _error("Not found.", status=404)
+
+
+@gzip_page
+@require_GET
+@replica_reads
+@query_budget(1)
+def book_list(request):
+    try:
+        return _list(request, Book.objects.all(), BOOK_FIELDS, BOOK_LIST_FIELDS, keys=("id",))
+    except BadRequest as error:
+        return _error(str(error))
+
+
+@gzip_page
+@require_GET
+@replica_reads
+@query_budget(2)
+def book_detail(request, pk):
+    """A book, with the names of its genres."""
+    try:
+        book = _detail(request, Book.objects.filter(pk=pk), BOOK_FIELDS)
+    except BadRequest as error:
+        return _error(str(error))
+    if book is None:
+        return _not_found()
+    book["genres"] = list(Genre.objects.filter(book__pk=pk).order_by("name").values_list("name", flat=True))
+    return _json(book)
+
+
+@gzip_page
+@require_GET
+@replica_reads
+@query_budget(2)
+def book_availability(request, pk):
+    """The copies of a book and how many of them are available."""
+    if not Book.objects.filter(pk=pk).exists():
+        return _not_found()
+    copies = list(BookInstance.objects.filter(book_id=pk).order_by("due_back", "id").values_list(*COPY_FIELDS.values()))
+    status_index = list(COPY_FIELDS).index("status")
+    return _json({
+        "book": pk,
+        "available": sum(copy[status_index] == "a" for copy in copies),
+        "copies": {"fields": list(COPY_FIELDS), "rows": copies},
+    })
+
+
+@gzip_page
+@require_GET
+@replica_reads
+@query_budget(1)
+def author_list(request):
+    try:
+        return _list(request, Author.objects.all(), AUTHOR_FIELDS, AUTHOR_LIST_FIELDS, keys=("last_name", "first_name", "id"))
+    except BadRequest as error:
+        return _error(str(error))
+
+
+@gzip_page
+@require_GET
+@replica_reads
+@query_budget(2)
+def author_detail(request, pk):
+    """An author, with the ids and titles of their books."""
+    try:
+        author = _detail(request, Author.objects.filter(pk=pk), AUTHOR_FIELDS)
+    except BadRequest as error:
+        return _error(str(error))
+    if author is None:
+        return _not_found()
+    author["books"] = {"fields": ["id", "title"], "rows": list(Book.objects.filter(author_id=pk).order_by("title", "id").values_list("id", "title"))}
+    return _json(author)
+
+
+def _read_batch(request):
+    """Returns the JSON object of the request body and the copy IDs it lists."""
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except ValueError:
+        raise BadRequest("The request body must be a JSON object.")
+    if not isinstance(payload, dict) or not isinstance(payload.get("copies"), list):
+        raise BadRequest("Expected a JSON object with a list of copy IDs in 'copies'.")
+    if len(payload["copies"]) > MAX_BATCH_SIZE:
+        raise BadRequest(f"At most {MAX_BATCH_SIZE} copies can be processed at once.")
+    try:
+        copy_ids = [uuid.UUID(str(copy_id)) for copy_id in payload["copies"]]
+    except ValueError:
+        raise BadRequest("Invalid copy ID.")
+    return payload, copy_ids
+
+
+def _results_response(results):
+    return JsonResponse({
+        "results": [{"id": result.copy_id, "outcome": result.outcome, "title": result.title} for result in results],
+        "succeeded": sum(result.succeeded for result in results),
+    })
+
+
+@require_POST
+@permission_required("catalog.can_mark_returned", raise_exception=True)
+def checkout(request):
+    """Lends copies to a borrower: {"copies": [...], "borrower": username, "due_back": optional ISO date}."""
+    try:
+        payload, copy_ids = _read_batch(request)
+    except BadRequest as error:
+        return _error(str(error))
+
+    borrower = User.objects.filter(username=payload.get("borrower") or "").first()
+    if borrower is None:
+        return _error("Unknown borrower.")
+
+    # the due date follows the renewal rules, defaulting to 3 weeks from today
+    form = RenewBookForm(data={"renewal_date": payload.get("due_back") or datetime.date.today() + datetime.timedelta(weeks=3)})
+    if not form.is_valid():
+        return _error(form.errors["renewal_date"][0])
+
+    return _results_response(checkout_copies(copy_ids, borrower, form.cleaned_data["renewal_date"]))
+
+
+@require_POST
+@permission_required("catalog.can_mark_returned", raise_exception=True)
+def checkin(request):
+    """Marks copies as returned: {"copies": [...]}."""
+    try:
+        _, copy_ids = _read_batch(request)
+    except BadRequest as error:
+        return _error(str(error))
+
+    return _results_response(return_copies(copy_ids))
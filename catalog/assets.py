@@ -0,0 +1,329 @@
+import os
+import re
+import tempfile
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+
+# Stylesheet build.
+#
+# The stylesheets of CATALOG_STYLESHEETS (Bootstrap, vendored in catalog/static/vendor, and
+# catalog/static/css/styles.css) are built into two files by StylesheetFinder, which collectstatic runs like
+# the other finders:
+#
+# - css/site.css: the rules of the stylesheets, in their order, without the ones for classes that no template
+#   of the project uses (Bootstrap has rules for hundreds of classes, the templates use about fifteen).
+# - css/critical.css: the part of css/site.css needed by the page layout of CATALOG_CRITICAL_TEMPLATES
+#   (base_generic.html), which the {% stylesheets %} tag inlines in the pages so that they are rendered
+#   without waiting for css/site.css, which is then loaded without blocking.
+#
+# CompressedManifestStaticFilesStorage gives css/site.css a hashed name, which WhiteNoise serves with
+# far-future cache headers, and stores gzip and brotli (with the Brotli package) compressed copies of it.
+# Classes are found in the class attributes of the templates: a class only set through a variable has to be
+# added to CATALOG_CSS_SAFELIST.
+
+SITE_STYLESHEET = "css/site.css"
+CRITICAL_STYLESHEET = "css/critical.css"
+TEMPLATE_EXTENSIONS = (".html", ".txt")
+
+# a selector, at-rule or comment and its body: the declarations of a style rule, the nested rules of
+# @media and @supports, the raw content of other at-rules, or None for comments and statements (@import)
+Rule = namedtuple("Rule", "prelude body")
+
+NESTED_AT_RULE = re.compile(r"@(media|supports)\b")
+KEYFRAMES = re.compile(r"@(?:-[a-z]+-)?keyframes\s+([\w-]+)")
+STRING = re.compile(r""""(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'""")
+COMMENT = re.compile(r"/\*.*?\*/", re.S)
+CLASS = re.compile(r"\.(-?[_a-zA-Z][\w-]*)")
+ATTRIBUTE_SELECTOR = re.compile(r"\[[^\]]*\]")
+NOT_PSEUDO_CLASS = re.compile(r":not\((?:[^()]|\([^()]*\))*\)")
+CLASS_ATTRIBUTE = re.compile(r"""\bclass\s*=\s*(["'])(.*?)\1""", re.S)
+TEMPLATE_SYNTAX = re.compile(r"{%.*?%}|{{.*?}}|{#.*?#}", re.S)
+
+
+def stylesheet_sources():
+    return getattr(settings, "CATALOG_STYLESHEETS", ["css/styles.css"])
+
+
+def critical_templates():
+    return getattr(settings, "CATALOG_CRITICAL_TEMPLATES", ["base_generic.html"])
+
+
+def css_safelist():
+    return set(getattr(settings, "CATALOG_CSS_SAFELIST", ()))
+
+
+# Parsing
+
+
+def _find(css, index, stops):
+    """Returns the index of the first stops character from index, outside of strings, comments and brackets."""
+    depth = 0
+    while index < len(css):
+        char = css[index]
+        if char in "\"'":
+            match = STRING.match(css, index)
+            index = match.end() if match else len(css)
+            continue
+        if css.startswith("/*", index):
+            end = css.find("*/", index + 2)
+            index = len(css) if end < 0 else end + 2
+            continue
+        if depth == 0 and char in stops:
+            return index
+        if char in "({[":
+            depth += 1
+        elif char in ")}]":
+            depth -= 1
+        index += 1
+    return len(css)
+
+
+def _minify(text, pattern=r"\s*([;:,>{}])\s*"):
+    """Removes the comments and the unneeded whitespace of a selector or declarations, outside of strings."""
+    parts, start = [], 0
+    for match in STRING.finditer(text):
+        parts.append(text[start:match.start()])
+        parts.append(match.group())
+        start = match.end()
+    parts.append(text[start:])
+    for index in range(0, len(parts), 2):
+        part = re.sub(r"\s+", " ", COMMENT.sub(" ", parts[index]))
+        parts[index] = re.sub(pattern, r"\1", part) if pattern else part
+    return "".join(parts).strip().rstrip(";")
+
+
+def parse(css):
+    """Returns the rules of a stylesheet. Comments are dropped, except for /*! ones (licenses)."""
+    rules = []
+    index = 0
+    while index < len(css):
+        if css[index].isspace():
+            index += 1
+            continue
+        if css.startswith("/*", index):
+            end = css.find("*/", index + 2)
+            end = len(css) if end < 0 else end + 2
+            if css.startswith("/*!", index):
+                rules.append(Rule(css[index:end], None))
+            index = end
+            continue
+        end = _find(css, index, "{;")
+        prelude = css[index:end]
+        if end == len(css) or css[end] == ";":
+            # a statement such as @charset or @import
+            if prelude.strip():
+                rules.append(Rule(_minify(prelude, pattern=None), None))
+            index = end + 1
+            continue
+        close = _find(css, end + 1, "}")
+        body = css[end + 1:close]
+        if prelude.lstrip().startswith("@"):
+            # spaces are significant in media queries: "screen and (...)"
+            prelude = _minify(prelude, pattern=None)
+            body = parse(body) if NESTED_AT_RULE.match(prelude) else _minify(body)
+        else:
+            # combinators (" ") are too, unlike the spaces around ","
+            prelude = _minify(prelude, pattern=r"\s*([,>])\s*")
+            body = _minify(body, pattern=r"\s*([;:,])\s*")
+        rules.append(Rule(prelude, body))
+        index = close + 1
+    return rules
+
+
+def serialize(rules):
+    parts = []
+    for rule in rules:
+        if rule.body is None:
+            parts.append(rule.prelude + "\n" if rule.prelude.startswith("/*") else rule.prelude + ";")
+        elif isinstance(rule.body, list):
+            parts.append(f"{rule.prelude}{{{serialize(rule.body)}}}")
+        else:
+            parts.append(f"{rule.prelude}{{{rule.body}}}")
+    return "".join(parts)
+
+
+# Tree shaking
+
+
+def _split_selectors(prelude):
+    selectors = []
+    start = 0
+    while start <= len(prelude):
+        end = _find(prelude, start, ",")
+        if prelude[start:end]:
+            selectors.append(prelude[start:end])
+        start = end + 1
+    return selectors
+
+
+def selector_classes(selector):
+    """Returns the classes an element must have to match the selector."""
+    # :not(.disabled) also matches elements without the class, and attribute selectors can contain dots
+    return set(CLASS.findall(ATTRIBUTE_SELECTOR.sub("", NOT_PSEUDO_CLASS.sub("", selector))))
+
+
+def _declarations(rules):
+    for rule in rules:
+        if isinstance(rule.body, list):
+            yield from _declarations(rule.body)
+        elif rule.body is not None and not rule.prelude.startswith("@"):
+            yield rule.body
+
+
+def _without_unused_keyframes(rules, declarations):
+    kept = []
+    for rule in rules:
+        if isinstance(rule.body, list):
+            body = _without_unused_keyframes(rule.body, declarations)
+            if body:
+                kept.append(Rule(rule.prelude, body))
+            continue
+        match = KEYFRAMES.match(rule.prelude)
+        if match is None or re.search(rf"(?<![\w-]){re.escape(match.group(1))}(?![\w-])", declarations):
+            kept.append(rule)
+    return kept
+
+
+def _shake(rules, classes):
+    kept = []
+    for rule in rules:
+        if isinstance(rule.body, list):
+            body = _shake(rule.body, classes)
+            if body:
+                kept.append(Rule(rule.prelude, body))
+        elif rule.body is None or rule.prelude.startswith("@"):
+            kept.append(rule)
+        else:
+            selectors = [selector for selector in _split_selectors(rule.prelude) if selector_classes(selector) <= classes]
+            if selectors:
+                kept.append(Rule(",".join(selectors), rule.body))
+    return kept
+
+
+def shake(rules, classes):
+    """Returns the rules without the selectors needing a class that is not in classes, and the animations
+    that are left unused."""
+    kept = _shake(rules, classes)
+    return _without_unused_keyframes(kept, " ".join(_declarations(kept)))
+
+
+# Templates
+
+
+def _template_dirs():
+    """The template directories of the project, leaving out those of Django and other installed packages."""
+    base_dir = os.path.join(os.path.abspath(settings.BASE_DIR), "")
+    return [
+        directory
+        for engine in engines.all() if isinstance(engine, DjangoTemplates)
+        for directory in engine.template_dirs
+        if os.path.abspath(directory).startswith(base_dir) and os.path.isdir(directory)
+    ]
+
+
+def template_paths(names=None):
+    """Returns the paths of the templates of the project, or of the ones with the given names."""
+    paths = {}
+    for directory in _template_dirs():
+        for root, _, files in os.walk(directory):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                name = os.path.relpath(path, directory).replace(os.sep, "/")
+                # the first directory wins, as for the template loaders
+                if file_name.endswith(TEMPLATE_EXTENSIONS) and (names is None or name in names):
+                    paths.setdefault(name, path)
+    return sorted(paths.values())
+
+
+def template_classes(paths):
+    """Returns the classes named in the class attributes of the given templates."""
+    classes = set()
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            content = file.read()
+        for match in CLASS_ATTRIBUTE.finditer(content):
+            # class="{% if overdue %}text-danger{% endif %}"
+            classes.update(TEMPLATE_SYNTAX.sub(" ", match.group(2)).split())
+    return classes
+
+
+# Build
+
+
+def _source_paths():
+    paths = []
+    for name in stylesheet_sources():
+        path = finders.find(name)
+        if path is None:
+            raise FileNotFoundError(f"Could not find the stylesheet {name} (see CATALOG_STYLESHEETS).")
+        paths.append(path)
+    return paths
+
+
+def build():
+    """Returns {name: content} of the built stylesheets."""
+    rules = []
+    for path in _source_paths():
+        with open(path, encoding="utf-8") as file:
+            rules.extend(parse(file.read()))
+    site = shake(rules, template_classes(template_paths()) | css_safelist())
+    critical = shake(site, template_classes(template_paths(critical_templates())) | css_safelist())
+    return {SITE_STYLESHEET: serialize(site), CRITICAL_STYLESHEET: serialize(critical)}
+
+
+class StylesheetFinder(finders.BaseFinder):
+    """Finds the built stylesheets, written to a directory of their own.
+
+    They are built again when a source stylesheet or a template changes, so that the development server
+    serves them up to date.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.storage = FileSystemStorage(location=os.path.join(tempfile.gettempdir(), "locallibrary_stylesheets"))
+        self._built = None
+
+    def check(self, **kwargs):
+        return []
+
+    def _build(self):
+        paths = _source_paths() + template_paths()
+        signature = [(path, os.stat(path).st_mtime_ns) for path in paths]
+        if signature != self._built:
+            for name, content in build().items():
+                if self.storage.exists(name):
+                    self.storage.delete(name)
+                self.storage.save(name, ContentFile(content.encode("utf-8")))
+            self._built = signature
+
+    def find(self, path, all=False):
+        if path not in (SITE_STYLESHEET, CRITICAL_STYLESHEET):
+            return []
+        self._build()
+        return [self.storage.path(path)] if all else self.storage.path(path)
+
+    def list(self, ignore_patterns):
+        self._build()
+        for name in (SITE_STYLESHEET, CRITICAL_STYLESHEET):
+            yield name, self.storage
+
+
+_critical_css = None
+
+
+def critical_css():
+    """Returns the CSS to inline in the pages: the collected one, or the one built by the finder with DEBUG."""
+    global _critical_css
+    if settings.DEBUG:
+        with open(finders.find(CRITICAL_STYLESHEET), encoding="utf-8") as file:
+            return file.read()
+    if _critical_css is None:
+        with staticfiles_storage.open(CRITICAL_STYLESHEET) as file:
+            _critical_css = file.read().decode("utf-8")
+    return _critical_css
@@ -0,0 +1,173 @@
+import datetime
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, QueryDict
+from django.utils import timezone
+
+from .replicas import read_from_primary
+
+# Cache versions for the catalog pages.
+#
+# Cached content is stored under keys that include version tokens: one per book ("book:<pk>") and per
+# author ("author:<pk>"), and one per list page ("books", "authors"). The signal receivers in
+# catalog/signals.py replace the tokens whenever the content they cover changes, so stale entries are simply
+# never looked up again and expire on their own. Tokens are random rather than counters so that a token
+# evicted from the cache cannot come back with an old value and revive stale entries. Tokens are replaced once
+# the transaction making the change commits: replaced earlier, a concurrent request could still read the data
+# from before the change and cache it under the new token.
+#
+# Tokens also record when they were made, which gives the ETag and Last-Modified validators of the pages
+# (see catalog/conditional.py) without a database query. Besides the names above, "loans" covers the lists of
+# borrowed books.
+
+VERSION_KEY = "catalog:{}:version"
+PAGE_KEY = "catalog:page:{}"
+
+# response headers stored along with cached pages
+CACHED_HEADERS = ("ETag", "Last-Modified")
+
+
+def fragment_timeout():
+    return getattr(settings, "CATALOG_FRAGMENT_CACHE_TIMEOUT", 60 * 60)
+
+
+def page_timeout():
+    return getattr(settings, "CATALOG_PAGE_CACHE_TIMEOUT", 10 * 60)
+
+
+def _new_version():
+    # the time in microseconds, in hexadecimal, and a random part
+    return f"{time.time_ns() // 1000:x}-{uuid.uuid4().hex[:8]}"
+
+
+def version_time(version):
+    """Returns when a version token was made, or now for a token in another format."""
+    microseconds, separator, _ = version.partition("-")
+    try:
+        if separator:
+            return datetime.datetime.fromtimestamp(int(microseconds, 16) / 1000000, datetime.timezone.utc)
+    except (ValueError, OverflowError):
+        pass
+    return timezone.now()
+
+
+def get_versions(names, create=True):
+    """Returns the current version tokens of the given names, in order.
+
+    Names without a token get a new one, or None with create=False: the pages only make the tokens of what
+    they have found (see add_versions()), so that requests for books or authors that do not exist leave no
+    tokens behind.
+    """
+    keys = [VERSION_KEY.format(name) for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions and create:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+    return [versions.get(key) for key in keys]
+
+
+def add_versions(request, names, versions):
+    """Completes versions read with create=False once the request has found the content they cover.
+
+    Makes tokens for the names without one, and returns the completed versions, or None if a change or
+    another request made one of the tokens meanwhile: the content read before could be older than that token.
+    The tokens made are kept on the request, for the page cache and the validators of the same page.
+    """
+    made = getattr(request, "catalog_versions", None)
+    if made is None:
+        made = request.catalog_versions = {}
+    versions = list(versions)
+    for index, name in enumerate(names):
+        if versions[index] is None:
+            if name not in made:
+                version = _new_version()
+                made[name] = version if cache.add(VERSION_KEY.format(name), version, None) else None
+            versions[index] = made[name]
+            if versions[index] is None:
+                return None
+    return versions
+
+
+def bump_versions(names):
+    """Invalidates everything cached under the given names, once the current transaction commits."""
+    keys = [VERSION_KEY.format(name) for name in names]
+    if keys:
+        transaction.on_commit(lambda: cache.set_many({key: _new_version() for key in keys}, None))
+
+
+def get_book_version(book_id, create=True):
+    """Returns the current cache version token of a book (see get_versions())."""
+    return get_versions([f"book:{book_id}"], create)[0]
+
+
+def bump_book_versions(book_ids):
+    """Invalidates the cached pages and fragments of the given books."""
+    bump_versions([f"book:{book_id}" for book_id in book_ids if book_id is not None])
+
+
+def bump_author_versions(author_ids):
+    """Invalidates the cached pages of the given authors."""
+    bump_versions([f"author:{author_id}" for author_id in author_ids if author_id is not None])
+
+
+class PageCacheMixin:
+    """Caches whole responses of a view for anonymous visitors.
+
+    Responses vary by user and permissions (see the sidebar of base_generic.html), so authenticated requests
+    are never cached. page_cache_versions lists the version names the page depends on, formatted with the
+    URL keyword arguments, e.g. ("book:{pk}",). Only the query parameters listed in page_cache_query are part
+    of the key, and the view only sees those, so that made-up query strings cannot fill the cache with copies
+    of the same page. The X-Page-Cache header of the responses (hit or miss) is
+    counted by the request metrics (see catalog/metrics.py).
+    """
+    page_cache_versions = ()
+    page_cache_query = ("page", "cursor", "q")
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+
+        query = QueryDict(mutable=True)
+        for name in self.page_cache_query:
+            if name in request.GET:
+                query.setlist(name, request.GET.getlist(name))
+        request.GET = QueryDict(query.urlencode())
+
+        def page_key(versions):
+            digest = hashlib.md5(":".join([request.path, request.GET.urlencode(), *versions]).encode()).hexdigest()
+            return PAGE_KEY.format(digest)
+
+        names = [name.format(**kwargs) for name in self.page_cache_versions]
+        versions = get_versions(names, create=False)
+        # nothing can be cached under a token that does not exist yet
+        cached = None if None in versions else cache.get(page_key(versions))
+        if cached is not None:
+            content, content_type, headers = cached
+            response = HttpResponse(content, content_type=content_type)
+            for header, value in headers.items():
+                response[header] = value
+            response["X-Page-Cache"] = "hit"
+            return response
+
+        read_from_primary()
+        response = super().dispatch(request, *args, **kwargs)
+        response["X-Page-Cache"] = "miss"
+        if response.status_code == 200 and not response.cookies:
+            def store(rendered):
+                page_versions = add_versions(request, names, versions)
+                if page_versions is None:
+                    return
+                headers = {header: rendered[header] for header in CACHED_HEADERS if rendered.has_header(header)}
+                cache.set(page_key(page_versions), (rendered.content, rendered["Content-Type"], headers), page_timeout())
+
+            if hasattr(response, "add_post_render_callback"):
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+        return response
@@ -0,0 +1,121 @@
+from django.db import connections, router, transaction
+
+from .models import BookInstance
+from .signals import catalog_changed_in_bulk
+
+# Batch operations of the circulation desk.
+#
+# Renewals and returns lock the selected copies, apply a single conditional UPDATE to those it applies to (the
+# condition is checked again by the UPDATE itself) and report an outcome for every selected copy. Checkouts
+# are a single conditional UPDATE of the selected copies that are available (status available -> on loan),
+# which tells which copies this request got, so two staff members can never lend the same copy: the copies
+# it changed are returned by the UPDATE on PostgreSQL. Elsewhere (SQLite, which serializes its writes), each
+# copy gets its own conditional UPDATE, whose row count tells. Being single statements, concurrent batches
+# cannot deadlock by locking their copies in different orders.
+# The model signals are bypassed, so catalog_changed_in_bulk is sent once the transaction is done.
+
+# the most copies processed by one batch operation
+MAX_BATCH_SIZE = 500
+
+CHECKED_OUT = "checked out"
+RENEWED = "renewed"
+RETURNED = "returned"
+NOT_AVAILABLE = "not available"
+NOT_ON_LOAN = "not on loan"
+NOT_FOUND = "not found"
+
+
+class CopyResult:
+    """The outcome of a batch operation for one selected copy."""
+
+    def __init__(self, copy_id, outcome, title=None):
+        self.copy_id = copy_id
+        self.outcome = outcome
+        self.title = title
+
+    def __repr__(self):
+        return f"<CopyResult {self.copy_id}: {self.outcome}>"
+
+    @property
+    def succeeded(self):
+        return self.outcome in (CHECKED_OUT, RENEWED, RETURNED)
+
+
+def _apply(copy_ids, outcome, changes):
+    copy_ids = list(dict.fromkeys(copy_ids))
+    with transaction.atomic():
+        rows = {
+            row["pk"]: row
+            for row in BookInstance.objects.select_for_update(of=("self",)).filter(pk__in=copy_ids).order_by()
+            .values("pk", "status", "book_id", "book__title")
+        }
+        on_loan = [copy_id for copy_id, row in rows.items() if row["status"] == "o"]
+        if on_loan:
+            BookInstance.objects.filter(pk__in=on_loan, status__exact="o").update(**changes)
+
+    if on_loan:
+        statistics = {"num_instances_available": len(on_loan)} if changes.get("status") == "a" else {}
+        catalog_changed_in_bulk.send(sender=BookInstance, book_ids={rows[copy_id]["book_id"] for copy_id in on_loan}, statistics=statistics)
+
+    results = []
+    for copy_id in copy_ids:
+        row = rows.get(copy_id)
+        if row is None:
+            results.append(CopyResult(copy_id, NOT_FOUND))
+        else:
+            results.append(CopyResult(copy_id, outcome if row["status"] == "o" else NOT_ON_LOAN, row["book__title"]))
+    return results
+
+
+def renew_copies(copy_ids, renewal_date):
+    """Moves the due date of the given copies on loan to renewal_date, returning a CopyResult per copy."""
+    return _apply(copy_ids, RENEWED, {"due_back": renewal_date})
+
+
+def return_copies(copy_ids):
+    """Marks the given copies on loan as returned (available, without borrower), returning a CopyResult per copy."""
+    return _apply(copy_ids, RETURNED, {"status": "a", "due_back": None, "borrower": None})
+
+
+def _check_out(copy_ids, borrower, due_back, using):
+    """Lends the available copies among copy_ids, returning the ids of the copies it lent."""
+    if connections[using].vendor == "postgresql":
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "UPDATE catalog_bookinstance SET status = 'o', borrower_id = %s, due_back = %s "
+                "WHERE id = ANY(%s::uuid[]) AND status = 'a' RETURNING id",
+                [borrower.pk, due_back, copy_ids],
+            )
+            return {row[0] for row in cursor.fetchall()}
+    copies = BookInstance.objects.using(using)
+    return {
+        copy_id for copy_id in copy_ids
+        if copies.filter(pk=copy_id, status__exact="a").update(status="o", borrower=borrower, due_back=due_back)
+    }
+
+
+def checkout_copies(copy_ids, borrower, due_back):
+    """Lends the given available copies to borrower until due_back, returning a CopyResult per copy."""
+    copy_ids = list(dict.fromkeys(copy_ids))
+    using = router.db_for_write(BookInstance)
+    with transaction.atomic(using=using):
+        checked_out = _check_out(copy_ids, borrower, due_back, using)
+        rows = {
+            row["pk"]: row
+            for row in BookInstance.objects.using(using).filter(pk__in=copy_ids).order_by().values("pk", "book_id", "book__title")
+        }
+
+    if checked_out:
+        catalog_changed_in_bulk.send(
+            sender=BookInstance, book_ids={rows[copy_id]["book_id"] for copy_id in checked_out},
+            statistics={"num_instances_available": -len(checked_out)},
+        )
+
+    results = []
+    for copy_id in copy_ids:
+        row = rows.get(copy_id)
+        if row is None:
+            results.append(CopyResult(copy_id, NOT_FOUND))
+        else:
+            results.append(CopyResult(copy_id, CHECKED_OUT if copy_id in checked_out else NOT_AVAILABLE, row["book__title"]))
+    return results
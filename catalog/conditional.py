@@ -0,0 +1,82 @@
+import calendar
+import hashlib
+
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from django.views.generic.detail import SingleObjectMixin
+
+from .cache import add_versions, get_versions, version_time
+from .replicas import current_replica
+
+
+class ConditionalGetMixin:
+    """Answers If-None-Match / If-Modified-Since requests with 304 Not Modified before the view does any work.
+
+    The ETag and Last-Modified of a page come from the cache version tokens named by watermark_versions,
+    formatted with the URL keyword arguments like page_cache_versions (see catalog/cache.py), without a
+    database query. The signal receivers in catalog/signals.py replace the tokens whenever something shown on
+    the page changes. Pages also vary by user and their permissions (see the sidebar of base_generic.html), so
+    the ETag includes both. Tokens are only made once the page has been found, and detail pages are only
+    answered with 304 Not Modified once their object has been found. Pages read from a replica, which may lag
+    behind the tokens, are sent without validators.
+    """
+    watermark_versions = ()
+    # set for pages that also depend on today's date (e.g. overdue loans), so that they change at midnight
+    watermark_daily = False
+
+    def get_watermark_names(self):
+        return [name.format(**self.kwargs) for name in self.watermark_versions]
+
+    def compute_validators(self, versions):
+        """Returns the (ETag, Last-Modified timestamp) of the page, or None while one of the tokens is missing."""
+        if None in versions:
+            return None
+        watermark = max(version_time(version) for version in versions)
+        if self.watermark_daily:
+            watermark = max(watermark, timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0))
+        user = self.request.user
+        if user.is_authenticated:
+            user_key = f"{user.pk}:{','.join(sorted(user.get_all_permissions()))}"
+        else:
+            user_key = "anonymous"
+        etag = quote_etag(hashlib.md5(":".join([*versions, watermark.isoformat(), user_key]).encode()).hexdigest())
+        return etag, calendar.timegm(watermark.utctimetuple())
+
+    def object_exists(self):
+        """Whether the object of a detail page exists; checked before answering 304 Not Modified for it."""
+        if not isinstance(self, SingleObjectMixin):
+            return True
+        return self.get_queryset().filter(pk=self.kwargs.get(self.pk_url_kwarg)).exists()
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in ("GET", "HEAD") and ("HTTP_IF_NONE_MATCH" in request.META or "HTTP_IF_MODIFIED_SINCE" in request.META):
+            validators = self.compute_validators(get_versions(self.get_watermark_names(), create=False))
+            if validators is not None and self.object_exists():
+                etag, last_modified = validators
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is not None:
+                    return response
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        # not reached when the page cache answers (the cached page keeps the validators it was rendered with);
+        # the versions are read before the page content so that they can never be newer than the content
+        names = self.get_watermark_names()
+        versions = get_versions(names, create=False)
+        from_replica = current_replica() is not None
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200 and not from_replica:
+            def set_validators(rendered):
+                page_versions = add_versions(request, names, versions)
+                if page_versions is not None:
+                    etag, last_modified = self.compute_validators(page_versions)
+                    rendered["ETag"] = etag
+                    rendered["Last-Modified"] = http_date(last_modified)
+
+            if hasattr(response, "add_post_render_callback"):
+                response.add_post_render_callback(set_validators)
+            else:
+                set_validators(response)
+        return response
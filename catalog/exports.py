@@ -0,0 +1,71 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Author, Book, BookInstance
+
+# Streaming exports of the catalog and circulation data.
+#
+# Rows are read with values() and iterator(chunk_size=...), which uses a server-side cursor on PostgreSQL, and
+# are encoded one at a time, so memory use does not depend on the size of the table and the first rows can
+# be sent while the rest are still being read.
+
+CHUNK_SIZE = 2000
+FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+def _books():
+    return Book.objects.order_by("id").values(
+        "id", "title", "isbn", "summary", "author_id", "author__first_name", "author__last_name", "language__name",
+    )
+
+
+def _authors():
+    return Author.objects.order_by("id").values("id", "first_name", "last_name", "date_of_birth", "date_of_death")
+
+
+def _copies():
+    return BookInstance.objects.order_by("id").values(
+        "id", "book_id", "book__title", "imprint", "status", "due_back", "borrower__username",
+    )
+
+
+def _borrowed():
+    # the rows of the "all borrowed books" page
+    return BookInstance.objects.filter(status__exact="o").order_by("due_back", "id").values(
+        "id", "book_id", "book__title", "due_back", "borrower__username",
+    )
+
+
+DATASETS = {
+    "books": _books,
+    "authors": _authors,
+    "copies": _copies,
+    "borrowed": _borrowed,
+}
+
+
+class _Echo:
+    """File-like object handing back what csv.writer writes to it, so that each row can be yielded."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(dataset, file_format):
+    """Yields the dataset ("books", "authors", "copies" or "borrowed") encoded as CSV or JSON Lines, row by row."""
+    queryset = DATASETS[dataset]()
+    rows = queryset.iterator(chunk_size=CHUNK_SIZE)
+    if file_format == "csv":
+        writer = csv.writer(_Echo())
+        fields = list(queryset.query.values_select)
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow(["" if row[field] is None else row[field] for field in fields])
+    else:
+        encoder = DjangoJSONEncoder(separators=(",", ":"))
+        for row in rows:
+            yield encoder.encode(row) + "\n"
@@ -2,6 +2,9 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext_lazy as _
 import datetime
+import uuid
+
+from .circulation import MAX_BATCH_SIZE
 
 class RenewBookForm(forms.Form):
     renewal_date = forms.DateField(help_text="Enter a date between now and 4 weeks (default 3).")
@@ -18,4 +21,44 @@ class RenewBookForm(forms.Form):
             raise ValidationError(_('Invalid date - renewal more than 4 weeks ahead'))
 
         # Remember to always return the cleaned data
-        return data
\ No newline at end of file
+        return data
+
+
+class BatchCirculationForm(RenewBookForm):
+    """Renews or returns several copies at once; the renewal date follows the RenewBookForm rules."""
+    RENEW = "renew"
+    RETURN = "return"
+
+    action = forms.ChoiceField(choices=((RENEW, "Renew"), (RETURN, "Return")))
+    copies = forms.CharField(widget=forms.Textarea(attrs={"rows": 10}), help_text="Enter the IDs of the copies, one per line.")
+    field_order = ["action", "copies", "renewal_date"]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # only needed to renew
+        self.fields["renewal_date"].required = False
+
+    def clean_renewal_date(self):
+        if self.cleaned_data.get("renewal_date") is None:
+            return None
+        return super().clean_renewal_date()
+
+    def clean_copies(self):
+        copy_ids = []
+        invalid = []
+        for value in self.cleaned_data["copies"].split():
+            try:
+                copy_ids.append(uuid.UUID(value))
+            except ValueError:
+                invalid.append(value)
+        if invalid:
+            raise ValidationError(_('Invalid copy IDs: %(ids)s'), params={"ids": ", ".join(invalid)})
+        if len(copy_ids) > MAX_BATCH_SIZE:
+            raise ValidationError(_('At most %(max)d copies can be processed at once.'), params={"max": MAX_BATCH_SIZE})
+        return copy_ids
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get("action") == self.RENEW and cleaned_data.get("renewal_date") is None and "renewal_date" not in self.errors:
+            self.add_error("renewal_date", _("Enter the date to renew the copies to."))
+        return cleaned_data
@@ -0,0 +1,169 @@
+import heapq
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import record_request
+
+# Per-request instrumentation.
+#
+# InstrumentationMiddleware wraps the database connections with a QueryRecorder for the duration of each
+# request and times the rendering of template responses. The figures are sent back in a Server-Timing
+# header, which the browser developer tools show next to the request, to staff users or to everyone with
+# CATALOG_SERVER_TIMING (DEBUG by default), and logged as one JSON line for a sample of the requests (and for
+# every slow or over-budget request) by the "catalog.instrumentation" logger.
+#
+# Views can declare the most queries they should need, with a query_budget attribute on class-based views or
+# the @query_budget decorator on functions. Going over the budget is logged, and raises QueryBudgetExceeded
+# when CATALOG_ENFORCE_QUERY_BUDGETS is set (as it is by locallibrary/test_settings.py), so that an N+1 query
+# pattern fails the tests of the view. Streamed responses run their queries after the middleware is done, so
+# only the queries made before streaming starts are counted.
+#
+# Every request is also added to the metrics of its URL name (see catalog/metrics.py).
+
+logger = logging.getLogger("catalog.instrumentation")
+
+SLOWEST_STATEMENTS = 3
+MAX_SQL_LENGTH = 300
+
+
+def sample_rate():
+    return getattr(settings, "CATALOG_INSTRUMENTATION_SAMPLE_RATE", 0.01)
+
+
+def server_timing(request):
+    """Whether to send the Server-Timing header, which tells how long the queries and templates took."""
+    if getattr(settings, "CATALOG_SERVER_TIMING", settings.DEBUG):
+        return True
+    user = getattr(request, "user", None)
+    return user is not None and user.is_staff
+
+
+def slow_request_ms():
+    return getattr(settings, "CATALOG_SLOW_REQUEST_MS", 500)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(num_queries):
+    """Declares the most queries a function view should run per request."""
+    def decorator(view_func):
+        view_func.query_budget = num_queries
+        return view_func
+    return decorator
+
+
+def get_query_budget(view_func):
+    view_class = getattr(view_func, "view_class", None)
+    return getattr(view_class or view_func, "query_budget", None)
+
+
+class QueryRecorder:
+    """Database execute wrapper counting the queries, the time spent running them and the slowest ones."""
+
+    def __init__(self, keep_slowest=0):
+        self.count = 0
+        self.duration = 0.0
+        self.keep_slowest = keep_slowest
+        # a min-heap of (duration, sql)
+        self._slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.duration += duration
+            self.count += 1
+            if len(self._slowest) < self.keep_slowest:
+                heapq.heappush(self._slowest, (duration, sql))
+            elif self.keep_slowest and duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, (duration, sql))
+
+    @property
+    def slowest(self):
+        """The (duration, sql) of the slowest statements, slowest first."""
+        return sorted(self._slowest, reverse=True)
+
+
+@contextmanager
+def record_queries(recorder):
+    """Wraps every database connection (the primary and its replicas) with the recorder."""
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(keep_slowest=SLOWEST_STATEMENTS)
+        request._template_duration = 0.0
+        started = time.perf_counter()
+        with record_queries(recorder):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        record_request(request, response, duration, recorder.duration, recorder.count)
+
+        if server_timing(request):
+            response["Server-Timing"] = self.server_timing(recorder, request._template_duration, duration)
+
+        budget = getattr(request, "_query_budget", None)
+        over_budget = budget is not None and recorder.count > budget
+        if over_budget or duration * 1000 >= slow_request_ms() or random.random() < sample_rate():
+            self.log(request, response, recorder, duration, budget, over_budget)
+        if over_budget and getattr(settings, "CATALOG_ENFORCE_QUERY_BUDGETS", False):
+            statements = "\n".join(f"  {sql[:MAX_SQL_LENGTH]}" for _, sql in recorder.slowest)
+            raise QueryBudgetExceeded(
+                f"{request._view_name} ran {recorder.count} queries, over its budget of {budget}. Slowest:\n{statements}"
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_name = f"{view_func.__module__}.{view_func.__name__}"
+        request._query_budget = get_query_budget(view_func)
+
+    def process_template_response(self, request, response):
+        # called right before the response is rendered
+        started = time.perf_counter()
+
+        def stop(rendered):
+            request._template_duration += time.perf_counter() - started
+
+        response.add_post_render_callback(stop)
+        return response
+
+    @staticmethod
+    def server_timing(recorder, template_duration, duration):
+        metrics = [f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"']
+        if template_duration:
+            metrics.append(f"tpl;dur={template_duration * 1000:.1f}")
+        metrics.append(f"total;dur={duration * 1000:.1f}")
+        return ", ".join(metrics)
+
+    @staticmethod
+    def log(request, response, recorder, duration, budget, over_budget):
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": getattr(request, "_view_name", None),
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 2),
+            "queries": recorder.count,
+            "db_ms": round(recorder.duration * 1000, 2),
+            "template_ms": round(request._template_duration * 1000, 2),
+            "query_budget": budget,
+            "slowest": [{"ms": round(seconds * 1000, 2), "sql": sql[:MAX_SQL_LENGTH]} for seconds, sql in recorder.slowest],
+        }
+        logger.log(logging.WARNING if over_budget else logging.INFO, json.dumps(record))
@@ -0,0 +1,89 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from catalog.models import Author, Book, Genre
+from catalog.search import get_backend
+
+WORDS = (
+    "river night garden empire shadow iron glass winter storm kingdom silver machine ocean forest star "
+    "letter crown secret mountain island fire clock memory city house journey stranger war dream code"
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Times catalog searches against a synthetic catalog of the given size, comparing the full-text "
+        "index with an icontains scan. The synthetic rows are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=100000)
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with transaction.atomic():
+            self.populate(rng, options["books"])
+            queries = [" ".join(rng.sample(WORDS, rng.choice([1, 1, 2]))) for _ in range(options["queries"])]
+
+            backend = get_backend()
+            self.report("full-text index", [self.time(lambda: backend.search(query, 11)) for query in queries])
+            self.report("icontains scan", [self.time(lambda: self.scan(query)) for query in queries])
+
+            transaction.set_rollback(True)
+
+    def populate(self, rng, num_books):
+        self.stdout.write(f"Creating {num_books} synthetic books...")
+        authors = Author.objects.bulk_create(
+            [Author(first_name=rng.choice(WORDS).title(), last_name=rng.choice(WORDS).title()) for _ in range(max(num_books // 10, 1))]
+        )
+        Genre.objects.bulk_create([Genre(name=word.title()) for word in WORDS[:15]])
+        author_ids = list(Author.objects.values_list("pk", flat=True))
+        genre_ids = list(Genre.objects.values_list("pk", flat=True))
+
+        for start in range(0, num_books, 5000):
+            Book.objects.bulk_create([
+                Book(
+                    title=" ".join(rng.sample(WORDS, 3)).title(),
+                    summary=" ".join(rng.choice(WORDS) for _ in range(40)),
+                    isbn=str(rng.randrange(10 ** 12, 10 ** 13)),
+                    author_id=rng.choice(author_ids),
+                )
+                for _ in range(start, min(start + 5000, num_books))
+            ])
+        Book.genre.through.objects.bulk_create([
+            Book.genre.through(book_id=book_id, genre_id=rng.choice(genre_ids))
+            for book_id in Book.objects.values_list("pk", flat=True).iterator()
+        ])
+
+        started = time.perf_counter()
+        get_backend().rebuild()
+        self.stdout.write(f"Indexed {num_books} books (plus {len(authors)} authors) in {time.perf_counter() - started:.2f}s")
+
+    @staticmethod
+    def scan(query):
+        books = Book.objects.all()
+        for word in query.split():
+            books = books.filter(
+                Q(title__icontains=word) | Q(summary__icontains=word) | Q(author__last_name__icontains=word)
+                | Q(author__first_name__icontains=word) | Q(genre__name__icontains=word)
+            )
+        # ranking needs every match, so count them all like the index does
+        return books.distinct().count()
+
+    @staticmethod
+    def time(function):
+        started = time.perf_counter()
+        function()
+        return (time.perf_counter() - started) * 1000
+
+    def report(self, name, timings):
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(f"{name}: median {statistics.median(timings):.1f}ms, p95 {p95:.1f}ms over {len(timings)} queries")
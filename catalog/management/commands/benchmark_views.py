@@ -0,0 +1,204 @@
+import json
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import URLPattern, reverse
+from django.urls.converters import UUIDConverter
+from django.utils import timezone
+
+from catalog import urls
+from catalog.instrumentation import QueryRecorder, record_queries
+from catalog.models import Author, Book, BookInstance
+from catalog.replicas import replica_databases
+from catalog.visits import visit_buffer
+
+PERCENTILES = (50, 90, 95, 99)
+
+# URL keyword arguments other than the primary keys, by URL name
+URL_KWARGS = {
+    "export": {"dataset": "borrowed", "file_format": "csv"},
+}
+
+
+def percentile(values, percent):
+    """The nearest-rank percentile of the sorted values."""
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests every page of catalog/urls.py and every admin changelist through the test client and writes "
+        "a JSON report of the latency percentiles, query counts and SQL time of each, to compare between "
+        "commits (see --compare). Pages showing a book or an author use the one with the most copies or "
+        "books. Only GET requests are made, so the data is left unchanged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=10, help="Timed requests per page, after one warm-up request.")
+        parser.add_argument("--user", help="The username to log in as; defaults to the first superuser.")
+        parser.add_argument("--anonymous", action="store_true", help="Request the pages without logging in.")
+        parser.add_argument("--output", "-o", help="The file to write the report to; defaults to standard output.")
+        parser.add_argument("--compare", help="A previous report to compare the median latencies and query counts with.")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be positive.")
+        user = None if options["anonymous"] else self.get_user(options["user"])
+        targets = self.get_targets()
+
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        results = {}
+        # the test client requests the "testserver" host
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            for name, url in targets:
+                results[name] = self.benchmark(client, url, options["repeat"])
+                self.stderr.write(self.summarize(name, results[name]))
+        # save the visits counted by the index page, rather than leaving them in the buffer
+        visit_buffer.flush()
+        if user is not None:
+            client.logout()
+
+        report = {
+            "meta": {
+                "commit": self.get_commit(),
+                "created": timezone.now().isoformat(),
+                "database": connection.vendor,
+                "debug": settings.DEBUG,
+                "replicas": replica_databases(),
+                "repeat": options["repeat"],
+                "user": user.username if user is not None else None,
+                "rows": {
+                    "authors": Author.objects.count(),
+                    "books": Book.objects.count(),
+                    "copies": BookInstance.objects.count(),
+                    "users": User.objects.count(),
+                },
+            },
+            "results": results,
+        }
+        content = json.dumps(report, indent=2, sort_keys=True) + "\n"
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                output.write(content)
+        else:
+            self.stdout.write(content, ending="")
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as previous:
+                self.compare(json.load(previous)["results"], results)
+
+    @staticmethod
+    def get_user(username):
+        users = User.objects.filter(username=username) if username else User.objects.filter(is_superuser=True).order_by("pk")
+        user = users.first()
+        if user is None:
+            raise CommandError(f"Unknown user {username!r}." if username else "There is no superuser: pass --user or --anonymous.")
+        return user
+
+    def get_targets(self):
+        """Returns (name, URL) pairs of the pages to request."""
+        book_id = Book.objects.annotate(num_copies=Count("bookinstance")).order_by("-num_copies", "pk").values_list("pk", flat=True).first()
+        author_id = Author.objects.annotate(num_books=Count("book")).order_by("-num_books", "pk").values_list("pk", flat=True).first()
+        copy_id = BookInstance.objects.filter(book_id=book_id).order_by("pk").values_list("pk", flat=True).first()
+        if copy_id is None or author_id is None:
+            raise CommandError("The catalog is empty: fill it first, e.g. with generate_catalog.")
+
+        targets = []
+        for pattern in urls.urlpatterns:
+            if not isinstance(pattern, URLPattern):
+                continue
+            kwargs = dict(URL_KWARGS.get(pattern.name, {}))
+            for key, converter in pattern.pattern.converters.items():
+                if key in kwargs:
+                    continue
+                if key != "pk":
+                    raise CommandError(f"No value for {key!r} in URL {pattern.name!r}: add it to URL_KWARGS.")
+                if isinstance(converter, UUIDConverter):
+                    kwargs[key] = copy_id
+                else:
+                    kwargs[key] = author_id if "author" in pattern.name else book_id
+            targets.append((pattern.name, reverse(pattern.name, kwargs=kwargs)))
+
+        for model in admin.site._registry:
+            name = f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist"
+            targets.append((name, reverse(name)))
+        return targets
+
+    @staticmethod
+    def request(client, url):
+        """Returns the status code, the latency, the query count and the SQL time of a request."""
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with record_queries(recorder):
+            response = client.get(url)
+            if response.streaming:
+                # streamed responses run their queries while being read
+                for _ in response.streaming_content:
+                    pass
+        return response.status_code, time.perf_counter() - started, recorder.count, recorder.duration
+
+    def benchmark(self, client, url, repeat):
+        status_code = self.request(client, url)[0]
+        if status_code == 405:
+            return {"url": url, "status": status_code, "skipped": "GET is not allowed."}
+
+        latencies, query_counts, sql_durations = [], [], []
+        for _ in range(repeat):
+            status_code, latency, query_count, sql_duration = self.request(client, url)
+            latencies.append(latency * 1000)
+            query_counts.append(query_count)
+            sql_durations.append(sql_duration * 1000)
+        latencies.sort()
+        sql_durations.sort()
+        return {
+            "url": url,
+            "status": status_code,
+            "latency_ms": {
+                **{f"p{percent}": round(percentile(latencies, percent), 2) for percent in PERCENTILES},
+                "max": round(latencies[-1], 2),
+                "mean": round(statistics.mean(latencies), 2),
+            },
+            "queries": {"median": statistics.median_low(query_counts), "max": max(query_counts)},
+            "sql_ms": {"p50": round(percentile(sql_durations, 50), 2), "mean": round(statistics.mean(sql_durations), 2)},
+        }
+
+    @staticmethod
+    def summarize(name, result):
+        if "skipped" in result:
+            return f"{name}: skipped, {result['skipped']}"
+        return (
+            f"{name}: {result['status']}, median {result['latency_ms']['p50']}ms, p95 {result['latency_ms']['p95']}ms, "
+            f"{result['queries']['median']} queries in {result['sql_ms']['p50']}ms"
+        )
+
+    def compare(self, previous, results):
+        self.stderr.write("Compared with the previous report (median latency, median queries):")
+        for name, result in results.items():
+            before = previous.get(name)
+            if "skipped" in result or before is None or "skipped" in before:
+                continue
+            latency, latency_before = result["latency_ms"]["p50"], before["latency_ms"]["p50"]
+            change = f"{(latency - latency_before) / latency_before:+.0%}" if latency_before else "n/a"
+            self.stderr.write(
+                f"  {name}: {latency_before}ms -> {latency}ms ({change}), "
+                f"{before['queries']['median']} -> {result['queries']['median']} queries"
+            )
+
+    @staticmethod
+    def get_commit():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
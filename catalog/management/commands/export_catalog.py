@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from catalog.exports import DATASETS, FORMATS, export_rows
+
+
+class Command(BaseCommand):
+    help = "Streams a catalog dataset (books, authors, copies or borrowed copies) as CSV or JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--output", "-o", help="The file to write; defaults to standard output.")
+
+    def handle(self, *args, **options):
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as output:
+                output.writelines(export_rows(options["dataset"], options["format"]))
+        else:
+            for chunk in export_rows(options["dataset"], options["format"]):
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,145 @@
+import datetime
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from catalog.management.commands.benchmark_search import WORDS
+from catalog.management.commands.import_catalog import _insert
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.signals import catalog_changed_in_bulk
+
+GENRES = (
+    "Fantasy", "Science Fiction", "Mystery", "Romance", "Historical Fiction", "Thriller", "Horror", "Poetry",
+    "Biography", "History", "Travel", "Children's", "Young Adult", "Philosophy", "Science", "Cooking",
+)
+# name: share of the books
+LANGUAGES = {"English": 70, "French": 10, "Spanish": 8, "German": 6, "Japanese": 4, "Italian": 2}
+
+
+def _skewed(rng, values, exponent=3):
+    """Picks one of the values, favouring the first ones: with exponent 3, the first 10% get about half the picks."""
+    return values[int(len(values) * rng.random() ** exponent)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with a synthetic catalog for performance testing. Popularity is skewed like in a "
+        "real library: a few authors wrote many of the books, some books have many more copies than others "
+        "and a few borrowers have most of the loans, some of them overdue. Rows are bulk inserted in batches "
+        "and the statistics, search index and caches are updated once at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=10000)
+        parser.add_argument("--copies-per-book", type=float, default=3, help="The average number of copies of a book.")
+        parser.add_argument("--users", type=int, default=100, help="Borrowers to create.")
+        parser.add_argument("--authors", type=int, help="Defaults to one author per 10 books.")
+        parser.add_argument("--on-loan", type=float, default=0.3, help="The share of the copies on loan.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000, help="Books inserted per transaction.")
+
+    def handle(self, *args, **options):
+        num_books = options["books"]
+        batch_size = options["batch_size"]
+        num_authors = options["authors"] if options["authors"] is not None else max(num_books // 10, 1)
+        if num_books < 0 or options["users"] < 0 or num_authors < 1 or options["copies_per_book"] < 0:
+            raise CommandError("The numbers of books, users and copies must not be negative, and there must be an author.")
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive.")
+        if not 0 <= options["on_loan"] <= 1:
+            raise CommandError("--on-loan must be between 0 and 1.")
+
+        rng = random.Random(options["seed"])
+        self.started = time.perf_counter()
+        self.today = datetime.date.today()
+
+        with transaction.atomic():
+            self.user_ids = self.create_users(options["users"])
+            self.author_ids = _insert(Author, [
+                Author(first_name=rng.choice(WORDS).title(), last_name=f"{rng.choice(WORDS).title()}{number}")
+                for number in range(num_authors)
+            ], ["first_name", "last_name"])
+            self.genre_ids = self.get_or_create(Genre, GENRES)
+            languages = self.get_or_create(Language, LANGUAGES)
+            self.language_ids = [pk for pk, weight in zip(languages, LANGUAGES.values()) for _ in range(weight)]
+
+        new_book_ids = set()
+        self.num_books = self.num_copies = 0
+        try:
+            for start in range(0, num_books, batch_size):
+                new_book_ids.update(self.create_books(rng, min(batch_size, num_books - start), options))
+        finally:
+            # keep the statistics, search index and caches in step with whatever was created
+            if new_book_ids:
+                catalog_changed_in_bulk.send(sender=Book, book_ids=set(), new_book_ids=new_book_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(new_book_ids)} books by {num_authors} authors, {self.num_copies} copies and "
+            f"{len(self.user_ids)} users in {time.perf_counter() - self.started:.1f}s."
+        ))
+
+    @staticmethod
+    def create_users(num_users):
+        # hashing a password per user would take longer than the whole import, so they share an unusable one
+        password = make_password(None)
+        # numbered after the readers of earlier runs, whatever other users there are
+        names = User.objects.filter(username__regex=r"^reader[0-9]+$").values_list("username", flat=True)
+        offset = max((int(name[len("reader"):]) for name in names), default=-1) + 1
+        return _insert(User, [User(username=f"reader{offset + number}", password=password) for number in range(num_users)], ["username"])
+
+    @staticmethod
+    def get_or_create(model, names):
+        """Returns the primary keys of the objects with the given names, creating the missing ones."""
+        existing = dict(model.objects.filter(name__in=names).values_list("name", "pk"))
+        missing = [name for name in names if name not in existing]
+        existing.update(zip(missing, _insert(model, [model(name=name) for name in missing], ["name"])))
+        return [existing[name] for name in names]
+
+    def create_books(self, rng, num_books, options):
+        with transaction.atomic():
+            book_ids = _insert(Book, [
+                Book(
+                    title=" ".join(rng.sample(WORDS, rng.randint(1, 4))).title(),
+                    summary=" ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 80))).capitalize() + ".",
+                    isbn=str(rng.randrange(10 ** 12, 10 ** 13)),
+                    author_id=_skewed(rng, self.author_ids),
+                    language_id=rng.choice(self.language_ids),
+                )
+                for _ in range(num_books)
+            ], ["isbn", "summary"])
+            Book.genre.through.objects.bulk_create([
+                Book.genre.through(book_id=book_id, genre_id=genre_id)
+                for book_id in book_ids
+                for genre_id in {_skewed(rng, self.genre_ids, exponent=2) for _ in range(rng.randint(1, 3))}
+            ])
+            copies = [
+                self.build_copy(rng, book_id, options["on_loan"])
+                for book_id in book_ids
+                for _ in range(self.num_copies_of(rng, options["copies_per_book"]))
+            ]
+            BookInstance.objects.bulk_create(copies)
+
+        self.num_books += len(book_ids)
+        self.num_copies += len(copies)
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(f"{self.num_books} books, {self.num_copies} copies ({self.num_books / elapsed:.0f} books/s)")
+        return book_ids
+
+    @staticmethod
+    def num_copies_of(rng, average):
+        # exponentially distributed: most books have a few copies, popular ones have many
+        return max(1, round(rng.expovariate(1 / average))) if average else 0
+
+    def build_copy(self, rng, book_id, on_loan):
+        imprint = f"{rng.choice(WORDS).title()} Press, {rng.randint(1950, self.today.year)}"
+        if rng.random() < on_loan and self.user_ids:
+            # due from two months ago (overdue) to three weeks ahead
+            return BookInstance(
+                book_id=book_id, imprint=imprint, status="o", borrower_id=_skewed(rng, self.user_ids, exponent=2),
+                due_back=self.today + datetime.timedelta(days=rng.randint(-60, 21)),
+            )
+        return BookInstance(book_id=book_id, imprint=imprint, status=rng.choice("aaaaaaaarm"))
@@ -0,0 +1,172 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.signals import catalog_changed_in_bulk
+
+STATUSES = {code for code, _ in BookInstance.LOAN_STATUS}
+
+
+def _insert(model, objects, key):
+    """bulk_create()s the objects and returns their primary keys, in order. key names the fields that tell
+    the objects apart (e.g. the ISBN of books)."""
+    if not objects:
+        return []
+    if connection.features.can_return_ids_from_bulk_insert:
+        model.objects.bulk_create(objects)
+        return [obj.pk for obj in objects]
+    # the ids are not returned (e.g. on SQLite): read the rows added since the insert started back by key, as
+    # another process may have added rows in between. Should it have added one with the same key, the newest
+    # row is used for both, like a duplicate in the file would be.
+    last_pk = model.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+    model.objects.bulk_create(objects)
+    pks = {tuple(values): pk for pk, *values in model.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", *key)}
+    return [pks[tuple(getattr(obj, field) for field in key)] for obj in objects]
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports books and their copies from a CSV or JSON Lines file (one book per row), streaming the rows "
+        "in batches. Columns: title, isbn, summary, author_first_name, author_last_name, language, genres "
+        "(separated by ';' in CSV files, a list or a string in JSON), copies (default 1), imprint and status "
+        "(default 'a'). Authors, languages and genres are matched by name and created when missing; rows "
+        "with the ISBN of a known book add copies to that book."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="The file to import, or - for standard input.")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows inserted per transaction.")
+
+    def handle(self, *args, **options):
+        file_format = options["format"] or ("jsonl" if options["path"].endswith((".jsonl", ".json")) else "csv")
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        self.authors = {(first, last): pk for pk, first, last in Author.objects.values_list("pk", "first_name", "last_name")}
+        self.languages = {name: pk for pk, name in Language.objects.values_list("pk", "name")}
+        self.genres = {name: pk for pk, name in Genre.objects.values_list("pk", "name")}
+        # ordered so that the oldest book wins if several share an ISBN
+        self.books = {isbn: pk for pk, isbn in Book.objects.order_by("-pk").values_list("pk", "isbn")}
+        self.changed_book_ids = set()
+        self.new_book_ids = set()
+        self.num_rows = self.num_copies = 0
+        self.started = time.perf_counter()
+
+        stream = sys.stdin if options["path"] == "-" else open(options["path"], newline="", encoding="utf-8")
+        try:
+            batch = []
+            for row in self.read_rows(stream, file_format):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    self.import_batch(batch)
+                    batch = []
+            self.import_batch(batch)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            # keep the statistics, search index and caches in step with whatever was imported
+            if self.changed_book_ids or self.new_book_ids:
+                catalog_changed_in_bulk.send(sender=Book, book_ids=self.changed_book_ids, new_book_ids=self.new_book_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.num_rows} rows: {len(self.new_book_ids)} new books, {self.num_copies} copies "
+            f"in {time.perf_counter() - self.started:.1f}s."
+        ))
+
+    def read_rows(self, stream, file_format):
+        if file_format == "csv":
+            # the header is line 1
+            for line_number, row in enumerate(csv.DictReader(stream), start=2):
+                yield self.clean_row(row, line_number)
+        else:
+            for line_number, line in enumerate(stream, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as error:
+                    raise CommandError(f"Line {line_number}: {error}")
+                if not isinstance(row, dict):
+                    raise CommandError(f"Line {line_number}: expected a JSON object.")
+                yield self.clean_row(row, line_number)
+
+    @staticmethod
+    def clean_row(row, line_number):
+        def text(name):
+            return str(row.get(name) or "").strip()
+
+        cleaned = {name: text(name) for name in ("title", "isbn", "summary", "author_first_name", "author_last_name", "language", "imprint")}
+        for name in ("title", "isbn"):
+            if not cleaned[name]:
+                raise CommandError(f"Line {line_number}: {name} is required.")
+
+        genres = row.get("genres") or []
+        if isinstance(genres, str):
+            genres = genres.split(";")
+        cleaned["genres"] = [name.strip() for name in genres if name.strip()]
+
+        try:
+            cleaned["copies"] = int(row["copies"]) if text("copies") else 1
+        except ValueError:
+            raise CommandError(f"Line {line_number}: copies must be a number.")
+        cleaned["status"] = text("status") or "a"
+        if cleaned["status"] not in STATUSES:
+            raise CommandError(f"Line {line_number}: unknown status {cleaned['status']!r}.")
+        return cleaned
+
+    def import_batch(self, rows):
+        if not rows:
+            return
+        with transaction.atomic():
+            self.create_missing(Author, self.authors, {
+                (row["author_first_name"], row["author_last_name"]) for row in rows if row["author_last_name"]
+            }, lambda key: Author(first_name=key[0], last_name=key[1]), ["first_name", "last_name"])
+            self.create_missing(Language, self.languages, {row["language"] for row in rows if row["language"]}, lambda name: Language(name=name), ["name"])
+            self.create_missing(Genre, self.genres, {name for row in rows for name in row["genres"]}, lambda name: Genre(name=name), ["name"])
+
+            new_books = {}
+            for row in rows:
+                if row["isbn"] in self.books:
+                    self.changed_book_ids.add(self.books[row["isbn"]])
+                elif row["isbn"] not in new_books:
+                    new_books[row["isbn"]] = Book(
+                        title=row["title"],
+                        isbn=row["isbn"],
+                        summary=row["summary"],
+                        author_id=self.authors.get((row["author_first_name"], row["author_last_name"])),
+                        language_id=self.languages.get(row["language"]),
+                    )
+            for isbn, pk in zip(new_books, _insert(Book, list(new_books.values()), ["isbn"])):
+                self.books[isbn] = pk
+                self.new_book_ids.add(pk)
+
+            # the (book, genre) pairs are unique, so genres a book already has are skipped
+            Book.genre.through.objects.bulk_create([
+                Book.genre.through(book_id=book_id, genre_id=genre_id)
+                for book_id, genre_id in {(self.books[row["isbn"]], self.genres[name]) for row in rows for name in row["genres"]}
+            ], ignore_conflicts=True)
+
+            copies = [
+                BookInstance(book_id=self.books[row["isbn"]], imprint=row["imprint"], status=row["status"])
+                for row in rows for _ in range(row["copies"])
+            ]
+            BookInstance.objects.bulk_create(copies)
+
+        self.num_rows += len(rows)
+        self.num_copies += len(copies)
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(f"{self.num_rows} rows, {self.num_copies} copies ({self.num_rows / elapsed:.0f} rows/s)")
+
+    @staticmethod
+    def create_missing(model, lookup, keys, build, key_fields):
+        """Creates the objects for the keys missing from the lookup map and adds them to it."""
+        missing = [key for key in keys if key not in lookup]
+        for key, pk in zip(missing, _insert(model, [build(key) for key in missing], key_fields)):
+            lookup[key] = pk
@@ -0,0 +1,27 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from catalog.models import BookInstance
+
+
+class Command(BaseCommand):
+    help = "Prints the overdue copies counted by days overdue and the borrowers with the most overdue copies."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--borrowers", type=int, default=20, help="How many borrowers to list.")
+
+    def handle(self, *args, **options):
+        today = datetime.date.today()
+        buckets = BookInstance.objects.overdue_buckets(today)
+        self.stdout.write(f"{sum(count for _, _, count in buckets)} overdue copies on {today}")
+        for low, high, count in buckets:
+            days = f"{low}-{high}" if high is not None else f"{low}+"
+            self.stdout.write(f"  {days:>7} days: {count}")
+
+        self.stdout.write("Borrowers with the most overdue copies:")
+        for row in BookInstance.objects.overdue_by_borrower(today)[:options["borrowers"]]:
+            self.stdout.write(
+                f"  {row['borrower__username'] or '(no borrower)'}: {row['num_overdue']} copies, "
+                f"{(today - row['earliest_due_back']).days} days overdue at most"
+            )
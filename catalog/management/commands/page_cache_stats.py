@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from catalog import urls
+from catalog.cache import PageCacheMixin
+from catalog.metrics import page_cache_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Shows the hit rate of the anonymous page cache for each cached catalog view, from the request metrics "
+        "of the workers (CATALOG_METRICS_DIR)."
+    )
+
+    def handle(self, *args, **options):
+        routes = sorted(
+            pattern.name for pattern in urls.urlpatterns
+            if pattern.name and issubclass(getattr(pattern.callback, "view_class", object), PageCacheMixin)
+        )
+        stats = page_cache_stats()
+        for route in routes:
+            hits, misses = stats[route]
+            total = hits + misses
+            hit_rate = f"{100 * hits / total:.1f}%" if total else "-"
+            self.stdout.write(f"{route}: {hits} hits, {misses} misses ({hit_rate})")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import CatalogStatistics
+
+
+class Command(BaseCommand):
+    help = "Recomputes the catalog statistics shown on the home page from scratch."
+
+    def handle(self, *args, **options):
+        stats = CatalogStatistics.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt catalog statistics: {stats.num_books} books, {stats.num_instances} copies "
+            f"({stats.num_instances_available} available), {stats.num_authors} authors."
+        ))
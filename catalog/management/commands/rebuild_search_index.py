@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalog.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Refills the full-text search table from the books, authors and genres in the database."
+
+    def handle(self, *args, **options):
+        get_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS("Rebuilt the search index."))
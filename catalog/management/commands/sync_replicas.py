@@ -0,0 +1,41 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from catalog.replicas import PRIMARY, replica_databases
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the default SQLite database into the SQLite files of the replicas (DATABASE_REPLICA_URLS), to "
+        "try out the read replicas locally: the replicas lag behind until the next run. Real replicas are kept "
+        "in step by the database server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("aliases", nargs="*", help="The replicas to copy to; defaults to all of them.")
+
+    def handle(self, *args, **options):
+        aliases = options["aliases"] or replica_databases()
+        if not aliases:
+            raise CommandError("There are no replicas: set DATABASE_REPLICA_URLS.")
+        unknown = set(aliases) - set(replica_databases())
+        if unknown:
+            raise CommandError(f"Unknown replicas: {', '.join(sorted(unknown))}.")
+        for alias in [PRIMARY, *aliases]:
+            if connections[alias].vendor != "sqlite":
+                raise CommandError(f"The {alias} database is not an SQLite database.")
+
+        primary = connections[PRIMARY]
+        primary.ensure_connection()
+        for alias in aliases:
+            name = connections[alias].settings_dict["NAME"]
+            connections[alias].close()
+            target = sqlite3.connect(name)
+            try:
+                # a consistent copy, even while the primary is being written to
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(f"Copied the {PRIMARY} database to {alias} ({name})."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from catalog.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the warm-up steps done in the gunicorn master before the workers are forked (see "
+        "catalog/warmup.py) and prints how long each of them took."
+    )
+
+    def handle(self, *args, **options):
+        timings = warm_up()
+        width = max(len(name) for name, _, _ in timings)
+        for name, count, seconds in timings:
+            self.stdout.write(f"{name:<{width}}  {count:>5}  {seconds * 1000:8.1f}ms")
+        self.stdout.write(self.style.SUCCESS(f"Warmed up in {sum(seconds for _, _, seconds in timings) * 1000:.1f}ms."))
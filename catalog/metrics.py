@@ -0,0 +1,210 @@
+import bisect
+import glob
+import mmap
+import os
+import tempfile
+import threading
+import zlib
+
+from django.conf import settings
+
+# Request metrics shared by the worker processes.
+#
+# Every worker process (e.g. of gunicorn) adds its figures to a file of its own in CATALOG_METRICS_DIR,
+# mapped in memory as an array of doubles: recording a request is a dozen additions, with no system call and
+# no lock shared with the other processes. The /metrics endpoint sums the files of all the workers, including
+# the ones that have exited so that the counters never go down, and renders the totals in the Prometheus text
+# format. Figures are kept per URL name of catalog/urls.py, and every other URL (admin, accounts, ...) is
+# counted as "other".
+
+OTHER_ROUTE = "other"
+STATUS_CLASSES = ("2xx", "3xx", "4xx", "5xx")
+# upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# offsets of the values kept per route, followed by one count per latency bucket and one for slower requests
+REQUESTS = 0
+RESPONSES = 1
+DURATION = RESPONSES + len(STATUS_CLASSES)
+DB_DURATION = DURATION + 1
+QUERIES = DB_DURATION + 1
+CACHE_HITS = QUERIES + 1
+CACHE_MISSES = CACHE_HITS + 1
+HISTOGRAM = CACHE_MISSES + 1
+SLOT_SIZE = HISTOGRAM + len(LATENCY_BUCKETS) + 1
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def metrics_dir():
+    return getattr(settings, "CATALOG_METRICS_DIR", None) or os.path.join(tempfile.gettempdir(), "locallibrary_metrics")
+
+
+class Layout:
+    """Where the values of each route are in a worker file."""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.offsets = {route: 1 + index * SLOT_SIZE for index, route in enumerate(routes)}
+        # the first value identifies the layout, so that files written by another version are skipped
+        self.size = 1 + len(routes) * SLOT_SIZE
+        self.checksum = float(zlib.crc32(repr((routes, SLOT_SIZE, LATENCY_BUCKETS)).encode()))
+
+
+_layout = None
+
+
+def get_layout():
+    global _layout
+    if _layout is None:
+        from . import urls
+
+        _layout = Layout(tuple(sorted({pattern.name for pattern in urls.urlpatterns if pattern.name} | {OTHER_ROUTE})))
+    return _layout
+
+
+class WorkerFile:
+    """The memory-mapped metrics file of the current process."""
+
+    def __init__(self, layout, directory):
+        self.layout = layout
+        self.directory = directory
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        path = os.path.join(directory, f"worker-{self.pid}.metrics")
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fresh = os.fstat(fd).st_size != layout.size * 8
+            os.ftruncate(fd, layout.size * 8)
+            self._mmap = mmap.mmap(fd, layout.size * 8)
+        finally:
+            os.close(fd)
+        self.values = memoryview(self._mmap).cast("d")
+        if fresh or self.values[0] != layout.checksum:
+            # a new file, or one left by an earlier process with the same pid and another layout
+            self.values[:] = memoryview(bytes(layout.size * 8)).cast("d")
+            self.values[0] = layout.checksum
+
+    def record(self, route, status_code, duration, db_duration, num_queries, page_cache):
+        offset = self.layout.offsets.get(route, self.layout.offsets[OTHER_ROUTE])
+        values = self.values
+        # only needed by threaded workers
+        with self.lock:
+            values[offset + REQUESTS] += 1
+            values[offset + RESPONSES + min(max(status_code // 100 - 2, 0), len(STATUS_CLASSES) - 1)] += 1
+            values[offset + DURATION] += duration
+            values[offset + DB_DURATION] += db_duration
+            values[offset + QUERIES] += num_queries
+            if page_cache == "hit":
+                values[offset + CACHE_HITS] += 1
+            elif page_cache == "miss":
+                values[offset + CACHE_MISSES] += 1
+            values[offset + HISTOGRAM + bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+
+
+_worker_file = None
+_worker_file_lock = threading.Lock()
+
+
+def get_worker_file():
+    global _worker_file
+    directory = metrics_dir()
+    worker_file = _worker_file
+    # opened again in forked processes
+    if worker_file is None or worker_file.pid != os.getpid() or worker_file.directory != directory:
+        with _worker_file_lock:
+            worker_file = _worker_file
+            if worker_file is None or worker_file.pid != os.getpid() or worker_file.directory != directory:
+                worker_file = _worker_file = WorkerFile(get_layout(), directory)
+    return worker_file
+
+
+def record_request(request, response, duration, db_duration, num_queries):
+    """Adds a request to the metrics of its URL name."""
+    match = request.resolver_match
+    route = match.url_name if match is not None and not match.namespace else OTHER_ROUTE
+    get_worker_file().record(route, response.status_code, duration, db_duration, num_queries, response.get("X-Page-Cache"))
+
+
+def collect():
+    """Returns the values of all the worker files summed up, in the layout of the current code."""
+    layout = get_layout()
+    totals = [0.0] * layout.size
+    for path in glob.glob(os.path.join(metrics_dir(), "worker-*.metrics")):
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            continue
+        if len(data) != layout.size * 8:
+            continue
+        values = memoryview(data).cast("d")
+        if values[0] != layout.checksum:
+            continue
+        for index in range(1, layout.size):
+            totals[index] += values[index]
+    return totals
+
+
+def page_cache_stats():
+    """Returns {route: (hits, misses)} of the anonymous page cache (see catalog/cache.py), for all the workers."""
+    layout = get_layout()
+    totals = collect()
+    return {
+        route: (int(totals[offset + CACHE_HITS]), int(totals[offset + CACHE_MISSES]))
+        for route, offset in layout.offsets.items()
+    }
+
+
+def clear():
+    """Removes the worker files, e.g. when the server starts."""
+    for path in glob.glob(os.path.join(metrics_dir(), "worker-*.metrics")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _number(value):
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render_metrics():
+    """Returns the metrics of all the workers in the Prometheus text format."""
+    layout = get_layout()
+    totals = collect()
+    lines = []
+
+    def family(name, metric_type, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for route in layout.routes:
+            offset = layout.offsets[route]
+            for suffix, labels, value in samples(offset):
+                label_text = ",".join([f'route="{route}"', *(f'{key}="{label}"' for key, label in labels)])
+                lines.append(f"{name}{suffix}{{{label_text}}} {_number(value)}")
+
+    family("catalog_requests_total", "counter", "Requests by URL name and status class.", lambda offset: [
+        ("", [("status", status)], totals[offset + RESPONSES + index]) for index, status in enumerate(STATUS_CLASSES)
+    ])
+
+    def histogram(offset):
+        samples, count = [], 0
+        for index, bound in enumerate([*LATENCY_BUCKETS, "+Inf"]):
+            count += totals[offset + HISTOGRAM + index]
+            samples.append(("_bucket", [("le", bound)], count))
+        return [*samples, ("_sum", [], totals[offset + DURATION]), ("_count", [], totals[offset + REQUESTS])]
+
+    family("catalog_request_duration_seconds", "histogram", "Time spent handling requests.", histogram)
+    family("catalog_db_duration_seconds_total", "counter", "Time spent running database queries.", lambda offset: [
+        ("", [], totals[offset + DB_DURATION]),
+    ])
+    family("catalog_db_queries_total", "counter", "Database queries run.", lambda offset: [
+        ("", [], totals[offset + QUERIES]),
+    ])
+    family("catalog_page_cache_requests_total", "counter", "Anonymous requests answered from the page cache or not.", lambda offset: [
+        ("", [("outcome", "hit")], totals[offset + CACHE_HITS]),
+        ("", [("outcome", "miss")], totals[offset + CACHE_MISSES]),
+    ])
+    return "\n".join(lines) + "\n"
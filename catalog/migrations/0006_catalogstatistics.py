@@ -0,0 +1,48 @@
+# Generated by Django 2.2.28 on 2026-10-16 22:29
+
+from django.db import migrations, models
+
+
+def populate_statistics(apps, schema_editor):
+    """Counts the existing catalog records into the new statistics row."""
+    Author = apps.get_model('catalog', 'Author')
+    Book = apps.get_model('catalog', 'Book')
+    BookInstance = apps.get_model('catalog', 'BookInstance')
+    CatalogStatistics = apps.get_model('catalog', 'CatalogStatistics')
+    Genre = apps.get_model('catalog', 'Genre')
+
+    CatalogStatistics.objects.create(
+        pk=1,
+        num_books=Book.objects.count(),
+        num_instances=BookInstance.objects.count(),
+        num_instances_available=BookInstance.objects.filter(status__exact='a').count(),
+        num_authors=Author.objects.count(),
+        num_fantasy_genres=Genre.objects.filter(name__icontains='fantasy').count(),
+        num_book_titles_containing_code=Book.objects.filter(title__icontains='code').count(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_auto_20190906_1306'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogStatistics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('num_books', models.IntegerField(default=0)),
+                ('num_instances', models.IntegerField(default=0)),
+                ('num_instances_available', models.IntegerField(default=0)),
+                ('num_authors', models.IntegerField(default=0)),
+                ('num_fantasy_genres', models.IntegerField(default=0)),
+                ('num_book_titles_containing_code', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'catalog statistics',
+            },
+        ),
+        migrations.RunPython(populate_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 2.2.28 on 2026-10-16 22:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0006_catalogstatistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text="'user:<id>' or 'visitor:<id>'", max_length=64, unique=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('last_visit', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 2.2.28 on 2026-10-16 22:58
+
+from django.db import migrations
+
+# The full-text search table of catalog/search.py. Its DDL is written out here rather than imported from
+# catalog/search.py, so that later changes to the search code cannot change what this migration did. The
+# table has no foreign key to catalog_book: flush truncates catalog_book without CASCADE, which PostgreSQL
+# refuses while another table references it, and the signal receivers remove the rows of deleted books.
+
+POSTGRES_DOCUMENT_SQL = """
+    SELECT b.id,
+           setweight(to_tsvector('english', b.title), 'A') ||
+           setweight(to_tsvector('english', COALESCE(a.first_name || ' ' || a.last_name, '')), 'B') ||
+           setweight(to_tsvector('english', COALESCE(
+               (SELECT string_agg(g.name, ' ') FROM catalog_book_genre bg
+                JOIN catalog_genre g ON g.id = bg.genre_id WHERE bg.book_id = b.id), '')), 'C') ||
+           setweight(to_tsvector('english', b.summary), 'D')
+    FROM catalog_book b LEFT JOIN catalog_author a ON a.id = b.author_id
+"""
+
+SQLITE_DOCUMENT_SQL = """
+    SELECT b.id, b.title,
+           COALESCE(a.first_name || ' ' || a.last_name, ''),
+           COALESCE((SELECT group_concat(g.name, ' ') FROM catalog_book_genre bg
+                     JOIN catalog_genre g ON g.id = bg.genre_id WHERE bg.book_id = b.id), ''),
+           b.summary
+    FROM catalog_book b LEFT JOIN catalog_author a ON a.id = b.author_id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    """Creates the full-text search table for this database and indexes the existing books."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE TABLE catalog_booksearch (book_id integer PRIMARY KEY, document tsvector NOT NULL)')
+        schema_editor.execute('CREATE INDEX catalog_booksearch_document_gin ON catalog_booksearch USING GIN (document)')
+        schema_editor.execute(f'INSERT INTO catalog_booksearch (book_id, document) {POSTGRES_DOCUMENT_SQL}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE catalog_booksearch USING fts5(title, authors, genres, summary, tokenize = 'porter unicode61')"
+        )
+        schema_editor.execute(f'INSERT INTO catalog_booksearch (rowid, title, authors, genres, summary) {SQLITE_DOCUMENT_SQL}')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute('DROP TABLE IF EXISTS catalog_booksearch')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_visitcount'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
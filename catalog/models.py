@@ -1,7 +1,8 @@
 import uuid # required for unique book instances
-from datetime import date
+from datetime import date, timedelta
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import BooleanField, Case, Count, F, Min, Q, Value, When
 from django.urls import reverse  # used to generate URL's by reversing the URL patterns
 
 # Create your models here.
@@ -16,6 +17,20 @@ class Genre(models.Model):
         return self.name
 
 
+class BookQuerySet(models.QuerySet):
+    def for_list(self):
+        """Loads only what the book list shows: the title and the author's name."""
+        return self.select_related("author").only("id", "title", "author", "author__first_name", "author__last_name")
+
+    def for_detail(self):
+        """Loads the author, language, genres and copies shown on the book detail page in a fixed number of queries."""
+        return self.select_related("author", "language").prefetch_related("genre", "bookinstance_set")
+
+    def with_num_available_copies(self):
+        """Annotates each book with the number of its available copies (counted by the database)."""
+        return self.annotate(num_available_copies=Count("bookinstance", filter=Q(bookinstance__status="a")))
+
+
 class Book(models.Model):
     """Model representing a book (but not a specific copy of a book)."""
     title = models.CharField(max_length=200)
@@ -34,6 +49,8 @@ class Book(models.Model):
     # in this local library, a Book can only be written in one language
     language = models.ForeignKey("Language", on_delete=models.SET_NULL, null=True)
 
+    objects = BookQuerySet.as_manager()
+
     def __str__(self):
         """String for representing the Model object."""
         return self.title
@@ -44,19 +61,52 @@ class Book(models.Model):
 
     def display_genre(self):
         """Create a String for the genre. This is required to display genre in admin."""
-        return ", ".join(genre.name for genre in self.genre.all()[:3])
+        # slice the list rather than the queryset, so that prefetched genres are used
+        return ", ".join(genre.name for genre in list(self.genre.all())[:3])
 
     def get_num_available_copies(self):
-        num_available_copies = 0
-        total_copies = self.bookinstance_set.all()
+        """Returns the number of available copies, using the with_num_available_copies() annotation when present."""
+        if hasattr(self, "num_available_copies"):
+            return self.num_available_copies
+        return self.bookinstance_set.filter(status="a").count()
 
-        for copy in total_copies:
-            if copy.status == 'a':
-                num_available_copies += 1
+    display_genre.short_description = "Genre"
 
-        return num_available_copies
 
-    display_genre.short_description = "Genre"
+# days overdue covered by each bucket of the overdue report (None: no upper bound)
+OVERDUE_BUCKETS = ((1, 7), (8, 30), (31, 90), (91, None))
+
+
+class BookInstanceQuerySet(models.QuerySet):
+    def on_loan(self):
+        return self.filter(status__exact="o")
+
+    def overdue(self, today=None):
+        """Filters the copies on loan that were due back before today (served by the partial on-loan index)."""
+        return self.on_loan().filter(due_back__lt=today or date.today())
+
+    def with_overdue(self, today=None):
+        """Annotates each copy with whether it is overdue (computed by the database), used by is_overdue."""
+        return self.annotate(overdue=Case(
+            When(due_back__lt=today or date.today(), then=Value(True)), default=Value(False), output_field=BooleanField(),
+        ))
+
+    def overdue_buckets(self, today=None):
+        """Returns [(min days, max days, number of copies)] of the overdue copies for each of OVERDUE_BUCKETS, in a single query."""
+        today = today or date.today()
+        counts = self.overdue(today).aggregate(**{
+            f"bucket_{index}": Count("id", filter=Q(due_back__lte=today - timedelta(days=low), **(
+                {"due_back__gte": today - timedelta(days=high)} if high is not None else {}
+            )))
+            for index, (low, high) in enumerate(OVERDUE_BUCKETS)
+        })
+        return [(low, high, counts[f"bucket_{index}"]) for index, (low, high) in enumerate(OVERDUE_BUCKETS)]
+
+    def overdue_by_borrower(self, today=None):
+        """Groups the overdue copies by borrower, with their number and the earliest due date, most overdue copies first."""
+        return self.overdue(today).values("borrower", "borrower__username").annotate(
+            num_overdue=Count("id"), earliest_due_back=Min("due_back"),
+        ).order_by("-num_overdue", "earliest_due_back", "borrower")
 
 
 class BookInstance(models.Model):
@@ -82,12 +132,25 @@ class BookInstance(models.Model):
         help_text="Book availability",
     )
 
+    objects = BookInstanceQuerySet.as_manager()
+
     class Meta:
         ordering = ["due_back"]
         permissions = (("can_mark_returned", "Set book as returned"), ("can_view_all_borrowed_books", "View all borrowed books"),)
+        indexes = [
+            # circulation filters: copies by status, loans of a borrower, copies of a book by status
+            models.Index(fields=["status", "due_back"], name="bookinstance_status_due_idx"),
+            models.Index(fields=["borrower", "status", "due_back"], name="bookinstance_borrower_idx"),
+            models.Index(fields=["book", "status"], name="bookinstance_book_status_idx"),
+            # copies on loan in (due_back, id) order; a full index on backends without partial indexes
+            models.Index(fields=["due_back", "id"], name="bookinstance_on_loan_idx", condition=Q(status="o")),
+        ]
 
     @property
     def is_overdue(self):
+        if hasattr(self, "overdue"):
+            # annotated by with_overdue()
+            return self.overdue
         if self.due_back and date.today() > self.due_back:  # includes verification that 'due_back' is not empty
             return True
         return False
@@ -123,3 +186,73 @@ class Language(models.Model):
     def __str__(self):
         """String representation of a language Model object."""
         return self.name
+
+
+# search terms used by the home page statistics
+FANTASY_GENRE_TERM = "fantasy"
+CODE_TITLE_TERM = "code"
+
+
+class CatalogStatistics(models.Model):
+    """Model holding the record counts shown on the home page (a single row, kept up to date by signals)."""
+    num_books = models.IntegerField(default=0)
+    num_instances = models.IntegerField(default=0)
+    num_instances_available = models.IntegerField(default=0)
+    num_authors = models.IntegerField(default=0)
+    num_fantasy_genres = models.IntegerField(default=0)
+    num_book_titles_containing_code = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "catalog statistics"
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return "Catalog statistics"
+
+    @classmethod
+    def load(cls):
+        """Returns the statistics row, rebuilding it if it does not exist yet."""
+        try:
+            return cls.objects.get(pk=1)
+        except cls.DoesNotExist:
+            return cls.rebuild()
+
+    @classmethod
+    def count_all(cls):
+        """Counts every statistic directly from the catalog tables."""
+        return {
+            "num_books": Book.objects.count(),
+            "num_instances": BookInstance.objects.count(),
+            "num_instances_available": BookInstance.objects.filter(status__exact="a").count(),
+            "num_authors": Author.objects.count(),
+            "num_fantasy_genres": Genre.objects.filter(name__icontains=FANTASY_GENRE_TERM).count(),
+            "num_book_titles_containing_code": Book.objects.filter(title__icontains=CODE_TITLE_TERM).count(),
+        }
+
+    @classmethod
+    def rebuild(cls):
+        """Recomputes the statistics row from scratch."""
+        stats, _ = cls.objects.update_or_create(pk=1, defaults=cls.count_all())
+        return stats
+
+    @classmethod
+    def adjust(cls, **deltas):
+        """Applies the given increments (e.g. num_books=1) to the statistics row in a single UPDATE."""
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        updated = cls.objects.filter(pk=1).update(**{name: F(name) + delta for name, delta in deltas.items()})
+        if not updated:
+            cls.rebuild()
+
+
+class VisitCount(models.Model):
+    """Model aggregating home page visits per user or per anonymous visitor (flushed in batches by catalog.visits)."""
+    key = models.CharField(max_length=64, unique=True, help_text="'user:<id>' or 'visitor:<id>'")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    count = models.PositiveIntegerField(default=0)
+    last_visit = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        """String for representing the Model object."""
+        return f'{self.key} ({self.count})'
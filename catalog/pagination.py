@@ -0,0 +1,210 @@
+import operator
+from functools import reduce
+from types import SimpleNamespace
+
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import F, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+from django.utils.translation import gettext as _
+
+CURSOR_SALT = "catalog.pagination"
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    """A page of results returned by KeysetPaginator (mirrors the parts of django.core.paginator.Page used by templates)."""
+    cursor_based = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.next_querystring = ""
+        self.previous_querystring = ""
+
+    def __repr__(self):
+        return f"<Keyset page of {len(self.object_list)} objects>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Paginates a queryset by seeking past the ordering key of the last row seen instead of using OFFSET.
+
+    keys are the (unique together) ordering fields, e.g. ("last_name", "first_name", "id"). Pages are
+    addressed with opaque signed cursors and no COUNT(*) query is needed.
+    """
+
+    def __init__(self, queryset, per_page, keys):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.keys = tuple(keys)
+        self.fields = [queryset.model._meta.get_field(key) for key in self.keys]
+
+    def page(self, cursor=None):
+        """Returns the first page, or the page before/after the position encoded in the cursor."""
+        if not cursor:
+            rows = list(self._ordered(reverse=False)[:self.per_page + 1])
+            return self._build_page(rows, has_previous=False, has_next=len(rows) > self.per_page)
+
+        direction, values = self.decode_cursor(cursor)
+        if direction == "n":
+            rows = list(self._ordered(reverse=False).filter(self._seek(values, reverse=False))[:self.per_page + 1])
+            return self._build_page(rows, has_previous=True, has_next=len(rows) > self.per_page)
+
+        rows = list(self._ordered(reverse=True).filter(self._seek(values, reverse=True))[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return self._build_page(rows, has_previous=has_previous, has_next=True, trimmed=True)
+
+    def _build_page(self, rows, has_previous, has_next, trimmed=False):
+        if not trimmed:
+            rows = rows[:self.per_page]
+        next_cursor = self.encode_cursor("n", rows[-1]) if has_next and rows else None
+        previous_cursor = self.encode_cursor("p", rows[0]) if has_previous and rows else None
+        return KeysetPage(rows, self, next_cursor, previous_cursor)
+
+    def _ordered(self, reverse):
+        # plain ASC/DESC (rather than NULLS FIRST/LAST) so that an index on the keys can serve the ordering
+        return self.queryset.order_by(*[F(key).desc() if reverse else F(key).asc() for key in self.keys])
+
+    def _seek(self, values, reverse):
+        """Builds the condition selecting the rows strictly after (or before, if reverse) the given key values."""
+        nulls_first = not connections[self.queryset.db].features.nulls_order_largest
+        conditions = []
+        equal = Q()
+        for field, value in zip(self.fields, values):
+            beyond = self._beyond(field, value, reverse, nulls_first)
+            if beyond is not None:
+                conditions.append(equal & beyond)
+            equal &= Q(**{f"{field.name}__isnull": True}) if value is None else Q(**{field.name: value})
+        if not conditions:
+            return Q(pk__in=[])
+        return reduce(operator.or_, conditions)
+
+    @staticmethod
+    def _beyond(field, value, reverse, nulls_first):
+        """Condition for the rows past value in the direction of travel, given where the database sorts nulls."""
+        towards_nulls = reverse == nulls_first
+        if value is None:
+            return None if towards_nulls else Q(**{f"{field.name}__isnull": False})
+        beyond = Q(**{f"{field.name}__{'lt' if reverse else 'gt'}": value})
+        if field.null and towards_nulls:
+            beyond |= Q(**{f"{field.name}__isnull": True})
+        return beyond
+
+    def encode_cursor(self, direction, obj):
+        if isinstance(obj, dict):
+            # a row of a values() queryset
+            obj = SimpleNamespace(**obj)
+        values = []
+        for field in self.fields:
+            value = getattr(obj, field.attname)
+            values.append(None if value is None else field.value_to_string(obj))
+        return signing.dumps([direction, values], salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            direction, values = signing.loads(cursor, salt=CURSOR_SALT)
+            if direction not in ("n", "p") or len(values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            return direction, [None if value is None else field.to_python(value) for field, value in zip(self.fields, values)]
+        except (signing.BadSignature, ValueError, TypeError) as error:
+            raise InvalidCursor(cursor) from error
+
+
+class KeysetPaginationMixin:
+    """ListView mixin paginating with KeysetPaginator, falling back to Django's paginator when ?page= is given."""
+    keyset = ("id",)
+    cursor_kwarg = "cursor"
+
+    def get_ordering(self):
+        return self.ordering or self.keyset
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.page_kwarg in self.request.GET or self.page_kwarg in self.kwargs:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = KeysetPaginator(queryset, page_size, self.keyset)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404(_("Invalid cursor"))
+
+        if page.next_cursor:
+            page.next_querystring = self._cursor_querystring(page.next_cursor)
+        if page.previous_cursor:
+            page.previous_querystring = self._cursor_querystring(page.previous_cursor)
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def _cursor_querystring(self, cursor):
+        query = self.request.GET.copy()
+        query[self.cursor_kwarg] = cursor
+        return query.urlencode()
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator using the planner's row estimate instead of COUNT(*) for unfiltered querysets of big tables.
+
+    The estimate comes from pg_class.reltuples on PostgreSQL and from the ANALYZE statistics on SQLite; small
+    tables, filtered querysets and tables without statistics are counted exactly.
+    """
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if getattr(queryset, "query", None) is not None and not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        return super().count
+
+
+def estimate_row_count(model, using="default"):
+    """Returns the number of rows in the model's table according to the database statistics (None if unknown)."""
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [connection.ops.quote_name(table)])
+            elif connection.vendor == "sqlite":
+                # the first number of each statistics row is the number of rows of the table (idx NULL) or of
+                # one of its indexes, which is smaller for partial indexes: the largest one counts the table
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+            else:
+                return None
+            rows = cursor.fetchall()
+    except DatabaseError:
+        # e.g. no sqlite_stat1 table before the first ANALYZE
+        return None
+    if not rows:
+        return None
+    estimate = max(int(str(stat).split()[0]) for stat, in rows)
+    # -1: never analyzed (PostgreSQL 14+)
+    return estimate if estimate >= 0 else None
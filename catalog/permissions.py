@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .cache import bump_versions, get_versions
+
+# Permissions of the users kept in the cache between requests.
+#
+# ModelBackend loads the permissions of a user, and those of their groups, with two queries the first time
+# they are checked in a request (by PermissionRequiredMixin, @permission_required or {{ perms }} in the
+# templates), and keeps them on the user object only until the request is done. CachedPermissionsBackend
+# keeps them in the cache under the id of the user and two version tokens (see catalog/cache.py): one for
+# the user, replaced when the user or their permissions or groups change, and one for all the users, replaced
+# when the permissions of a group or the permissions themselves change. The receivers in catalog/signals.py
+# replace the tokens.
+
+PERMISSIONS_KEY = "catalog:permissions:{}:{}:{}"
+ALL_USERS = "permissions"
+
+
+def permissions_timeout():
+    return getattr(settings, "CATALOG_PERMISSIONS_CACHE_TIMEOUT", 60 * 60)
+
+
+def _user_version_name(user_id):
+    return f"permissions:user:{user_id}"
+
+
+def bump_user_permissions(user_ids):
+    """Invalidates the cached permissions of the given users."""
+    bump_versions([_user_version_name(user_id) for user_id in user_ids if user_id is not None])
+
+
+def bump_all_permissions():
+    """Invalidates the cached permissions of every user."""
+    bump_versions([ALL_USERS])
+
+
+class CachedPermissionsBackend(ModelBackend):
+    """ModelBackend keeping the permissions of active users in the cache."""
+
+    def _get_permissions(self, user_obj, obj, from_name):
+        # the inactive and anonymous users have no permissions, and there are no object permissions
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        perm_cache_name = f"_{from_name}_perm_cache"
+        if not hasattr(user_obj, perm_cache_name):
+            # both sets are needed for any check, so they are cached together
+            permissions = self._get_cached_permissions(user_obj)
+            user_obj._user_perm_cache, user_obj._group_perm_cache = permissions
+        return getattr(user_obj, perm_cache_name)
+
+    def _get_cached_permissions(self, user_obj):
+        key = PERMISSIONS_KEY.format(user_obj.pk, *get_versions([_user_version_name(user_obj.pk), ALL_USERS]))
+        permissions = cache.get(key)
+        if permissions is None:
+            permissions = (
+                super()._get_permissions(user_obj, None, "user"),
+                super()._get_permissions(user_obj, None, "group"),
+            )
+            cache.set(key, permissions, permissions_timeout())
+        return permissions
@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.views.generic import DetailView, ListView
+
+# Read replicas.
+#
+# With replicas of the default database configured (DATABASE_REPLICA_URLS, see the settings), the catalog
+# pages read from one of them, so that browsing does not compete with the circulation writes on the
+# primary. ReplicaMiddleware picks a replica for GET and HEAD requests to ListView and DetailView subclasses
+# and to the function views marked with @replica_reads; ReplicaRouter then sends the reads of the catalog
+# models to it. Everything else goes to the primary: writes, the admin, the forms, and the sessions, users
+# and permissions, which are read on every request and must not lag behind a login.
+#
+# Replicas lag behind the primary, so a user who just wrote (e.g. renewed a book) is pinned to the primary
+# for CATALOG_READ_YOUR_WRITES_SECONDS by a cookie, and sees their change on the next page. The pages and
+# fragments cached for every visitor (see catalog/cache.py) are built from the primary (read_from_primary()):
+# built from a lagging replica right after a change, they would stay stale under the new cache version until
+# they expire.
+#
+# Locally, a second SQLite file can stand in for a replica: DATABASE_REPLICA_URLS=sqlite:////path/to/replica.sqlite3
+# and "python manage.py sync_replicas" to copy the primary into it, replication lag included.
+
+PRIMARY = "default"
+PINNED_COOKIE = "catalog_primary_until"
+
+_state = threading.local()
+
+
+def replica_databases():
+    return getattr(settings, "CATALOG_REPLICA_DATABASES", [])
+
+
+def read_your_writes_seconds():
+    return getattr(settings, "CATALOG_READ_YOUR_WRITES_SECONDS", 15)
+
+
+def replica_reads(view_func):
+    """Lets a function view read the catalog from a replica."""
+    view_func.replica_reads = True
+    return view_func
+
+
+def get_replica_reads(view_func):
+    view_class = getattr(view_func, "view_class", None)
+    if view_class is None:
+        return getattr(view_func, "replica_reads", False)
+    return getattr(view_class, "replica_reads", issubclass(view_class, (ListView, DetailView)))
+
+
+def current_replica():
+    """The replica the catalog is read from in the current request, or None for the primary."""
+    return getattr(_state, "replica", None)
+
+
+def read_from_primary():
+    """Reads the rest of the request from the primary, e.g. to build content cached for other requests."""
+    _state.replica = None
+
+
+class ReplicaRouter:
+    """Reads the catalog models from the replica chosen for the request, and writes everything to the primary."""
+
+    def db_for_read(self, model, **hints):
+        replica = current_replica()
+        if replica is not None and model._meta.app_label == "catalog":
+            return replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        # the rest of the request reads what it wrote
+        _state.replica = None
+        _state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        databases = {PRIMARY, *replica_databases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.replica = None
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.replica = None
+        if replica_databases() and (_state.wrote or request.method not in ("GET", "HEAD", "OPTIONS")):
+            seconds = read_your_writes_seconds()
+            response.set_cookie(PINNED_COOKIE, str(int(time.time() + seconds)), max_age=seconds, httponly=True, samesite="Lax")
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replicas = replica_databases()
+        if replicas and request.method in ("GET", "HEAD") and get_replica_reads(view_func) and not self.is_pinned(request):
+            _state.replica = random.choice(replicas)
+
+    @staticmethod
+    def is_pinned(request):
+        try:
+            return float(request.COOKIES.get(PINNED_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
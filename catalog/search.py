@@ -0,0 +1,208 @@
+import abc
+
+from django.core import signing
+from django.db import connection as default_connection
+
+from .pagination import InvalidCursor, KeysetPage
+
+# Full-text search over book titles, summaries, author names and genre names.
+#
+# The search documents live in a catalog_booksearch table maintained with raw SQL, because its shape
+# depends on the database: a tsvector column with a GIN index on PostgreSQL and an FTS5 virtual table on
+# SQLite. The table is created by migration 0008 and kept in sync by the receivers in catalog/signals.py,
+# which also remove the documents of deleted books; "manage.py rebuild_search_index" refills it from scratch.
+#
+# Search results are (book id, score) pairs, best first. Scores are comparable only within one query and
+# are used together with the book id as the keyset for paginating results.
+
+BATCH_SIZE = 500
+CURSOR_SALT = "catalog.search"
+
+
+def _chunks(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class BaseSearchBackend(abc.ABC):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def rebuild(self):
+        pass
+
+    def index_books(self, book_ids):
+        pass
+
+    def remove_books(self, book_ids):
+        pass
+
+    @abc.abstractmethod
+    def search(self, query, limit, after=None):
+        """Returns up to limit (book id, score) pairs matching query, best first, after the (score, book id)
+        keyset of the previous page."""
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Stored, weighted tsvector documents in a GIN indexed table, ranked with ts_rank."""
+
+    document_sql = """
+        SELECT b.id,
+               setweight(to_tsvector('english', b.title), 'A') ||
+               setweight(to_tsvector('english', COALESCE(a.first_name || ' ' || a.last_name, '')), 'B') ||
+               setweight(to_tsvector('english', COALESCE(
+                   (SELECT string_agg(g.name, ' ') FROM catalog_book_genre bg
+                    JOIN catalog_genre g ON g.id = bg.genre_id WHERE bg.book_id = b.id), '')), 'C') ||
+               setweight(to_tsvector('english', b.summary), 'D')
+        FROM catalog_book b LEFT JOIN catalog_author a ON a.id = b.author_id
+    """
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("TRUNCATE catalog_booksearch")
+            cursor.execute(f"INSERT INTO catalog_booksearch (book_id, document) {self.document_sql}")
+
+    def index_books(self, book_ids):
+        with self.connection.cursor() as cursor:
+            for batch in _chunks(book_ids):
+                cursor.execute(
+                    f"INSERT INTO catalog_booksearch (book_id, document) {self.document_sql} WHERE b.id = ANY(%s) "
+                    "ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document",
+                    [batch],
+                )
+
+    def remove_books(self, book_ids):
+        with self.connection.cursor() as cursor:
+            for batch in _chunks(book_ids):
+                cursor.execute("DELETE FROM catalog_booksearch WHERE book_id = ANY(%s)", [batch])
+
+    def search(self, query, limit, after=None):
+        # ts_rank returns a real: cast it so that scores round-trip exactly through pagination cursors
+        sql = (
+            "SELECT book_id, score FROM ("
+            "SELECT book_id, ts_rank(document, query)::double precision AS score "
+            "FROM catalog_booksearch, plainto_tsquery('english', %s) query WHERE document @@ query"
+            ") matches"
+        )
+        params = [query]
+        if after is not None:
+            sql += " WHERE score < %s OR (score = %s AND book_id > %s)"
+            params += [after[0], after[0], after[1]]
+        sql += " ORDER BY score DESC, book_id LIMIT %s"
+        params.append(limit)
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """An FTS5 table whose rowids are book ids, ranked with bm25 (weights: title, authors, genres, summary)."""
+
+    document_sql = """
+        SELECT b.id, b.title,
+               COALESCE(a.first_name || ' ' || a.last_name, ''),
+               COALESCE((SELECT group_concat(g.name, ' ') FROM catalog_book_genre bg
+                         JOIN catalog_genre g ON g.id = bg.genre_id WHERE bg.book_id = b.id), ''),
+               b.summary
+        FROM catalog_book b LEFT JOIN catalog_author a ON a.id = b.author_id
+    """
+    score_sql = "-bm25(catalog_booksearch, 10.0, 5.0, 3.0, 1.0)"
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("DELETE FROM catalog_booksearch")
+            cursor.execute(f"INSERT INTO catalog_booksearch (rowid, title, authors, genres, summary) {self.document_sql}")
+
+    def index_books(self, book_ids):
+        with self.connection.cursor() as cursor:
+            for batch in _chunks(book_ids):
+                placeholders = ", ".join(["%s"] * len(batch))
+                cursor.execute(f"DELETE FROM catalog_booksearch WHERE rowid IN ({placeholders})", batch)
+                cursor.execute(
+                    f"INSERT INTO catalog_booksearch (rowid, title, authors, genres, summary) {self.document_sql} WHERE b.id IN ({placeholders})",
+                    batch,
+                )
+
+    def remove_books(self, book_ids):
+        with self.connection.cursor() as cursor:
+            for batch in _chunks(book_ids):
+                placeholders = ", ".join(["%s"] * len(batch))
+                cursor.execute(f"DELETE FROM catalog_booksearch WHERE rowid IN ({placeholders})", batch)
+
+    @staticmethod
+    def match_expression(query):
+        """Quotes every word of the query so that FTS5 operators typed by users are matched literally."""
+        words = query.split()
+        return " ".join('"{}"'.format(word.replace('"', '""')) for word in words)
+
+    def search(self, query, limit, after=None):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        sql = f"SELECT rowid, {self.score_sql} AS score FROM catalog_booksearch WHERE catalog_booksearch MATCH %s"
+        params = [expression]
+        if after is not None:
+            sql += f" AND ({self.score_sql} < %s OR ({self.score_sql} = %s AND rowid > %s))"
+            params += [after[0], after[0], after[1]]
+        sql += " ORDER BY score DESC, rowid LIMIT %s"
+        params.append(limit)
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class BasicSearchBackend(BaseSearchBackend):
+    """Unindexed fallback for other databases: matches every word with icontains and ranks all matches equally."""
+
+    def search(self, query, limit, after=None):
+        from django.db.models import Q
+
+        from .models import Book
+
+        books = Book.objects.all()
+        for word in query.split():
+            books = books.filter(
+                Q(title__icontains=word) | Q(summary__icontains=word) | Q(author__first_name__icontains=word)
+                | Q(author__last_name__icontains=word) | Q(genre__name__icontains=word)
+            )
+        if after is not None:
+            books = books.filter(id__gt=after[1])
+        ids = books.distinct().order_by("id").values_list("id", flat=True)[:limit]
+        return [(book_id, 0.0) for book_id in ids]
+
+
+def get_backend(connection=None):
+    """Returns the search backend for the given (by default, the default) database connection."""
+    connection = connection or default_connection
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend(connection)
+    if connection.vendor == "sqlite":
+        return SQLiteSearchBackend(connection)
+    return BasicSearchBackend(connection)
+
+
+def search_books(query, per_page, cursor=None):
+    """Returns a KeysetPage of the books best matching the query, starting after the cursor (if any)."""
+    from .models import Book
+
+    after = None
+    if cursor:
+        try:
+            score, book_id = signing.loads(cursor, salt=CURSOR_SALT)
+            after = (float(score), int(book_id))
+        except (signing.BadSignature, ValueError, TypeError) as error:
+            raise InvalidCursor(cursor) from error
+
+    matches = get_backend().search(query, per_page + 1, after=after)
+    has_next = len(matches) > per_page
+    matches = matches[:per_page]
+
+    books = Book.objects.for_list().in_bulk([book_id for book_id, _ in matches])
+    results = [books[book_id] for book_id, _ in matches if book_id in books]
+    next_cursor = None
+    if has_next:
+        book_id, score = matches[-1]
+        next_cursor = signing.dumps([score, book_id], salt=CURSOR_SALT)
+    # the cursor lets visitors page forwards only; the browser history takes them back
+    return KeysetPage(results, None, next_cursor=next_cursor)
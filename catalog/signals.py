@@ -0,0 +1,326 @@
+import logging
+
+from django.contrib.auth.models import Group, Permission, User
+from django.core.signals import request_finished
+from django.db import DatabaseError
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from .cache import bump_author_versions, bump_book_versions, bump_versions
+from .models import Author, Book, BookInstance, CatalogStatistics, Genre, Language, CODE_TITLE_TERM, FANTASY_GENRE_TERM
+from .permissions import bump_all_permissions, bump_user_permissions
+from .search import get_backend as get_search_backend
+from .visits import visit_buffer
+
+# Bulk operations (queryset.update(), bulk_create()) bypass the model signals, so code changing the catalog in
+# bulk sends this signal once it is done. The sender is Book, or BookInstance if only copies changed; book_ids
+# are existing books whose rows, genres or copies changed and new_book_ids are books it created. statistics
+# holds the changes to the CatalogStatistics counts if the sender knows them (otherwise they are recounted).
+# Each section below has a receiver for it.
+catalog_changed_in_bulk = Signal(providing_args=["book_ids", "new_book_ids", "statistics"])
+
+logger = logging.getLogger("catalog.visits")
+
+BATCH_SIZE = 500
+
+
+def _batches(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _authors_of(book_ids):
+    author_ids = set()
+    for batch in _batches(book_ids):
+        author_ids.update(Book.objects.filter(pk__in=batch).values_list("author_id", flat=True))
+    return author_ids - {None}
+
+
+# The receivers below keep the CatalogStatistics row (shown on the home page) up to date.
+# Each pre_save receiver remembers the stored state of the row so that post_save can apply the difference.
+
+
+def _is_fantasy(name):
+    return FANTASY_GENRE_TERM in (name or "").lower()
+
+
+def _contains_code(title):
+    return CODE_TITLE_TERM in (title or "").lower()
+
+
+def _remember_previous(instance, model, *fields):
+    """Stores the currently saved values of the given fields on the instance (None if it is not saved yet)."""
+    previous = None
+    if instance.pk is not None:
+        previous = model._default_manager.filter(pk=instance.pk).values(*fields).first()
+    instance._catalog_previous = previous
+
+
+@receiver(pre_save, sender=Book)
+def remember_book(sender, instance, **kwargs):
+    _remember_previous(instance, Book, "title", "author_id")
+
+
+@receiver(post_save, sender=Book)
+def count_saved_book(sender, instance, **kwargs):
+    previous = getattr(instance, "_catalog_previous", None)
+    if previous is None:
+        CatalogStatistics.adjust(num_books=1, num_book_titles_containing_code=int(_contains_code(instance.title)))
+    else:
+        CatalogStatistics.adjust(num_book_titles_containing_code=int(_contains_code(instance.title)) - int(_contains_code(previous["title"])))
+
+
+@receiver(post_delete, sender=Book)
+def count_deleted_book(sender, instance, **kwargs):
+    CatalogStatistics.adjust(num_books=-1, num_book_titles_containing_code=-int(_contains_code(instance.title)))
+
+
+@receiver(pre_save, sender=BookInstance)
+def remember_book_instance(sender, instance, **kwargs):
+    _remember_previous(instance, BookInstance, "status", "book_id")
+
+
+@receiver(post_save, sender=BookInstance)
+def count_saved_book_instance(sender, instance, **kwargs):
+    previous = getattr(instance, "_catalog_previous", None)
+    if previous is None:
+        CatalogStatistics.adjust(num_instances=1, num_instances_available=int(instance.status == "a"))
+    else:
+        CatalogStatistics.adjust(num_instances_available=int(instance.status == "a") - int(previous["status"] == "a"))
+
+
+@receiver(post_delete, sender=BookInstance)
+def count_deleted_book_instance(sender, instance, **kwargs):
+    CatalogStatistics.adjust(num_instances=-1, num_instances_available=-int(instance.status == "a"))
+
+
+@receiver(pre_save, sender=Author)
+def remember_author(sender, instance, **kwargs):
+    _remember_previous(instance, Author, "pk")
+
+
+@receiver(post_save, sender=Author)
+def count_saved_author(sender, instance, **kwargs):
+    if getattr(instance, "_catalog_previous", None) is None:
+        CatalogStatistics.adjust(num_authors=1)
+
+
+@receiver(post_delete, sender=Author)
+def count_deleted_author(sender, instance, **kwargs):
+    CatalogStatistics.adjust(num_authors=-1)
+
+
+@receiver(pre_save, sender=Genre)
+def remember_genre(sender, instance, **kwargs):
+    _remember_previous(instance, Genre, "name")
+
+
+@receiver(post_save, sender=Genre)
+def count_saved_genre(sender, instance, **kwargs):
+    previous = getattr(instance, "_catalog_previous", None)
+    previous_fantasy = _is_fantasy(previous["name"]) if previous is not None else False
+    CatalogStatistics.adjust(num_fantasy_genres=int(_is_fantasy(instance.name)) - int(previous_fantasy))
+
+
+@receiver(post_delete, sender=Genre)
+def count_deleted_genre(sender, instance, **kwargs):
+    CatalogStatistics.adjust(num_fantasy_genres=-int(_is_fantasy(instance.name)))
+
+
+@receiver(catalog_changed_in_bulk)
+def count_bulk_changes(sender, statistics=None, **kwargs):
+    if statistics is None:
+        CatalogStatistics.rebuild()
+    else:
+        CatalogStatistics.adjust(**statistics)
+
+
+@receiver(request_finished)
+def flush_visits(sender, **kwargs):
+    # runs once the response has been sent, so page views never wait on the visit counter writes; should the
+    # write fail, the visits stay buffered for the next flush
+    try:
+        visit_buffer.flush_if_due()
+    except DatabaseError:
+        logger.exception("Could not write the buffered visits")
+
+
+# The receivers below keep the full-text search table (see catalog/search.py) in sync with the books,
+# their authors and their genres.
+
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, **kwargs):
+    get_search_backend().index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def unindex_deleted_book(sender, instance, **kwargs):
+    get_search_backend().remove_books([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def index_book_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            get_search_backend().index_books([instance.pk])
+    elif action == "pre_clear":
+        # remember the genre's books before their links are removed
+        instance._catalog_book_ids = list(instance.book_set.values_list("pk", flat=True))
+    elif action == "post_clear":
+        get_search_backend().index_books(getattr(instance, "_catalog_book_ids", []))
+    elif action in ("post_add", "post_remove"):
+        get_search_backend().index_books(pk_set)
+
+
+@receiver(catalog_changed_in_bulk)
+def index_bulk_changes(sender, book_ids=(), new_book_ids=(), **kwargs):
+    # copies are not part of the search documents
+    if sender is not BookInstance:
+        get_search_backend().index_books([*book_ids, *new_book_ids])
+
+
+@receiver(post_save, sender=Author)
+def index_author_books(sender, instance, created, **kwargs):
+    if not created:
+        get_search_backend().index_books(instance.book_set.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Genre)
+def index_genre_books(sender, instance, created, **kwargs):
+    if not created:
+        get_search_backend().index_books(instance.book_set.values_list("pk", flat=True))
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+@receiver(pre_delete, sender=Language)
+def remember_related_books(sender, instance, **kwargs):
+    # the links to the books are removed without signals, so reindex them once the deletion is done
+    instance._catalog_book_ids = list(instance.book_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+def index_related_books(sender, instance, **kwargs):
+    get_search_backend().index_books(getattr(instance, "_catalog_book_ids", []))
+
+
+# The receivers below invalidate the cached pages and fragments, and the validators of the pages (see
+# catalog/cache.py and catalog/conditional.py).
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book(sender, instance, **kwargs):
+    bump_book_versions([instance.pk])
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def invalidate_book_of_copy(sender, instance, **kwargs):
+    previous = getattr(instance, "_catalog_previous", None)
+    bump_versions(["loans"])
+    bump_book_versions({instance.book_id, previous["book_id"] if previous else None})
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def invalidate_book_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            bump_book_versions([instance.pk])
+    elif action == "post_clear":
+        bump_book_versions(getattr(instance, "_catalog_book_ids", []))
+    elif action in ("post_add", "post_remove"):
+        bump_book_versions(pk_set)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Language)
+def invalidate_related_books(sender, instance, created, **kwargs):
+    if not created:
+        bump_book_versions(instance.book_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Language)
+def invalidate_books_of_deleted(sender, instance, **kwargs):
+    bump_book_versions(getattr(instance, "_catalog_book_ids", []))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_lists(sender, instance, **kwargs):
+    # the loan lists show book titles
+    previous = getattr(instance, "_catalog_previous", None)
+    bump_versions(["books", "loans"])
+    bump_author_versions({instance.author_id, previous["author_id"] if previous else None})
+
+
+@receiver(post_save, sender=BookInstance)
+@receiver(post_delete, sender=BookInstance)
+def invalidate_author_of_copy(sender, instance, **kwargs):
+    # the author pages show how many copies of each book are available
+    previous = getattr(instance, "_catalog_previous", None)
+    book_ids = {instance.book_id, previous["book_id"] if previous else None} - {None}
+    bump_author_versions(Book.objects.filter(pk__in=book_ids).values_list("author_id", flat=True))
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_author(sender, instance, **kwargs):
+    bump_versions(["authors", "books"])
+    bump_author_versions([instance.pk])
+
+
+@receiver(catalog_changed_in_bulk)
+def invalidate_bulk_changes(sender, book_ids=(), new_book_ids=(), **kwargs):
+    # new books have nothing cached yet, but they show up on the lists and on their author's page;
+    # copies are only shown on the pages of their book and its author, and on the loan lists
+    bump_versions(["loans"] if sender is BookInstance else ["authors", "books", "loans"])
+    bump_book_versions(book_ids)
+    bump_author_versions(_authors_of([*book_ids, *new_book_ids]))
+
+
+# The receivers below invalidate the permissions cached by CachedPermissionsBackend (see catalog/permissions.py).
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_permissions(sender, instance, update_fields=None, **kwargs):
+    # is_active and is_superuser change the permissions; logging in only saves last_login
+    if update_fields is None or set(update_fields) != {"last_login"}:
+        bump_user_permissions([instance.pk])
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_permissions_of_users(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        bump_user_permissions([instance.pk])
+    elif action == "post_clear":
+        # the users of a cleared permission or group are not known any more
+        bump_all_permissions()
+    else:
+        bump_user_permissions(pk_set)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_permissions_of_groups(sender, action, **kwargs):
+    # changes the permissions of every member of the groups
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_all_permissions()
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+@receiver(post_migrate)
+def invalidate_all_permissions(sender, **kwargs):
+    # migrations create the permissions of new models with bulk_create, and superusers have all of them
+    bump_all_permissions()
@@ -0,0 +1,20 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from catalog.assets import SITE_STYLESHEET, critical_css
+
+register = template.Library()
+
+
+@register.simple_tag
+def stylesheets():
+    """Inlines the critical CSS and loads the rest of the stylesheet without blocking rendering."""
+    url = static(SITE_STYLESHEET)
+    return format_html(
+        '<style>{}</style>\n'
+        '    <link rel="preload" href="{}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">\n'
+        '    <noscript><link rel="stylesheet" href="{}"></noscript>',
+        mark_safe(critical_css()), url, url,
+    )
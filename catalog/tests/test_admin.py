@@ -0,0 +1,135 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.pagination import EstimatedCountPaginator, estimate_row_count
+
+
+class ChangeListQueryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='drowssap1')
+        cls.genres = [Genre.objects.create(name=f'Genre {number}') for number in range(4)]
+        cls.borrower = User.objects.create_user(username='borrower', password='drowssap1')
+
+    def setUp(self):
+        self.client.login(username='admin', password='drowssap1')
+
+    def add_books(self, number):
+        for _ in range(number):
+            book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+            book.genre.set(self.genres)
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=self.borrower)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        for url in [reverse('admin:catalog_book_changelist'), reverse('admin:catalog_bookinstance_changelist')]:
+            self.add_books(2)
+            num_queries = self.count_queries(url)
+            self.add_books(8)
+            self.assertEqual(self.count_queries(url), num_queries, url)
+
+    def test_display_genre_uses_prefetched_genres(self):
+        self.add_books(1)
+        response = self.client.get(reverse('admin:catalog_book_changelist'))
+        self.assertContains(response, 'Genre 0, Genre 1, Genre 2<')
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        BookInstance.objects.bulk_create([BookInstance(book=book, imprint='Imprint', status='a') for _ in range(30)])
+
+    def paginator(self, queryset, threshold):
+        paginator = EstimatedCountPaginator(queryset, 10)
+        paginator.estimate_threshold = threshold
+        return paginator
+
+    def test_small_or_unanalyzed_tables_are_counted(self):
+        self.assertEqual(self.paginator(BookInstance.objects.all(), threshold=100000).count, 30)
+
+    def test_estimate_from_statistics(self):
+        # the partial index of the copies on loan has statistics of its own
+        BookInstance.objects.filter(pk__in=BookInstance.objects.values('pk')[:3]).update(status='o', due_back=datetime.date.today())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        estimate = estimate_row_count(BookInstance)
+        if estimate is None:
+            self.skipTest('no row estimates on this database')
+        self.assertEqual(estimate, 30)
+
+        BookInstance.objects.filter(pk__in=BookInstance.objects.values('pk')[:5]).delete()
+        # the statistics were gathered before the deletion
+        with self.assertNumQueries(1):
+            self.assertEqual(self.paginator(BookInstance.objects.all(), threshold=10).count, estimate)
+        # filtered querysets are counted exactly
+        self.assertEqual(self.paginator(BookInstance.objects.filter(status='a'), threshold=10).count, BookInstance.objects.filter(status='a').count())
+
+
+class EditPageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='drowssap1')
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.language = Language.objects.create(name='English')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=cls.author, language=cls.language)
+        cls.genre = Genre.objects.create(name='Fantasy')
+        cls.book.genre.add(cls.genre)
+        cls.copies = [BookInstance.objects.create(book=cls.book, imprint=f'Imprint {number}', status='a') for number in range(25)]
+        for number in range(30):
+            User.objects.create_user(username=f'borrower{number}')
+
+    def setUp(self):
+        self.client.login(username='admin', password='drowssap1')
+
+    def test_foreign_keys_use_autocomplete(self):
+        response = self.client.get(reverse('admin:catalog_bookinstance_change', args=[self.copies[0].pk]))
+        self.assertContains(response, 'data-ajax--url="/admin/catalog/book/autocomplete/"')
+        self.assertContains(response, 'data-ajax--url="/admin/auth/user/autocomplete/"')
+        # the users are not rendered as options
+        self.assertNotContains(response, 'borrower29')
+
+        response = self.client.get(reverse('admin:catalog_book_change', args=[self.book.pk]))
+        self.assertContains(response, 'data-ajax--url="/admin/catalog/author/autocomplete/"')
+        self.assertContains(response, 'data-ajax--url="/admin/catalog/language/autocomplete/"')
+
+    def test_inlines_are_capped(self):
+        response = self.client.get(reverse('admin:catalog_book_change', args=[self.book.pk]))
+        self.assertEqual(len(response.context['inline_admin_formsets'][0].formset.forms), 20)
+        self.assertContains(response, 'Showing 20 of 25 book instances.')
+        self.assertContains(response, f'href="/admin/catalog/bookinstance/?book__id__exact={self.book.pk}"')
+
+        changelist = self.client.get(f'/admin/catalog/bookinstance/?book__id__exact={self.book.pk}')
+        self.assertEqual(changelist.context['cl'].result_count, 25)
+
+        response = self.client.get(reverse('admin:catalog_author_change', args=[self.author.pk]))
+        self.assertNotContains(response, 'View all')
+
+    def test_capped_inline_saves(self):
+        url = reverse('admin:catalog_book_change', args=[self.book.pk])
+        formset = self.client.get(url).context['inline_admin_formsets'][0].formset
+        data = {
+            'title': 'New Title', 'summary': 'Summary', 'isbn': 'ABCDEFG', 'author': self.author.pk, 'language': self.language.pk, 'genre': [self.genre.pk],
+            'bookinstance_set-TOTAL_FORMS': 20, 'bookinstance_set-INITIAL_FORMS': 20,
+            'bookinstance_set-MIN_NUM_FORMS': 0, 'bookinstance_set-MAX_NUM_FORMS': 1000,
+        }
+        for index, form in enumerate(formset.forms):
+            data.update({
+                f'bookinstance_set-{index}-id': form.instance.pk, f'bookinstance_set-{index}-book': self.book.pk,
+                f'bookinstance_set-{index}-imprint': 'Changed', f'bookinstance_set-{index}-status': 'm',
+            })
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(BookInstance.objects.filter(imprint='Changed').count(), 20)
+        self.assertEqual(BookInstance.objects.count(), 25)
@@ -0,0 +1,187 @@
+import datetime
+import json
+import threading
+import uuid
+from collections import Counter
+
+from django.contrib.auth.models import Permission, User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from catalog.circulation import CHECKED_OUT, checkout_copies, return_copies
+from catalog.models import Author, Book, BookInstance, CatalogStatistics, Genre, Language
+
+
+class CatalogReadApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith', date_of_birth=datetime.date(1950, 1, 2))
+        language = Language.objects.create(name='English')
+        cls.books = [
+            Book.objects.create(title=f'Book {number}', summary='Summary', isbn='ABCDEFG', author=cls.author, language=language)
+            for number in range(25)
+        ]
+        cls.books[0].genre.set([Genre.objects.create(name='Fantasy'), Genre.objects.create(name='Comedy')])
+        cls.copies = [
+            BookInstance.objects.create(book=cls.books[0], imprint='Imprint', status=status, due_back=due_back)
+            for status, due_back in [('a', None), ('o', datetime.date(2020, 1, 1))]
+        ]
+        for number in range(3):
+            Author.objects.create(first_name=f'Jane {number}', last_name='Doe')
+
+    def test_book_list_with_cursor(self):
+        with self.assertNumQueries(1):
+            data = self.client.get(reverse('api-books')).json()
+        self.assertEqual(data['fields'], ['id', 'title', 'author', 'author_first_name', 'author_last_name'])
+        self.assertEqual(data['rows'][0], [self.books[0].pk, 'Book 0', self.author.pk, 'John', 'Smith'])
+        self.assertEqual(len(data['rows']), 20)
+        self.assertIsNone(data['previous'])
+
+        data = self.client.get(reverse('api-books'), {'cursor': data['next'], 'fields': 'title'}).json()
+        self.assertEqual(data['rows'], [[f'Book {number}'] for number in range(20, 25)])
+        self.assertIsNone(data['next'])
+
+    def test_author_list(self):
+        data = self.client.get(reverse('api-authors'), {'limit': 2, 'fields': 'last_name,first_name,date_of_birth'}).json()
+        self.assertEqual(data['rows'], [['Doe', 'Jane 0', None], ['Doe', 'Jane 1', None]])
+        data = self.client.get(reverse('api-authors'), {'limit': 2, 'cursor': data['next'], 'fields': 'last_name,date_of_birth'}).json()
+        self.assertEqual(data['rows'], [['Doe', None], ['Smith', '1950-01-02']])
+
+    def test_details(self):
+        with self.assertNumQueries(2):
+            book = self.client.get(reverse('api-book-detail', args=[self.books[0].pk])).json()
+        self.assertEqual(book['language'], 'English')
+        self.assertEqual(book['genres'], ['Comedy', 'Fantasy'])
+
+        author = self.client.get(reverse('api-author-detail', args=[self.author.pk]), {'fields': 'id,last_name'}).json()
+        self.assertEqual(author['last_name'], 'Smith')
+        self.assertNotIn('first_name', author)
+        self.assertEqual(len(author['books']['rows']), 25)
+
+        self.assertEqual(self.client.get(reverse('api-book-detail', args=[0])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api-author-detail', args=[0])).status_code, 404)
+
+    def test_availability(self):
+        data = self.client.get(reverse('api-book-availability', args=[self.books[0].pk])).json()
+        self.assertEqual(data['available'], 1)
+        self.assertEqual(data['copies']['fields'], ['id', 'imprint', 'status', 'due_back'])
+        self.assertCountEqual(data['copies']['rows'], [
+            [str(self.copies[1].pk), 'Imprint', 'o', '2020-01-01'], [str(self.copies[0].pk), 'Imprint', 'a', None],
+        ])
+
+    def test_bad_requests(self):
+        response = self.client.get(reverse('api-books'), {'fields': 'title,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Unknown fields: password', response.json()['error'])
+        self.assertEqual(self.client.get(reverse('api-books'), {'cursor': 'bad'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api-books'), {'limit': 'many'}).status_code, 400)
+
+    def test_compact_gzipped_output(self):
+        response = self.client.get(reverse('api-books'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        response = self.client.get(reverse('api-books'))
+        self.assertNotIn(b', ', response.content.replace(b'Book ', b''))
+
+
+class CirculationApiTest(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        self.copies = [BookInstance.objects.create(book=self.book, imprint='Imprint', status='a') for _ in range(2)]
+        self.borrower = User.objects.create_user(username='borrower', password='drowssap1')
+        librarian = User.objects.create_user(username='librarian', password='drowssap1')
+        librarian.user_permissions.add(Permission.objects.get(codename='can_mark_returned'))
+        self.client.login(username='librarian', password='drowssap1')
+
+    def post(self, name, payload):
+        return self.client.post(reverse(name), json.dumps(payload), content_type='application/json')
+
+    def test_checkout_and_return(self):
+        missing = uuid.uuid4()
+        response = self.post('api-checkout', {'copies': [str(self.copies[0].pk), str(missing)], 'borrower': 'borrower'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'results': [
+                {'id': str(self.copies[0].pk), 'outcome': 'checked out', 'title': 'Book Title'},
+                {'id': str(missing), 'outcome': 'not found', 'title': None},
+            ],
+            'succeeded': 1,
+        })
+        copy = BookInstance.objects.get(pk=self.copies[0].pk)
+        self.assertEqual((copy.status, copy.borrower, copy.due_back), ('o', self.borrower, datetime.date.today() + datetime.timedelta(weeks=3)))
+        self.assertEqual(CatalogStatistics.load().num_instances_available, 1)
+
+        # the copy is already lent
+        response = self.post('api-checkout', {'copies': [str(self.copies[0].pk)], 'borrower': 'librarian'})
+        self.assertEqual(response.json()['results'][0]['outcome'], 'not available')
+
+        response = self.post('api-return', {'copies': [str(self.copies[0].pk), str(self.copies[1].pk)]})
+        self.assertEqual([result['outcome'] for result in response.json()['results']], ['returned', 'not on loan'])
+        self.assertEqual(CatalogStatistics.load().num_instances_available, 2)
+
+    def test_due_date_follows_renewal_rules(self):
+        due_back = datetime.date.today() + datetime.timedelta(weeks=1)
+        self.post('api-checkout', {'copies': [str(self.copies[0].pk)], 'borrower': 'borrower', 'due_back': due_back.isoformat()})
+        self.assertEqual(BookInstance.objects.get(pk=self.copies[0].pk).due_back, due_back)
+
+        too_late = datetime.date.today() + datetime.timedelta(weeks=5)
+        response = self.post('api-checkout', {'copies': [str(self.copies[1].pk)], 'borrower': 'borrower', 'due_back': too_late.isoformat()})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Invalid date - renewal more than 4 weeks ahead'})
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.post(reverse('api-checkout'), 'not json', content_type='application/json').status_code, 400)
+        self.assertEqual(self.post('api-checkout', {'copies': ['not-an-id'], 'borrower': 'borrower'}).status_code, 400)
+        self.assertEqual(self.post('api-checkout', {'copies': [str(self.copies[0].pk)], 'borrower': 'nobody'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api-checkout')).status_code, 405)
+        self.assertEqual(BookInstance.objects.filter(status='o').count(), 0)
+
+    def test_requires_permission(self):
+        self.client.login(username='borrower', password='drowssap1')
+        self.assertEqual(self.post('api-checkout', {'copies': [], 'borrower': 'borrower'}).status_code, 403)
+        self.assertEqual(self.post('api-return', {'copies': []}).status_code, 403)
+
+
+class CheckoutConcurrencyTest(TransactionTestCase):
+    num_threads = 8
+    num_rounds = 5
+
+    def test_copies_are_never_lent_twice(self):
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        copy_ids = [BookInstance.objects.create(book=book, imprint='Imprint', status='a').pk for _ in range(5)]
+        borrowers = [User.objects.create_user(username=f'borrower{number}') for number in range(self.num_threads)]
+        due_back = datetime.date.today() + datetime.timedelta(weeks=3)
+
+        barrier = threading.Barrier(self.num_threads)
+        lock = threading.Lock()
+        lent = Counter()
+        errors = []
+
+        def lend(borrower):
+            try:
+                for round_number in range(self.num_rounds):
+                    # every thread asks for the same copies at the same time (in a different order)
+                    barrier.wait()
+                    ordered = copy_ids[borrower.pk % len(copy_ids):] + copy_ids[:borrower.pk % len(copy_ids)]
+                    results = checkout_copies(ordered, borrower, due_back)
+                    with lock:
+                        lent.update((round_number, result.copy_id) for result in results if result.outcome == CHECKED_OUT)
+                    barrier.wait()
+                    return_copies([result.copy_id for result in results if result.outcome == CHECKED_OUT])
+            except Exception as error:
+                errors.append(error)
+                barrier.abort()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=lend, args=(borrower,)) for borrower in borrowers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        # each copy was lent exactly once per round
+        self.assertEqual(lent, Counter({(round_number, copy_id): 1 for round_number in range(self.num_rounds) for copy_id in copy_ids}))
+        self.assertEqual(BookInstance.objects.filter(status='a').count(), len(copy_ids))
+        self.assertEqual(CatalogStatistics.load().num_instances_available, len(copy_ids))
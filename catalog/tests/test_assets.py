@@ -0,0 +1,94 @@
+import unittest
+
+from django.templatetags.static import static
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from catalog.assets import CRITICAL_STYLESHEET, SITE_STYLESHEET, StylesheetFinder, build, parse, serialize, shake
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CSS = '''
+/*! License */
+/* dropped */
+.used { color : red ; }
+.unused, .used > a { margin: 0 }
+@media (min-width: 576px) {
+    .unused { color: blue }
+    .used { content: " (" attr(title) ")" }
+}
+@media print { .unused { color: green } }
+.used:not(.disabled) { cursor: pointer }
+a[href$=".pdf"] { color: black }
+@keyframes spin { from { opacity: 0 } to { opacity: 1 } }
+@keyframes fade { from { opacity: 0 } to { opacity: 1 } }
+.used.animated { animation: spin 1s }
+'''
+
+
+class StylesheetTest(SimpleTestCase):
+    def test_parse_and_serialize(self):
+        rules = parse(CSS)
+
+        self.assertEqual(rules[0].prelude, '/*! License */')
+        self.assertEqual(rules[1], ('.used', 'color:red'))
+        self.assertEqual(rules[3].body[1], ('.used', 'content:" (" attr(title) ")"'))
+        self.assertEqual(parse(serialize(rules)), rules)
+
+    def test_shake(self):
+        css = serialize(shake(parse(CSS), {'used', 'animated'}))
+
+        self.assertEqual(css, (
+            '/*! License */\n.used{color:red}.used>a{margin:0}@media (min-width: 576px){.used{content:" (" attr(title) ")"}}'
+            '.used:not(.disabled){cursor:pointer}a[href$=".pdf"]{color:black}'
+            '@keyframes spin{from{opacity:0}to{opacity:1}}.used.animated{animation:spin 1s}'
+        ))
+
+    def test_build(self):
+        stylesheets = build()
+
+        site, critical = stylesheets[SITE_STYLESHEET], stylesheets[CRITICAL_STYLESHEET]
+        self.assertIn('Bootstrap v4.1.3', site)
+        for css in (site, critical):
+            self.assertIn('.sidebar-nav{', css)
+            self.assertIn('.col-sm-10{', css)
+            self.assertNotIn('.carousel', css)
+        # used by the lists, not by the layout
+        self.assertIn('.table{', site)
+        self.assertNotIn('.table{', critical)
+
+    def test_finder(self):
+        finder = StylesheetFinder()
+
+        self.assertEqual(finder.find('css/styles.css'), [])
+        with open(finder.find(SITE_STYLESHEET), encoding='utf-8') as file:
+            self.assertEqual(file.read(), build()[SITE_STYLESHEET])
+        self.assertEqual(sorted(path for path, _ in finder.list(None)), [CRITICAL_STYLESHEET, SITE_STYLESHEET])
+
+
+class StylesheetServingTest(TestCase):
+    def test_pages_inline_critical_css(self):
+        response = self.client.get(reverse('index'))
+
+        self.assertContains(response, '<style>/*!\n * Bootstrap v4.1.3')
+        self.assertContains(response, '.sidebar-nav{')
+        self.assertContains(response, 'href="{}" as="style"'.format(static(SITE_STYLESHEET)))
+        self.assertNotContains(response, 'bootstrapcdn')
+
+    def test_bundle_is_cached_forever(self):
+        url = static(SITE_STYLESHEET)
+        self.assertRegex(url, r'^/static/css/site\.[0-9a-f]{12}\.css$')
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('max-age=315360000', response['Cache-Control'])
+        self.assertIn('immutable', response['Cache-Control'])
+
+    @unittest.skipIf(brotli is None, 'Brotli is not installed')
+    def test_bundle_is_compressed_with_brotli(self):
+        response = self.client.get(static(SITE_STYLESHEET), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn(b'.sidebar-nav{', brotli.decompress(b''.join(response.streaming_content)))
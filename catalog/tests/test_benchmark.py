@@ -0,0 +1,121 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.urls import URLPattern
+
+from catalog import urls
+from catalog.models import Author, Book, BookInstance, CatalogStatistics, Genre, Language
+
+
+class GenerateCatalogCommandTest(TestCase):
+    def generate(self, **options):
+        call_command('generate_catalog', stdout=StringIO(), **options)
+
+    def test_generates_catalog(self):
+        self.generate(books=300, copies_per_book=4, users=20, authors=30, batch_size=100)
+
+        self.assertEqual(Book.objects.count(), 300)
+        self.assertEqual(Author.objects.count(), 30)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertFalse(User.objects.first().has_usable_password())
+        self.assertFalse(Book.objects.filter(genre=None).exists())
+        self.assertEqual(Language.objects.filter(name='English').count(), 1)
+        self.assertAlmostEqual(BookInstance.objects.count() / 300, 4, delta=1)
+        self.assertEqual(CatalogStatistics.load().num_books, 300)
+
+        loans = BookInstance.objects.filter(status='o')
+        self.assertAlmostEqual(loans.count() / BookInstance.objects.count(), 0.3, delta=0.1)
+        self.assertFalse(loans.filter(borrower=None).exists())
+        self.assertTrue(BookInstance.objects.overdue().exists())
+
+    def test_popularity_is_skewed(self):
+        self.generate(books=1000, users=0, authors=100)
+
+        # the 10 most prolific authors wrote about half of the books
+        counts = sorted((author.book_set.count() for author in Author.objects.all()), reverse=True)
+        self.assertGreater(sum(counts[:10]), 350)
+
+    def test_is_repeatable(self):
+        self.generate(books=50, users=5, seed=3)
+        titles = list(Book.objects.order_by('pk').values_list('title', flat=True))
+        self.generate(books=50, users=5, seed=3)
+
+        self.assertEqual(list(Book.objects.order_by('pk').values_list('title', flat=True))[50:], titles)
+        # the usernames do not clash
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(Genre.objects.filter(name='Fantasy').count(), 1)
+
+    def test_usernames_follow_earlier_readers(self):
+        # the admin and a deleted reader would shift numbers based on the user count
+        User.objects.create_user(username='admin')
+        self.generate(books=0, users=3)
+        User.objects.get(username='reader1').delete()
+        self.generate(books=0, users=2)
+
+        self.assertEqual(
+            sorted(User.objects.values_list('username', flat=True)),
+            ['admin', 'reader0', 'reader2', 'reader3', 'reader4'],
+        )
+
+    def test_rejects_invalid_options(self):
+        with self.assertRaises(CommandError):
+            self.generate(books=10, on_loan=2)
+
+
+class BenchmarkViewsCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_catalog', books=20, users=3, stdout=StringIO())
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='drowssap1')
+
+    def benchmark(self, *args, **options):
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as file:
+            pass
+        self.addCleanup(os.remove, file.name)
+        call_command('benchmark_views', *args, repeat=2, output=file.name, stderr=StringIO(), **options)
+        with open(file.name, encoding='utf-8') as report:
+            return json.load(report)
+
+    def test_reports_every_page(self):
+        report = self.benchmark()
+
+        names = {pattern.name for pattern in urls.urlpatterns if isinstance(pattern, URLPattern)}
+        self.assertLessEqual(names, set(report['results']))
+        self.assertIn('admin:catalog_bookinstance_changelist', report['results'])
+        self.assertEqual(report['meta']['user'], 'admin')
+        self.assertEqual(report['meta']['rows']['books'], 20)
+
+        result = report['results']['book-detail']
+        self.assertEqual(result['status'], 200)
+        self.assertEqual(set(result['latency_ms']), {'p50', 'p90', 'p95', 'p99', 'max', 'mean'})
+        self.assertGreater(result['queries']['median'], 0)
+        self.assertIn('skipped', report['results']['api-checkout'])
+        # streamed responses are read, so their queries are counted
+        self.assertGreater(report['results']['export']['queries']['median'], 0)
+
+    def test_anonymous(self):
+        report = self.benchmark(anonymous=True)
+
+        self.assertIsNone(report['meta']['user'])
+        self.assertEqual(report['results']['books']['status'], 200)
+        self.assertEqual(report['results']['all-borrowed-books']['status'], 302)
+
+    def test_compares_with_previous_report(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as previous:
+            json.dump(self.benchmark(), previous)
+        self.addCleanup(os.remove, previous.name)
+        err = StringIO()
+        call_command('benchmark_views', repeat=1, compare=previous.name, stdout=StringIO(), stderr=err)
+
+        self.assertIn('book-detail: ', err.getvalue())
+        self.assertIn('Compared with the previous report', err.getvalue())
+
+    def test_requires_a_user(self):
+        with self.assertRaises(CommandError):
+            self.benchmark(user='nobody')
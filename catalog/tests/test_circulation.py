@@ -0,0 +1,127 @@
+import datetime
+import uuid
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.circulation import MAX_BATCH_SIZE, NOT_FOUND, NOT_ON_LOAN, RENEWED, RETURNED, renew_copies, return_copies
+from catalog.cache import get_versions
+from catalog.models import Book, BookInstance, CatalogStatistics
+from catalog.tests.utils import CommittingTestCase
+
+
+class CirculationTest(CommittingTestCase):
+    def setUp(self):
+        self.borrower = User.objects.create_user(username='borrower', password='drowssap1')
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        self.due_back = datetime.date.today() - datetime.timedelta(days=1)
+        self.loans = [
+            BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', due_back=self.due_back, borrower=self.borrower)
+            for _ in range(3)
+        ]
+        self.available = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+
+    def test_renew(self):
+        renewal_date = datetime.date.today() + datetime.timedelta(weeks=2)
+        missing = uuid.uuid4()
+        with CaptureQueriesContext(connection) as queries:
+            results = renew_copies([self.loans[0].pk, self.available.pk, missing, self.loans[1].pk], renewal_date)
+        # the locking SELECT and a single UPDATE
+        self.assertEqual(len([query for query in queries if 'catalog_bookinstance' in query['sql']]), 2)
+
+        self.assertEqual([(result.copy_id, result.outcome) for result in results], [
+            (self.loans[0].pk, RENEWED), (self.available.pk, NOT_ON_LOAN), (missing, NOT_FOUND), (self.loans[1].pk, RENEWED),
+        ])
+        self.assertEqual(results[0].title, 'Book Title')
+        self.assertEqual(
+            sorted(BookInstance.objects.values_list('due_back', flat=True), key=str),
+            sorted([renewal_date, renewal_date, self.due_back, None], key=str),
+        )
+
+    def test_return(self):
+        version = get_versions(['loans'])
+        results = return_copies([copy.pk for copy in self.loans[:2]])
+        self.assertTrue(all(result.outcome == RETURNED for result in results))
+        self.assertEqual(BookInstance.objects.filter(status='a', borrower=None, due_back=None).count(), 3)
+        # bulk changes keep the statistics and the cache versions up to date
+        self.assertEqual(CatalogStatistics.load().num_instances_available, 3)
+        self.assertNotEqual(get_versions(['loans']), version)
+
+        # returning again does nothing
+        self.assertEqual([result.outcome for result in return_copies([self.loans[0].pk])], [NOT_ON_LOAN])
+        self.assertEqual(CatalogStatistics.load().num_instances_available, 3)
+
+
+class CirculationDeskViewTest(CommittingTestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        self.loans = [BookInstance.objects.create(book=self.book, imprint='Imprint', status='o') for _ in range(2)]
+        User.objects.create_user(username='borrower', password='drowssap1')
+        librarian = User.objects.create_user(username='librarian', password='drowssap1', is_staff=True)
+        librarian.user_permissions.add(*Permission.objects.filter(codename__in=['can_mark_returned', 'change_bookinstance']))
+
+    def test_requires_permission(self):
+        self.client.login(username='borrower', password='drowssap1')
+        self.assertEqual(self.client.get(reverse('circulation-desk')).status_code, 302)
+
+    def test_renew_and_return(self):
+        self.client.login(username='librarian', password='drowssap1')
+        response = self.client.get(reverse('circulation-desk'))
+        self.assertEqual(response.context['form'].initial['renewal_date'], datetime.date.today() + datetime.timedelta(weeks=3))
+
+        copies = '\n'.join(str(copy.pk) for copy in self.loans)
+        renewal_date = datetime.date.today() + datetime.timedelta(weeks=1)
+        response = self.client.post(reverse('circulation-desk'), {'action': 'renew', 'copies': copies, 'renewal_date': renewal_date})
+        self.assertRedirects(response, reverse('circulation-desk'))
+        self.assertEqual(set(BookInstance.objects.values_list('due_back', flat=True)), {renewal_date})
+
+        missing = uuid.uuid4()
+        response = self.client.post(reverse('circulation-desk'), {'action': 'return', 'copies': f'{copies}\n{missing}'}, follow=True)
+        self.assertContains(response, '2 of 3 copies processed')
+        self.assertContains(response, f'{self.loans[0].pk} (Book Title): returned')
+        self.assertContains(response, f'<li class="text-danger">{missing}: not found</li>', html=True)
+        self.assertEqual(set(BookInstance.objects.values_list('status', flat=True)), {'a'})
+        # the outcomes are shown once
+        self.assertNotContains(self.client.get(reverse('circulation-desk')), 'copies processed')
+
+    def test_invalid_input(self):
+        self.client.login(username='librarian', password='drowssap1')
+        too_late = datetime.date.today() + datetime.timedelta(weeks=5)
+        response = self.client.post(reverse('circulation-desk'), {'action': 'renew', 'copies': str(self.loans[0].pk), 'renewal_date': too_late})
+        self.assertFormError(response, 'form', 'renewal_date', 'Invalid date - renewal more than 4 weeks ahead')
+        response = self.client.post(reverse('circulation-desk'), {'action': 'renew', 'copies': str(self.loans[0].pk)})
+        self.assertFormError(response, 'form', 'renewal_date', 'Enter the date to renew the copies to.')
+        response = self.client.post(reverse('circulation-desk'), {'action': 'return', 'copies': 'not-an-id'})
+        self.assertFormError(response, 'form', 'copies', 'Invalid copy IDs: not-an-id')
+        too_many = '\n'.join(str(uuid.uuid4()) for _ in range(MAX_BATCH_SIZE + 1))
+        response = self.client.post(reverse('circulation-desk'), {'action': 'return', 'copies': too_many})
+        self.assertFormError(response, 'form', 'copies', f'At most {MAX_BATCH_SIZE} copies can be processed at once.')
+        self.assertEqual(set(BookInstance.objects.values_list('status', flat=True)), {'o'})
+
+    def test_admin_actions(self):
+        self.client.login(username='librarian', password='drowssap1')
+        url = reverse('admin:catalog_bookinstance_changelist')
+        selected = [str(copy.pk) for copy in self.loans]
+
+        response = self.client.post(url, {'action': 'renew_selected', '_selected_action': selected}, follow=True)
+        self.assertContains(response, '2 renewed')
+        self.assertEqual(set(BookInstance.objects.values_list('due_back', flat=True)), {datetime.date.today() + datetime.timedelta(weeks=3)})
+
+        response = self.client.post(url, {'action': 'return_selected', '_selected_action': selected[:1]}, follow=True)
+        self.assertContains(response, '1 returned')
+        self.assertEqual(BookInstance.objects.filter(status='a').count(), 1)
+
+    def test_admin_actions_are_capped(self):
+        self.client.login(username='librarian', password='drowssap1')
+        url = reverse('admin:catalog_bookinstance_changelist')
+
+        # "select all" selects every copy, not only those of the page
+        with mock.patch('catalog.admin.MAX_BATCH_SIZE', 1):
+            response = self.client.post(url, {
+                'action': 'return_selected', 'select_across': '1', '_selected_action': [str(self.loans[0].pk)],
+            }, follow=True)
+        self.assertContains(response, 'At most 1 copies can be processed at once.')
+        self.assertEqual(set(BookInstance.objects.values_list('status', flat=True)), {'o'})
@@ -0,0 +1,73 @@
+import csv
+import datetime
+import json
+from io import StringIO
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance, Language
+from catalog.tests.utils import CommittingTestCase
+
+
+class ExportTest(CommittingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith', date_of_birth=datetime.date(1950, 1, 2))
+        cls.book = Book.objects.create(
+            title='Book, "Title"', summary='Summary', isbn='ABCDEFG', author=cls.author, language=Language.objects.create(name='English'),
+        )
+        cls.borrower = User.objects.create_user(username='borrower', password='drowssap1')
+        cls.loan = BookInstance.objects.create(
+            book=cls.book, imprint='Imprint', status='o', due_back=datetime.date(2020, 5, 1), borrower=cls.borrower,
+        )
+        BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a')
+
+        cls.librarian = User.objects.create_user(username='librarian', password='drowssap1')
+        cls.librarian.user_permissions.add(Permission.objects.get(codename='can_view_all_borrowed_books'))
+
+    def get(self, dataset, file_format):
+        self.client.login(username='librarian', password='drowssap1')
+        return self.client.get(reverse('export', args=[dataset, file_format]))
+
+    def test_requires_permission(self):
+        url = reverse('export', args=['books', 'csv'])
+        self.assertRedirects(self.client.get(url), f'/accounts/login/?next={url}')
+        self.client.login(username='borrower', password='drowssap1')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_streams_csv(self):
+        response = self.get('books', 'csv')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="books.csv"')
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'Book, "Title"')
+        self.assertEqual(rows[0]['author__last_name'], 'Smith')
+        self.assertEqual(rows[0]['language__name'], 'English')
+
+    def test_streams_json_lines(self):
+        response = self.get('borrowed', 'jsonl')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(rows, [{
+            'id': str(self.loan.pk), 'book_id': self.book.pk, 'book__title': 'Book, "Title"',
+            'due_back': '2020-05-01', 'borrower__username': 'borrower',
+        }])
+
+    def test_unknown_exports_are_not_found(self):
+        self.assertEqual(self.get('users', 'csv').status_code, 404)
+        self.assertEqual(self.get('books', 'xml').status_code, 404)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_catalog', 'authors', stdout=out)
+        self.assertEqual(out.getvalue().splitlines(), [
+            'id,first_name,last_name,date_of_birth,date_of_death',
+            f'{self.author.pk},John,Smith,1950-01-02,',
+        ])
+
+        out = StringIO()
+        call_command('export_catalog', 'copies', format='jsonl', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
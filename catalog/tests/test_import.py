@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from catalog.management.commands.import_catalog import _insert
+from catalog.models import Author, Book, CatalogStatistics, Genre, Language
+from catalog.search import get_backend
+
+
+class ImportCatalogCommandTest(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        self.genre = Genre.objects.create(name='Fantasy')
+        self.book = Book.objects.create(title='A Wizard of Earthsea', summary='A young mage.', isbn='9780553383041', author=self.author)
+
+    def import_file(self, suffix, content, **options):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8') as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        out = StringIO()
+        call_command('import_catalog', file.name, stdout=out, **options)
+        return out.getvalue()
+
+    def test_imports_csv(self):
+        output = self.import_file('.csv', (
+            'title,isbn,summary,author_first_name,author_last_name,language,genres,copies,imprint,status\n'
+            'The Dispossessed,9780061054884,An ambiguous utopia.,Ursula,Le Guin,English,Science Fiction;Fantasy,3,Harper,a\n'
+            'Dune,9780441013593,Spice.,Frank,Herbert,English,Science Fiction,,Ace,o\n'
+        ), batch_size=1)
+
+        book = Book.objects.get(isbn='9780061054884')
+        self.assertEqual(book.author, self.author)
+        self.assertEqual(book.language.name, 'English')
+        self.assertEqual(sorted(genre.name for genre in book.genre.all()), ['Fantasy', 'Science Fiction'])
+        self.assertEqual(book.bookinstance_set.filter(status='a', imprint='Harper').count(), 3)
+
+        dune = Book.objects.get(isbn='9780441013593')
+        self.assertEqual(str(dune.author), 'Herbert, Frank')
+        self.assertEqual(dune.bookinstance_set.get().status, 'o')
+        # existing authors, languages and genres are reused
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Language.objects.count(), 1)
+        self.assertEqual(Genre.objects.count(), 2)
+        self.assertIn('2 rows: 2 new books, 4 copies', output)
+
+    def test_imports_jsonl_and_adds_copies_to_known_books(self):
+        rows = [
+            {'title': 'A Wizard of Earthsea', 'isbn': '9780553383041', 'genres': ['Fantasy'], 'copies': 2, 'imprint': 'Bantam'},
+            {'title': 'The Left Hand of Darkness', 'isbn': '9780441478125', 'author_first_name': 'Ursula',
+             'author_last_name': 'Le Guin', 'genres': 'Science Fiction', 'copies': 1},
+            {'title': 'The Left Hand of Darkness', 'isbn': '9780441478125', 'copies': 1, 'status': 'm'},
+        ]
+        self.import_file('.jsonl', '\n'.join(json.dumps(row) for row in rows) + '\n')
+
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertEqual(self.book.bookinstance_set.count(), 2)
+        self.assertEqual([genre.name for genre in self.book.genre.all()], ['Fantasy'])
+        left_hand = Book.objects.get(isbn='9780441478125')
+        self.assertEqual(sorted(left_hand.bookinstance_set.values_list('status', flat=True)), ['a', 'm'])
+
+    def test_keeps_derived_data_up_to_date(self):
+        self.import_file('.jsonl', json.dumps({'title': 'The Lathe of Heaven', 'isbn': '9781416556961', 'copies': 2}) + '\n')
+
+        self.assertEqual(CatalogStatistics.load().num_books, 2)
+        self.assertEqual(CatalogStatistics.load().num_instances_available, 2)
+        book = Book.objects.get(isbn='9781416556961')
+        self.assertEqual([book_id for book_id, _ in get_backend().search('lathe', 10)], [book.pk])
+
+    def test_invalid_rows_are_reported(self):
+        with self.assertRaisesMessage(CommandError, 'Line 3: isbn is required.'):
+            self.import_file('.csv', 'title,isbn\nDune,9780441013593\nNo ISBN,\n', batch_size=1)
+        # batches before the invalid row are kept
+        self.assertTrue(Book.objects.filter(isbn='9780441013593').exists())
+        self.assertEqual(CatalogStatistics.load().num_books, 2)
+
+        with self.assertRaisesMessage(CommandError, "Line 1: unknown status 'x'."):
+            self.import_file('.jsonl', json.dumps({'title': 'Dune', 'isbn': '1', 'status': 'x'}))
+
+    def test_new_ids_are_read_back_by_key(self):
+        bulk_create = Genre.objects.bulk_create
+
+        def bulk_create_after_another_process(objects, **kwargs):
+            Genre.objects.create(name='Poetry')
+            return bulk_create(objects, **kwargs)
+
+        with mock.patch.object(Genre.objects, 'bulk_create', side_effect=bulk_create_after_another_process):
+            pks = _insert(Genre, [Genre(name='Science Fiction'), Genre(name='Horror')], ['name'])
+
+        self.assertEqual([Genre.objects.get(pk=pk).name for pk in pks], ['Science Fiction', 'Horror'])
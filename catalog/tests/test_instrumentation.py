@@ -0,0 +1,109 @@
+import datetime
+import json
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import instrumentation, views
+from catalog.instrumentation import QueryBudgetExceeded, QueryRecorder
+from catalog.models import Author, Book, BookInstance
+
+
+class InstrumentationMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing(self):
+        response = self.client.get(reverse('book-detail', args=[self.book.pk]))
+
+        metrics = dict(metric.split(';', 1)[0:2] for metric in response['Server-Timing'].split(', '))
+        self.assertEqual(set(metrics), {'db', 'tpl', 'total'})
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+
+    @override_settings(CATALOG_SERVER_TIMING=False)
+    def test_server_timing_is_sent_to_staff_only(self):
+        response = self.client.get(reverse('books'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+        self.client.force_login(User.objects.create_user(username='staff', password='1X<ISRUkw+tuK', is_staff=True))
+        response = self.client.get(reverse('books'))
+        self.assertTrue(response.has_header('Server-Timing'))
+
+    def test_budget_is_enforced(self):
+        with mock.patch.object(views.BookListView, 'query_budget', 0):
+            with self.assertLogs('catalog.instrumentation', 'WARNING'), self.assertRaisesMessage(
+                QueryBudgetExceeded, 'catalog.views.BookListView ran'
+            ):
+                self.client.get(reverse('books'))
+
+        # declared with a decorator on function views
+        with mock.patch.object(views.index, 'query_budget', 0):
+            with self.assertLogs('catalog.instrumentation', 'WARNING'), self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('index'))
+
+    @override_settings(CATALOG_ENFORCE_QUERY_BUDGETS=False)
+    def test_budget_is_logged(self):
+        with mock.patch.object(views.BookListView, 'query_budget', 0):
+            with self.assertLogs('catalog.instrumentation', 'WARNING') as logs:
+                response = self.client.get(reverse('books'))
+
+        self.assertEqual(response.status_code, 200)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'catalog.views.BookListView')
+        self.assertEqual(record['query_budget'], 0)
+        self.assertGreater(record['queries'], 0)
+        self.assertTrue(record['slowest'][0]['sql'].startswith('SELECT'))
+
+    @override_settings(CATALOG_INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_sampled_requests_are_logged(self):
+        with self.assertLogs('catalog.instrumentation', 'INFO') as logs:
+            response = self.client.get(reverse('book-detail', args=[self.book.pk]))
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertEqual(record['path'], f'/catalog/book/{self.book.pk}')
+        self.assertEqual(record['status'], 200)
+        self.assertIn(f'desc="{record["queries"]} queries"', response['Server-Timing'])
+        self.assertGreater(record['template_ms'], 0)
+        self.assertLessEqual(len(record['slowest']), 3)
+
+    def test_unsampled_requests_are_not_logged(self):
+        with mock.patch.object(instrumentation.logger, 'log') as log:
+            self.client.get(reverse('book-detail', args=[self.book.pk]))
+        log.assert_not_called()
+
+
+class QueryBudgetTest(TestCase):
+    def test_borrowed_books_do_not_query_per_copy(self):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        user = User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+        user.user_permissions.add(Permission.objects.get(codename='can_view_all_borrowed_books'))
+        due_back = datetime.date.today() + datetime.timedelta(days=5)
+        for _ in range(10):
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', borrower=user, due_back=due_back)
+        self.client.login(username='librarian', password='1X<ISRUkw+tuK')
+
+        # a full page of copies stays within the budgets
+        for name in ('all-borrowed-books', 'my-borrowed'):
+            self.assertEqual(len(self.client.get(reverse(name)).context['bookinstance_list']), 10)
+
+
+class QueryRecorderTest(TestCase):
+    def test_keeps_the_slowest_statements(self):
+        recorder = QueryRecorder(keep_slowest=2)
+        for sql, duration in [('a', 3), ('b', 1), ('c', 5), ('d', 2)]:
+            with mock.patch('catalog.instrumentation.time.perf_counter', side_effect=[0, duration]):
+                recorder(lambda *args: None, sql, None, False, {})
+
+        self.assertEqual(recorder.count, 4)
+        self.assertEqual(recorder.duration, 11)
+        self.assertEqual(recorder.slowest, [(5, 'c'), (3, 'a')])
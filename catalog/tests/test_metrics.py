@@ -0,0 +1,135 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from catalog import metrics
+from catalog.models import Author
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(CATALOG_METRICS_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.directory = directory.name
+
+    def samples(self):
+        """Returns {sample name with labels: value} of the metrics."""
+        return {
+            line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in metrics.render_metrics().splitlines() if not line.startswith('#')
+        }
+
+
+class RecordingTest(MetricsTestCase):
+    def test_records_requests_per_url_name(self):
+        Author.objects.create(first_name='John', last_name='Smith')
+        self.client.get(reverse('authors'))
+        self.client.get(reverse('authors'))
+        self.client.get(reverse('author-detail', args=[999]))
+        self.client.get('/admin/')
+
+        samples = self.samples()
+        self.assertEqual(samples['catalog_requests_total{route="authors",status="2xx"}'], 2)
+        self.assertEqual(samples['catalog_request_duration_seconds_count{route="authors"}'], 2)
+        self.assertEqual(samples['catalog_request_duration_seconds_bucket{route="authors",le="+Inf"}'], 2)
+        self.assertGreater(samples['catalog_request_duration_seconds_sum{route="authors"}'], 0)
+        self.assertGreater(samples['catalog_db_queries_total{route="authors"}'], 0)
+        self.assertGreater(samples['catalog_db_duration_seconds_total{route="authors"}'], 0)
+        # the second request was answered from the page cache
+        self.assertEqual(samples['catalog_page_cache_requests_total{route="authors",outcome="hit"}'], 1)
+        self.assertEqual(samples['catalog_page_cache_requests_total{route="authors",outcome="miss"}'], 1)
+        self.assertEqual(samples['catalog_requests_total{route="author-detail",status="4xx"}'], 1)
+        self.assertEqual(samples['catalog_requests_total{route="other",status="3xx"}'], 1)
+        self.assertEqual(samples['catalog_requests_total{route="books",status="2xx"}'], 0)
+
+    def test_histogram_is_cumulative(self):
+        worker_file = metrics.get_worker_file()
+        for duration in (0.001, 0.02, 0.02, 30):
+            worker_file.record('books', 200, duration, 0, 0, None)
+
+        samples = self.samples()
+        self.assertEqual(samples['catalog_request_duration_seconds_bucket{route="books",le="0.005"}'], 1)
+        self.assertEqual(samples['catalog_request_duration_seconds_bucket{route="books",le="0.025"}'], 3)
+        self.assertEqual(samples['catalog_request_duration_seconds_bucket{route="books",le="10"}'], 3)
+        self.assertEqual(samples['catalog_request_duration_seconds_bucket{route="books",le="+Inf"}'], 4)
+        self.assertEqual(samples['catalog_request_duration_seconds_sum{route="books"}'], 30.041)
+
+    def test_page_cache_stats(self):
+        Author.objects.create(first_name='John', last_name='Smith')
+        for _ in range(3):
+            self.client.get(reverse('authors'))
+        self.client.get(reverse('books'))
+
+        self.assertEqual(metrics.page_cache_stats()['authors'], (2, 1))
+        output = StringIO()
+        call_command('page_cache_stats', stdout=output)
+        self.assertIn('authors: 2 hits, 1 misses (66.7%)', output.getvalue())
+        self.assertIn('books: 0 hits, 1 misses (0.0%)', output.getvalue())
+        self.assertIn('book-detail: 0 hits, 0 misses (-)', output.getvalue())
+        self.assertNotIn('all-borrowed', output.getvalue())
+
+
+class AggregationTest(MetricsTestCase):
+    def test_sums_the_files_of_all_workers(self):
+        metrics.get_worker_file().record('books', 200, 0.01, 0, 2, None)
+        pid = os.fork()
+        if pid == 0:
+            # a forked worker writes to a file of its own
+            try:
+                metrics.get_worker_file().record('books', 500, 0.01, 0, 3, None)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        samples = self.samples()
+        self.assertEqual(samples['catalog_requests_total{route="books",status="2xx"}'], 1)
+        self.assertEqual(samples['catalog_requests_total{route="books",status="5xx"}'], 1)
+        self.assertEqual(samples['catalog_db_queries_total{route="books"}'], 5)
+
+    def test_skips_files_in_another_layout(self):
+        with mock.patch.object(metrics, 'get_layout', return_value=metrics.Layout(('books', 'other', 'removed'))), \
+                mock.patch('catalog.metrics.os.getpid', return_value=1):
+            metrics.get_worker_file().record('books', 200, 0.01, 0, 2, None)
+        metrics.get_worker_file().record('books', 200, 0.01, 0, 1, None)
+
+        self.assertEqual(self.samples()['catalog_db_queries_total{route="books"}'], 1)
+
+    def test_clear(self):
+        metrics.get_worker_file().record('books', 200, 0.01, 0, 2, None)
+        metrics.clear()
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class MetricsViewTest(MetricsTestCase):
+    def test_forbidden_to_visitors(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        User.objects.create_user(username='reader', password='1X<ISRUkw+tuK')
+        self.client.login(username='reader', password='1X<ISRUkw+tuK')
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    def test_staff(self):
+        User.objects.create_user(username='staff', password='1X<ISRUkw+tuK', is_staff=True)
+        self.client.login(username='staff', password='1X<ISRUkw+tuK')
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertContains(response, '# TYPE catalog_request_duration_seconds histogram')
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    @override_settings(CATALOG_METRICS_TOKEN='s3cret')
+    def test_bearer_token(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
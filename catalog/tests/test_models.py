@@ -1,6 +1,9 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-from catalog.models import Author
+from catalog.models import Author, Book, BookInstance, CatalogStatistics, Genre
+
+import datetime
 
 class AuthorModelTest(TestCase):
     @classmethod
@@ -47,3 +50,92 @@ class AuthorModelTest(TestCase):
         author = Author.objects.get(id=1)
         max_length = author._meta.get_field('last_name').max_length
         self.assertEquals(max_length, 100)
+
+
+class CatalogStatisticsTest(TestCase):
+    def assertStatisticsCorrect(self):
+        # the incrementally maintained row must always match a full recount
+        stats = CatalogStatistics.load()
+        for name, value in CatalogStatistics.count_all().items():
+            self.assertEquals(getattr(stats, name), value, name)
+
+    def test_counters_follow_create_update_status_change_and_delete(self):
+        author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        fantasy = Genre.objects.create(name='Fantasy')
+        book = Book.objects.create(title='A Wizard of Earthsea', summary='Summary', isbn='1234567890123', author=author)
+        copy = BookInstance.objects.create(book=book, imprint='Imprint', status='m')
+        self.assertStatisticsCorrect()
+        self.assertEquals(CatalogStatistics.load().num_fantasy_genres, 1)
+
+        # update titles and names in and out of the searched terms
+        book.title = 'The Da Vinci Code'
+        book.save()
+        fantasy.name = 'Science Fiction'
+        fantasy.save()
+        self.assertStatisticsCorrect()
+        self.assertEquals(CatalogStatistics.load().num_book_titles_containing_code, 1)
+        self.assertEquals(CatalogStatistics.load().num_fantasy_genres, 0)
+
+        # status changes move copies in and out of the available count
+        copy.status = 'a'
+        copy.save()
+        self.assertEquals(CatalogStatistics.load().num_instances_available, 1)
+        copy.status = 'o'
+        copy.save()
+        self.assertStatisticsCorrect()
+        self.assertEquals(CatalogStatistics.load().num_instances_available, 0)
+
+        copy.status = 'a'
+        copy.save()
+        copy.delete()
+        book.delete()
+        author.delete()
+        fantasy.delete()
+        self.assertStatisticsCorrect()
+        self.assertEquals(CatalogStatistics.load().num_books, 0)
+
+    def test_rebuild_recovers_from_bulk_changes(self):
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        BookInstance.objects.bulk_create([BookInstance(book=book, imprint='Imprint', status='a') for _ in range(3)])
+        self.assertEquals(CatalogStatistics.load().num_instances, 0)  # bulk_create() sends no signals
+
+        CatalogStatistics.rebuild()
+        self.assertStatisticsCorrect()
+        self.assertEquals(CatalogStatistics.load().num_instances_available, 3)
+
+
+class BookInstanceOverdueTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = datetime.date(2020, 6, 30)
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        alice = User.objects.create_user(username='alice', password='drowssap1')
+        bob = User.objects.create_user(username='bob', password='drowssap1')
+        # (days overdue, status, borrower)
+        for days, status, borrower in [(-3, 'o', alice), (0, 'o', alice), (1, 'o', alice), (7, 'o', bob), (8, 'o', alice),
+                                       (45, 'o', bob), (120, 'o', alice), (200, 'a', bob), (100, 'm', None)]:
+            BookInstance.objects.create(
+                book=book, imprint='Imprint', status=status, due_back=cls.today - datetime.timedelta(days=days), borrower=borrower,
+            )
+
+    def test_overdue_filter(self):
+        overdue = BookInstance.objects.overdue(self.today)
+        self.assertEqual(sorted((self.today - copy.due_back).days for copy in overdue), [1, 7, 8, 45, 120])
+
+    def test_overdue_annotation_matches_property(self):
+        today = datetime.date.today()
+        BookInstance.objects.filter(due_back=self.today).update(due_back=today)
+        BookInstance.objects.filter(due_back=self.today - datetime.timedelta(days=1)).update(due_back=today - datetime.timedelta(days=1))
+        for copy in BookInstance.objects.with_overdue():
+            self.assertEqual(copy.overdue, BookInstance.objects.get(pk=copy.pk).is_overdue)
+            self.assertEqual(copy.is_overdue, copy.overdue)
+
+    def test_overdue_buckets(self):
+        self.assertEqual(BookInstance.objects.overdue_buckets(self.today), [(1, 7, 2), (8, 30, 1), (31, 90, 1), (91, None, 1)])
+
+    def test_overdue_by_borrower(self):
+        rows = BookInstance.objects.overdue_by_borrower(self.today)
+        self.assertEqual(
+            [(row['borrower__username'], row['num_overdue'], (self.today - row['earliest_due_back']).days) for row in rows],
+            [('alice', 3, 120), ('bob', 2, 45)],
+        )
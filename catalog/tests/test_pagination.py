@@ -0,0 +1,99 @@
+import datetime
+
+from django.contrib.auth.models import User, Permission
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, BookInstance
+from catalog.pagination import InvalidCursor, KeysetPaginator
+
+
+class KeysetPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        # several copies share a due date and some have none, so the id has to break ties
+        today = datetime.date.today()
+        for copy_number in range(23):
+            due_back = None if copy_number % 7 == 0 else today + datetime.timedelta(days=copy_number % 4)
+            BookInstance.objects.create(book=book, imprint='Imprint', due_back=due_back, status='o')
+
+    def setUp(self):
+        self.paginator = KeysetPaginator(BookInstance.objects.all(), 10, ('due_back', 'id'))
+
+    def expected_order(self):
+        copies = list(BookInstance.objects.all())
+        # the paginator follows the database's placement of nulls
+        nulls_last = connection.features.nulls_order_largest
+        return sorted(copies, key=lambda copy: ((copy.due_back is None) == nulls_last, copy.due_back or datetime.date.min, copy.id))
+
+    def test_walks_forwards_through_every_row_once(self):
+        page = self.paginator.page()
+        self.assertFalse(page.has_previous())
+        seen = list(page)
+        while page.has_next():
+            page = self.paginator.page(page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, self.expected_order())
+        self.assertEqual(len(page), 3)
+
+    def test_walks_backwards_to_the_first_page(self):
+        first_page = self.paginator.page()
+        last_page = self.paginator.page(self.paginator.page(first_page.next_cursor).next_cursor)
+        self.assertFalse(last_page.has_next())
+
+        page = self.paginator.page(self.paginator.page(last_page.previous_cursor).previous_cursor)
+        self.assertEqual(list(page), list(first_page))
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+
+    def test_rejects_tampered_cursor(self):
+        cursor = self.paginator.page().next_cursor
+        with self.assertRaises(InvalidCursor):
+            self.paginator.page(cursor[:-2] + 'xx')
+
+
+class KeysetPaginatedViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # authors sharing a last name are ordered by first name and then id
+        for author_number in range(25):
+            Author.objects.create(first_name=f'John {author_number % 3}', last_name=f'Doe {author_number % 5}')
+
+    def setUp(self):
+        # start without pages cached by other tests
+        cache.clear()
+
+    def test_author_list_cursor_links_cover_every_author(self):
+        response = self.client.get(reverse('authors'))
+        seen = list(response.context['author_list'])
+        while response.context['page_obj'].has_next():
+            response = self.client.get(reverse('authors') + '?' + response.context['page_obj'].next_querystring)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(response.context['author_list'])
+        self.assertEqual(seen, list(Author.objects.order_by('last_name', 'first_name', 'id')))
+        self.assertContains(response, 'previous')
+
+    def test_page_numbers_are_still_supported(self):
+        response = self.client.get(reverse('authors') + '?page=3')
+        self.assertEqual(len(response.context['author_list']), 5)
+        self.assertContains(response, 'Page 3 of 3')
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse('authors') + '?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+    def test_all_borrowed_books_are_paginated_by_due_date(self):
+        user = User.objects.create_user(username='librarian', password='drowssap')
+        user.user_permissions.add(Permission.objects.get(name='View all borrowed books'))
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        for copy_number in range(12):
+            BookInstance.objects.create(book=book, imprint='Imprint', status='o', due_back=datetime.date.today() + datetime.timedelta(days=copy_number % 2))
+
+        self.client.login(username='librarian', password='drowssap')
+        response = self.client.get(reverse('all-borrowed-books'))
+        next_response = self.client.get(reverse('all-borrowed-books') + '?' + response.context['page_obj'].next_querystring)
+        copies = list(response.context['bookinstance_list']) + list(next_response.context['bookinstance_list'])
+        self.assertEqual(copies, list(BookInstance.objects.order_by('due_back', 'id')))
@@ -0,0 +1,78 @@
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import Author, Book
+from catalog.tests.utils import CommittingTestCase
+
+
+def permission_queries(queries):
+    return [query['sql'] for query in queries if 'auth_permission' in query['sql']]
+
+
+class CachedPermissionsBackendTest(CommittingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        cls.permission = Permission.objects.get(codename='can_view_all_borrowed_books')
+        User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.get(username='librarian')
+        self.client.force_login(self.user)
+
+    def assertCanViewAllBorrowed(self, allowed):
+        response = self.client.get(reverse('all-borrowed-books'))
+        self.assertEqual(response.status_code, 200 if allowed else 403)
+
+    def test_no_permission_queries_after_the_first_request(self):
+        self.user.user_permissions.add(self.permission)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertCanViewAllBorrowed(True)
+        self.assertEqual(len(permission_queries(queries)), 2)
+
+        for url in (reverse('all-borrowed-books'), reverse('books'), reverse('book-detail', args=[self.book.pk])):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(permission_queries(queries), [])
+
+    def test_user_permission_changes(self):
+        self.assertCanViewAllBorrowed(False)
+        self.user.user_permissions.add(self.permission)
+        self.assertCanViewAllBorrowed(True)
+        self.user.user_permissions.remove(self.permission)
+        self.assertCanViewAllBorrowed(False)
+        self.permission.user_set.add(self.user)
+        self.assertCanViewAllBorrowed(True)
+        self.permission.user_set.clear()
+        self.assertCanViewAllBorrowed(False)
+
+    def test_group_changes(self):
+        group = Group.objects.create(name='Librarians')
+        self.user.groups.add(group)
+        self.assertCanViewAllBorrowed(False)
+        group.permissions.add(self.permission)
+        self.assertCanViewAllBorrowed(True)
+        self.user.groups.remove(group)
+        self.assertCanViewAllBorrowed(False)
+        group.user_set.add(self.user)
+        self.assertCanViewAllBorrowed(True)
+        group.delete()
+        self.assertCanViewAllBorrowed(False)
+
+    def test_user_changes(self):
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertCanViewAllBorrowed(True)
+        self.user.is_superuser = False
+        self.user.save()
+        self.assertCanViewAllBorrowed(False)
+
+    def test_inactive_users_have_no_permissions(self):
+        self.user.user_permissions.add(self.permission)
+        self.user.is_active = False
+        self.assertFalse(self.user.has_perm('catalog.can_view_all_borrowed_books'))
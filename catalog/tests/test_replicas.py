@@ -0,0 +1,155 @@
+import datetime
+import os
+import tempfile
+import time
+import unittest
+from io import StringIO
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils import formats
+
+from catalog.models import Author, Book, BookInstance
+from catalog.replicas import PINNED_COOKIE, get_replica_reads
+
+REPLICA = 'replica'
+
+
+class ReplicaReadsTest(SimpleTestCase):
+    def test_views_reading_from_replicas(self):
+        book_id, copy_id = 1, '7ba1b9c5-1f41-4a43-9a96-7f4e5b1d6c0e'
+        for url, replica_reads in [
+            (reverse('books'), True),
+            (reverse('book-detail', args=[book_id]), True),
+            (reverse('all-borrowed-books'), True),
+            (reverse('index'), True),
+            (reverse('api-books'), True),
+            (reverse('create-book'), False),
+            (reverse('update-book', args=[book_id]), False),
+            (reverse('delete-book', args=[book_id]), False),
+            (reverse('renew-book-librarian', args=[copy_id]), False),
+            (reverse('circulation-desk'), False),
+            (reverse('admin:catalog_book_changelist'), False),
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(get_replica_reads(resolve(url).func), replica_reads)
+
+
+class NoReplicaTest(TestCase):
+    def test_writes_do_not_pin_without_replicas(self):
+        user = User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+        response = self.client.post(reverse('login'), {'username': 'librarian', 'password': '1X<ISRUkw+tuK'})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.pk)
+        self.assertNotIn(PINNED_COOKIE, response.cookies)
+
+
+# a TransactionTestCase, as the replica is a copy of what the primary committed
+@unittest.skipUnless(connection.vendor == 'sqlite', 'The replica is an SQLite file.')
+@override_settings(CATALOG_REPLICA_DATABASES=[REPLICA])
+class ReplicaTest(TransactionTestCase):
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        handle, cls.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connections.databases[REPLICA] = {**connections.databases['default'], 'NAME': cls.replica_path}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections.databases[REPLICA]
+        os.remove(cls.replica_path)
+
+    def setUp(self):
+        cache.clear()
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=author)
+        self.librarian = User.objects.create_user(username='librarian', password='1X<ISRUkw+tuK')
+        self.librarian.user_permissions.add(*Permission.objects.filter(codename__in=['can_mark_returned', 'can_view_all_borrowed_books']))
+        self.copy = BookInstance.objects.create(
+            book=self.book, imprint='Imprint', status='o', borrower=self.librarian,
+            due_back=datetime.date.today() + datetime.timedelta(days=1),
+        )
+        call_command('sync_replicas', stdout=StringIO())
+
+    def get(self, client, url):
+        # the pages cached by earlier requests would hide where the data is read from
+        cache.clear()
+        return client.get(url)
+
+    def test_catalog_pages_read_from_the_replica(self):
+        self.book.title = 'New Title'
+        self.book.save()
+        self.client.force_login(self.librarian)
+
+        self.assertContains(self.get(self.client, reverse('books')), 'Book Title')
+        self.assertEqual(self.get(self.client, reverse('api-book-detail', args=[self.book.pk])).json()['title'], 'Book Title')
+
+        call_command('sync_replicas', stdout=StringIO())
+        self.assertContains(self.get(self.client, reverse('books')), 'New Title')
+
+    def test_cached_content_is_built_from_the_primary(self):
+        self.book.title = 'New Title'
+        self.book.save()
+        self.client.force_login(self.librarian)
+
+        # the page cache of anonymous visitors, and the fragments of the book page
+        self.assertContains(self.get(self.client_class(), reverse('books')), 'New Title')
+        self.assertContains(self.get(self.client, reverse('book-detail', args=[self.book.pk])), 'New Title')
+
+    def test_pages_read_from_the_replica_have_no_validators(self):
+        self.client.force_login(self.librarian)
+        for url in (reverse('books'), reverse('all-borrowed-books')):
+            with self.subTest(url=url):
+                response = self.get(self.client, url)
+                self.assertFalse(response.has_header('ETag'))
+                self.assertFalse(response.has_header('Last-Modified'))
+
+                # read from the primary
+                self.client.cookies[PINNED_COOKIE] = str(int(time.time()) + 60)
+                self.assertTrue(self.get(self.client, url).has_header('ETag'))
+                del self.client.cookies[PINNED_COOKIE]
+
+        # the page cache of anonymous visitors is built from the primary
+        self.assertTrue(self.get(self.client_class(), reverse('books')).has_header('ETag'))
+
+    def test_forms_and_users_read_from_the_primary(self):
+        self.book.title = 'New Title'
+        self.book.save()
+        # not copied to the replica
+        User.objects.create_user(username='editor', password='1X<ISRUkw+tuK').user_permissions.add(
+            Permission.objects.get(codename='can_view_all_borrowed_books')
+        )
+        self.client.login(username='editor', password='1X<ISRUkw+tuK')
+
+        self.assertContains(self.get(self.client, reverse('update-book', args=[self.book.pk])), 'New Title')
+        response = self.get(self.client, reverse('books'))
+        self.assertContains(response, 'User: editor')
+        self.assertContains(response, 'Book Title')
+
+    def test_writers_read_their_writes(self):
+        self.client.force_login(self.librarian)
+        other_client = self.client_class()
+        other_client.force_login(self.librarian)
+        url = reverse('all-borrowed-books')
+        renewal_date = datetime.date.today() + datetime.timedelta(weeks=3)
+
+        response = self.client.post(reverse('renew-book-librarian', args=[self.copy.pk]), {'renewal_date': renewal_date})
+        self.assertRedirects(response, reverse('all-borrowed-books'))
+        self.assertEqual(response.cookies[PINNED_COOKIE]['max-age'], 15)
+
+        # the renewal is not on the replica yet
+        self.assertContains(self.get(self.client, url), formats.date_format(renewal_date))
+        self.assertNotContains(self.get(other_client, url), formats.date_format(renewal_date))
+
+        self.client.cookies[PINNED_COOKIE] = '0'
+        self.assertNotContains(self.get(self.client, url), formats.date_format(renewal_date))
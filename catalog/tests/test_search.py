@@ -0,0 +1,85 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Author, Book, Genre
+from catalog.search import get_backend, search_books
+
+
+class SearchIndexTest(TestCase):
+    def setUp(self):
+        # the tests modify and delete these objects, so create them for every test
+        self.author = Author.objects.create(first_name='Ursula', last_name='Le Guin')
+        self.genre = Genre.objects.create(name='Fantasy')
+        self.book = Book.objects.create(title='A Wizard of Earthsea', summary='A young mage.', isbn='ABCDEFG', author=self.author)
+        self.book.genre.set([self.genre])
+
+    def found(self, query):
+        return [book_id for book_id, _ in get_backend().search(query, 10)]
+
+    def test_finds_books_by_title_summary_author_and_genre(self):
+        for query in ['wizard', 'mage', 'guin', 'fantasy', 'wizard ursula']:
+            self.assertEqual(self.found(query), [self.book.pk], query)
+        self.assertEqual(self.found('dragon'), [])
+
+    def test_index_follows_changes(self):
+        self.book.title = 'The Tombs of Atuan'
+        self.book.save()
+        self.assertEqual(self.found('wizard'), [])
+        self.assertEqual(self.found('tombs'), [self.book.pk])
+
+        self.author.last_name = 'Tolkien'
+        self.author.save()
+        self.assertEqual(self.found('tolkien'), [self.book.pk])
+
+        self.genre.name = 'Mythology'
+        self.genre.save()
+        self.assertEqual(self.found('mythology'), [self.book.pk])
+
+        self.book.genre.clear()
+        self.assertEqual(self.found('mythology'), [])
+
+        self.book.delete()
+        self.assertEqual(self.found('tombs'), [])
+
+    def test_deleting_genre_reindexes_books(self):
+        self.genre.delete()
+        self.assertEqual(self.found('fantasy'), [])
+
+    def test_title_matches_rank_above_summary_matches(self):
+        other = Book.objects.create(title='Mage Wars', summary='Summary', isbn='ABCDEFG')
+        self.assertEqual(self.found('mage'), [other.pk, self.book.pk])
+
+    def test_user_input_is_not_interpreted_as_query_syntax(self):
+        self.assertEqual(self.found('wizard OR "'), [])
+        self.assertEqual(self.found('NEAR(wizard'), [])
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for book_number in range(13):
+            Book.objects.create(title=f'Dragon book {book_number}', summary='Summary', isbn='ABCDEFG')
+
+    def test_view_without_query(self):
+        response = self.client.get(reverse('search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'books/search_results.html')
+
+    def test_results_are_paginated_with_cursors(self):
+        response = self.client.get(reverse('search'), {'q': 'dragon'})
+        self.assertEqual(len(response.context['book_list']), 10)
+        self.assertTrue(response.context['is_paginated'])
+
+        next_response = self.client.get(reverse('search') + '?' + response.context['page_obj'].next_querystring)
+        self.assertEqual(len(next_response.context['book_list']), 3)
+        seen = {book.pk for book in response.context['book_list']} | {book.pk for book in next_response.context['book_list']}
+        self.assertEqual(seen, set(Book.objects.values_list('pk', flat=True)))
+
+    def test_search_books_pages_do_not_overlap(self):
+        first_page = search_books('dragon', per_page=5)
+        second_page = search_books('dragon', per_page=5, cursor=first_page.next_cursor)
+        self.assertFalse(set(first_page) & set(second_page))
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse('search'), {'q': 'dragon', 'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
@@ -1,12 +1,21 @@
 from django.contrib.auth.models import User, Permission
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
-from catalog.models import Author, Book, BookInstance, Genre, Language
+from catalog.cache import get_versions
+from catalog.models import Author, Book, BookInstance, Genre, Language, VisitCount
+from catalog.signals import flush_visits
+from catalog.tests.utils import CommittingTestCase
+from catalog.views import AllBorrowedBooksListView, LoanedBooksByUserListView
+from catalog.visits import visit_buffer
 
 import datetime
 import uuid
+from unittest import mock
 
 
 class AuthorListViewTest(TestCase):
@@ -21,6 +30,10 @@ class AuthorListViewTest(TestCase):
                 last_name=f'Doe {author_id}'
             )
 
+    def setUp(self):
+        # start without pages cached by other tests
+        cache.clear()
+
     def test_view_url_exists_at_desired_location(self):
         response = self.client.get('/catalog/authors/')
         self.assertEqual(response.status_code, 200)
@@ -50,6 +63,452 @@ class AuthorListViewTest(TestCase):
         self.assertTrue(len(response.context['author_list']) == 3)
 
 
+class IndexViewTest(TestCase):
+    def test_view_reads_record_counts_in_one_query(self):
+        Author.objects.create(first_name='John', last_name='Smith')
+        Book.objects.create(title='Clean Code', summary='Summary', isbn='ABCDEFG')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('index'))
+        # the statistics row is the only catalog query
+        catalog_queries = [query['sql'] for query in queries if 'catalog_' in query['sql']]
+        self.assertEqual(len(catalog_queries), 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['num_books'], 1)
+        self.assertEqual(response.context['num_authors'], 1)
+        self.assertEqual(response.context['num_book_titles_containing_code'], 1)
+
+    @override_settings(VISIT_FLUSH_THRESHOLD=1000, VISIT_FLUSH_INTERVAL=3600)
+    def test_visits_are_counted_without_database_writes(self):
+        visit_buffer.flush()
+        for expected_visits in range(1, 4):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('index'))
+            self.assertEqual(response.context['num_visits'], expected_visits)
+            writes = [query['sql'] for query in queries if not query['sql'].startswith('SELECT')]
+            self.assertEqual(writes, [])
+        # from the first visit that sends the cookie back
+        self.assertEqual(visit_buffer.pending(), 2)
+
+        # the buffered visits end up in a single aggregate row for this visitor
+        visit_buffer.flush()
+        self.assertEqual(visit_buffer.pending(), 0)
+        self.assertEqual(VisitCount.objects.get().count, 2)
+
+    def test_visitors_without_the_cookie_are_not_stored(self):
+        visit_buffer.flush()
+        for _ in range(3):
+            self.assertEqual(self.client_class().get(reverse('index')).context['num_visits'], 1)
+        self.assertEqual(visit_buffer.pending(), 0)
+
+    @override_settings(VISIT_FLUSH_THRESHOLD=1000, VISIT_FLUSH_INTERVAL=3600)
+    def test_visits_are_aggregated_per_user(self):
+        visit_buffer.flush()
+        user = User.objects.create_user(username='testuser1', password='drowssap1')
+        self.client.login(username='testuser1', password='drowssap1')
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        visit_buffer.flush()
+        self.assertEqual(VisitCount.objects.get(user=user).count, 2)
+
+    def test_visits_are_kept_when_the_flush_fails(self):
+        visit_buffer.flush()
+        visit_buffer.record('visitor:abc')
+        visit_buffer.record('visitor:abc')
+        with mock.patch.object(VisitCount.objects, 'bulk_create', side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            visit_buffer.flush()
+        visit_buffer.record('visitor:abc')
+
+        self.assertEqual(visit_buffer.pending(), 3)
+        visit_buffer.flush()
+        self.assertEqual(VisitCount.objects.get(key='visitor:abc').count, 3)
+
+    @override_settings(VISIT_FLUSH_THRESHOLD=1)
+    def test_failed_flushes_are_logged_after_requests(self):
+        visit_buffer.flush()
+        visit_buffer.record('visitor:abc')
+        with mock.patch.object(VisitCount.objects, 'bulk_create', side_effect=DatabaseError):
+            with self.assertLogs('catalog.visits', 'ERROR'):
+                flush_visits(sender=None)
+        self.assertEqual(visit_buffer.pending(), 1)
+        visit_buffer.flush()
+
+    def test_flush_adds_to_rows_created_meanwhile(self):
+        visit_buffer.flush()
+        visit_buffer.record('visitor:abc')
+        bulk_create = VisitCount.objects.bulk_create
+
+        def bulk_create_after_another_process(objects, **kwargs):
+            VisitCount.objects.create(key='visitor:abc', count=2)
+            return bulk_create(objects, **kwargs)
+
+        with mock.patch.object(VisitCount.objects, 'bulk_create', side_effect=bulk_create_after_another_process):
+            visit_buffer.flush()
+        self.assertEqual(VisitCount.objects.get(key='visitor:abc').count, 3)
+
+    def test_visits_of_deleted_users_are_dropped(self):
+        visit_buffer.flush()
+        visit_buffer.record('user:999', user_id=999)
+        visit_buffer.record('visitor:abc')
+        visit_buffer.flush()
+        self.assertEqual(list(VisitCount.objects.values_list('key', flat=True)), ['visitor:abc'])
+        self.assertEqual(visit_buffer.pending(), 0)
+
+    def test_tampered_visits_cookie_starts_over(self):
+        self.client.cookies['num_visits'] = 'abc:99:forged'
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['num_visits'], 1)
+
+
+class AuthorDetailViewTest(CommittingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=cls.author)
+        for status in ['a', 'a', 'o', 'm']:
+            BookInstance.objects.create(book=cls.book, imprint='Imprint', status=status)
+
+    def setUp(self):
+        # start without pages cached by other tests
+        cache.clear()
+
+    def test_view_shows_available_copies(self):
+        response = self.client.get(reverse('author-detail', kwargs={'pk': self.author.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book.get_num_available_copies() for book in response.context['books']], [2])
+        self.assertContains(response, '(2 available copies)')
+
+    def test_number_of_queries_does_not_grow_with_books_and_copies(self):
+        # the author and the annotated books
+        with self.assertNumQueries(2):
+            self.client.get(reverse('author-detail', kwargs={'pk': self.author.pk}))
+
+        for book_number in range(5):
+            book = Book.objects.create(title=f'Book {book_number}', summary='Summary', isbn='ABCDEFG', author=self.author)
+            for _ in range(3):
+                BookInstance.objects.create(book=book, imprint='Imprint', status='a')
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('author-detail', kwargs={'pk': self.author.pk}))
+        self.assertEqual(len(response.context['books']), 6)
+
+
+class BookListViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # create 13 books by different authors for pagination tests
+        for book_number in range(1, 14):
+            author = Author.objects.create(first_name=f'John {book_number}', last_name=f'Doe {book_number}')
+            Book.objects.create(title=f'Book {book_number}', summary='Summary', isbn='ABCDEFG', author=author)
+
+    def setUp(self):
+        # start without pages cached by other tests
+        cache.clear()
+
+    def test_view_shows_authors(self):
+        response = self.client.get(reverse('books'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['my_book_list']), 10)
+        self.assertContains(response, '(Doe 1, John 1)')
+
+    def test_number_of_queries_does_not_grow_with_books(self):
+        # cursor pages only fetch the books with their authors
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('books'))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('books') + '?' + response.context['page_obj'].next_querystring)
+        # page numbers also need the total count
+        with self.assertNumQueries(2):
+            self.client.get(reverse('books') + '?page=2')
+
+
+class BookDetailViewTest(CommittingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.language = Language.objects.create(name='English')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=cls.author, language=cls.language)
+        cls.book.genre.set([Genre.objects.create(name='Fantasy')])
+        BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a')
+
+    def setUp(self):
+        # start without pages cached by other tests
+        cache.clear()
+
+    def test_view_shows_book_details(self):
+        response = self.client.get(reverse('book-detail', kwargs={'pk': self.book.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Smith, John')
+        self.assertContains(response, 'English')
+        self.assertContains(response, 'Fantasy')
+        self.assertContains(response, 'Available')
+
+    def test_number_of_queries_does_not_grow_with_genres_and_copies(self):
+        # whether the book exists (before it has a cache version token), the book with its author and language,
+        # the genres and the copies
+        with self.assertNumQueries(4):
+            self.client.get(reverse('book-detail', kwargs={'pk': self.book.pk}))
+
+        self.book.genre.add(*[Genre.objects.create(name=f'Genre {number}') for number in range(5)])
+        for _ in range(10):
+            BookInstance.objects.create(book=self.book, imprint='Imprint', status='o', due_back=datetime.date.today())
+
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('book-detail', kwargs={'pk': self.book.pk}))
+        self.assertContains(response, 'On loan', count=10)
+
+    def test_HTTP404_for_missing_book(self):
+        response = self.client.get(reverse('book-detail', kwargs={'pk': self.book.pk + 1}))
+        self.assertEqual(response.status_code, 404)
+
+
+class BookDetailFragmentCacheTest(CommittingTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=self.author)
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        # logged in users get the page rendered (with the cached fragments) rather than a cached page
+        User.objects.create_user(username='testuser1', password='drowssap1')
+        self.client.login(username='testuser1', password='drowssap1')
+
+    def get(self):
+        return self.client.get(reverse('book-detail', kwargs={'pk': self.book.pk}))
+
+    def test_cache_hit_skips_database(self):
+        self.get()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get()
+        catalog_queries = [query['sql'] for query in queries if 'catalog_' in query['sql']]
+        self.assertEqual(catalog_queries, [])
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, 'Title: Book Title')
+        self.assertContains(response, 'Available')
+
+    def test_copy_status_change_is_shown_immediately(self):
+        self.get()
+        self.copy.status = 'o'
+        self.copy.due_back = datetime.date.today()
+        self.copy.save()
+        response = self.get()
+        self.assertContains(response, 'On loan')
+        self.assertNotContains(response, 'Available')
+
+        self.copy.delete()
+        self.assertNotContains(self.get(), 'On loan')
+
+    def test_copy_moved_to_another_book_leaves_old_page(self):
+        other_book = Book.objects.create(title='Other Title', summary='Summary', isbn='ABCDEFG')
+        self.get()
+        self.copy.book = other_book
+        self.copy.save()
+        self.assertNotContains(self.get(), 'Imprint:')
+
+    def test_metadata_changes_are_shown_immediately(self):
+        self.get()
+        self.book.genre.add(Genre.objects.create(name='Fantasy'))
+        self.assertContains(self.get(), 'Fantasy')
+
+        self.author.last_name = 'Jones'
+        self.author.save()
+        self.assertContains(self.get(), 'Jones, John')
+
+        self.book.language = Language.objects.create(name='French')
+        self.book.save()
+        self.assertContains(self.get(), 'French')
+
+    def test_deleted_book_is_not_found(self):
+        self.get()
+        self.book.delete()
+        self.assertEqual(self.client.get(reverse('book-detail', kwargs={'pk': self.copy.book_id})).status_code, 404)
+
+
+class AnonymousPageCacheTest(CommittingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=cls.author)
+        BookInstance.objects.create(book=cls.book, imprint='Imprint', status='a')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages_are_served_from_cache(self):
+        urls = [
+            reverse('books'),
+            reverse('authors'),
+            reverse('book-detail', kwargs={'pk': self.book.pk}),
+            reverse('author-detail', kwargs={'pk': self.author.pk}),
+        ]
+        for url in urls:
+            first_response = self.client.get(url)
+            self.assertEqual(first_response['X-Page-Cache'], 'miss')
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertEqual(response['X-Page-Cache'], 'hit')
+            self.assertEqual(response.content, first_response.content)
+
+    def test_query_string_is_part_of_the_key(self):
+        self.client.get(reverse('books'))
+        self.assertEqual(self.client.get(reverse('books') + '?page=1')['X-Page-Cache'], 'miss')
+
+    def test_other_query_parameters_are_ignored(self):
+        first_response = self.client.get(reverse('books') + '?page=1&utm_source=mail')
+        response = self.client.get(reverse('books') + '?page=1&junk=2')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertEqual(response.content, first_response.content)
+
+    def test_authenticated_requests_are_not_cached(self):
+        User.objects.create_user(username='testuser1', password='drowssap1')
+        self.client.login(username='testuser1', password='drowssap1')
+        self.client.get(reverse('books'))
+        response = self.client.get(reverse('books'))
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, 'User: testuser1')
+
+    def test_changes_invalidate_affected_pages(self):
+        self.client.get(reverse('books'))
+        self.client.get(reverse('authors'))
+        self.client.get(reverse('author-detail', kwargs={'pk': self.author.pk}))
+
+        Book.objects.create(title='Second Title', summary='Summary', isbn='ABCDEFG', author=self.author)
+        self.assertContains(self.client.get(reverse('books')), 'Second Title')
+        self.assertContains(self.client.get(reverse('author-detail', kwargs={'pk': self.author.pk})), 'Second Title')
+        # the author list does not show books
+        self.assertEqual(self.client.get(reverse('authors'))['X-Page-Cache'], 'hit')
+
+        copy = BookInstance.objects.get()
+        copy.status = 'o'
+        copy.save()
+        self.assertContains(self.client.get(reverse('author-detail', kwargs={'pk': self.author.pk})), '(0 available copies)')
+
+        self.author.first_name = 'Jane'
+        self.author.save()
+        self.assertContains(self.client.get(reverse('authors')), 'Smith, Jane')
+        self.assertContains(self.client.get(reverse('books')), '(Smith, Jane)')
+
+
+class CacheInvalidationOnCommitTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+
+    def test_pages_are_invalidated_once_the_change_is_committed(self):
+        self.client.get(reverse('books'))
+
+        with transaction.atomic():
+            Book.objects.create(title='Second Title', summary='Summary', isbn='ABCDEFG', author=self.author)
+            # another request could still read the books from before the change and cache them again
+            self.assertEqual(self.client.get(reverse('books'))['X-Page-Cache'], 'hit')
+
+        self.assertContains(self.client.get(reverse('books')), 'Second Title')
+
+    def test_rolled_back_changes_invalidate_nothing(self):
+        self.client.get(reverse('books'))
+
+        with self.assertRaises(ValueError), transaction.atomic():
+            Book.objects.create(title='Second Title', summary='Summary', isbn='ABCDEFG', author=self.author)
+            raise ValueError
+
+        self.assertEqual(self.client.get(reverse('books'))['X-Page-Cache'], 'hit')
+
+
+class ConditionalGetTest(CommittingTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG', author=self.author)
+        self.copy = BookInstance.objects.create(book=self.book, imprint='Imprint', status='a')
+        self.urls = [
+            reverse('books'),
+            reverse('authors'),
+            reverse('book-detail', kwargs={'pk': self.book.pk}),
+            reverse('author-detail', kwargs={'pk': self.author.pk}),
+        ]
+
+    def test_unchanged_pages_are_not_modified(self):
+        for url, queries in zip(self.urls, [0, 0, 1, 1]):
+            response = self.client.get(url)
+            self.assertTrue(response.has_header('Last-Modified'))
+            # answered from the cache versions, once the object of a detail page has been found
+            with self.assertNumQueries(queries):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+
+    def test_page_cache_keeps_validators(self):
+        first_response = self.client.get(reverse('books'))
+        response = self.client.get(reverse('books'))
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertEqual(response['ETag'], first_response['ETag'])
+        self.assertEqual(response['Last-Modified'], first_response['Last-Modified'])
+
+    def test_if_modified_since(self):
+        url = reverse('book-detail', kwargs={'pk': self.book.pk})
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE='Sat, 01 Jan 2000 00:00:00 GMT').status_code, 200)
+
+    def test_changes_give_new_etags(self):
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+
+        # a copy changes the availability shown on the book and author pages only
+        self.copy.status = 'o'
+        self.copy.save()
+        changed = [self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code for url, etag in zip(self.urls, etags)]
+        self.assertEqual(changed, [304, 304, 200, 200])
+
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        self.author.first_name = 'Jane'
+        self.author.save()
+        changed = [self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code for url, etag in zip(self.urls, etags)]
+        self.assertEqual(changed, [200, 200, 200, 200])
+
+        etag = self.client.get(self.urls[2])['ETag']
+        self.book.genre.add(Genre.objects.create(name='Fantasy'))
+        self.assertEqual(self.client.get(self.urls[2], HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etags_vary_by_user(self):
+        url = reverse('books')
+        etag = self.client.get(url)['ETag']
+        User.objects.create_user(username='testuser1', password='drowssap1')
+        self.client.login(username='testuser1', password='drowssap1')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etags_vary_by_permissions(self):
+        # the sidebar links to the pages the user may see
+        url = reverse('books')
+        user = User.objects.create_user(username='testuser1', password='drowssap1')
+        self.client.login(username='testuser1', password='drowssap1')
+        etag = self.client.get(url)['ETag']
+
+        user.user_permissions.add(Permission.objects.get(codename='can_view_all_borrowed_books'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'All borrowed')
+
+    def test_missing_book_is_not_found(self):
+        url = reverse('book-detail', kwargs={'pk': self.book.pk + 1})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"anything"').status_code, 404)
+
+    def test_missing_objects_are_not_found_whatever_the_validators(self):
+        for url in [
+            reverse('book-detail', kwargs={'pk': self.book.pk + 1}),
+            reverse('author-detail', kwargs={'pk': self.author.pk + 1}),
+        ]:
+            self.client.get(url)
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+            self.assertEqual(response.status_code, 404)
+        # and leave no tokens behind
+        self.assertEqual(get_versions([f'book:{self.book.pk + 1}', f'author:{self.author.pk + 1}'], create=False), [None, None])
+
+    def test_deleted_objects_are_not_found(self):
+        url = reverse('author-detail', kwargs={'pk': self.author.pk})
+        last_modified = self.client.get(url)['Last-Modified']
+        self.author.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 404)
+
+
 class LoanedBookInstancesByUserListViewTest(TestCase):
     def setUp(self):
         test_user1 = User.objects.create_user(username='testuser1', password='drowssap1')
@@ -141,7 +600,7 @@ class LoanedBookInstancesByUserListViewTest(TestCase):
                 last_date = book.due_back
 
 
-class RenewBookInstancesViewTest(TestCase):
+class RenewBookInstancesViewTest(CommittingTestCase):
     def setUp(self):
         test_user1 = User.objects.create_user(username='testuser1', password='drowssap1')
         test_user2 = User.objects.create_user(username='testuser2', password='drowssap2')
@@ -251,7 +710,7 @@ class RenewBookInstancesViewTest(TestCase):
         self.assertFormError(response, 'form', 'renewal_date', 'Invalid date - renewal more than 4 weeks ahead')
 
 
-class AuthorCreateViewTest(TestCase):
+class AuthorCreateViewTest(CommittingTestCase):
     def test_not_logged_in(self):
         # attempt to navigate to Author creation page as an anonymous (i.e. not logged in) visitor
         response = self.client.get(reverse('author_create'))
@@ -312,3 +771,85 @@ class AuthorCreateViewTest(TestCase):
 
         # ensure correct template is used
         self.assertTemplateUsed(response, 'authors/author_detail.html')
+
+
+class BorrowedBooksQueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser1', password='drowssap1')
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        for copy_number in range(20):
+            BookInstance.objects.create(
+                book=book,
+                imprint='Imprint',
+                due_back=datetime.date.today() + datetime.timedelta(days=copy_number),
+                borrower=cls.user if copy_number % 2 else None,
+                status='o' if copy_number % 3 else 'a',
+            )
+
+    def explain(self, view_class):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        view = view_class()
+        view.setup(request)
+        queryset = view.get_queryset()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # tiny test tables are cheaper to scan, so make the planner show which index it would use
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, plan, *index_names):
+        self.assertTrue(any(name in plan for name in index_names), plan)
+
+    def test_loaned_books_by_user_uses_borrower_index(self):
+        plan = self.explain(LoanedBooksByUserListView)
+        self.assertUsesIndex(plan, 'bookinstance_borrower_idx')
+
+    def test_all_borrowed_books_uses_loan_index(self):
+        plan = self.explain(AllBorrowedBooksListView)
+        self.assertUsesIndex(plan, 'bookinstance_on_loan_idx', 'bookinstance_status_due_idx')
+
+    def test_overdue_filter_uses_loan_index(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = BookInstance.objects.overdue().order_by('due_back', 'id').explain()
+        self.assertUsesIndex(plan, 'bookinstance_on_loan_idx', 'bookinstance_status_due_idx')
+
+
+class OverdueReportViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        book = Book.objects.create(title='Book Title', summary='Summary', isbn='ABCDEFG')
+        cls.borrower = User.objects.create_user(username='borrower', password='drowssap1')
+        today = datetime.date.today()
+        for days in [-1, 2, 40]:
+            BookInstance.objects.create(
+                book=book, imprint='Imprint', status='o', due_back=today - datetime.timedelta(days=days), borrower=cls.borrower,
+            )
+        librarian = User.objects.create_user(username='librarian', password='drowssap1')
+        librarian.user_permissions.add(Permission.objects.get(codename='can_view_all_borrowed_books'))
+
+    def test_requires_permission(self):
+        self.client.login(username='borrower', password='drowssap1')
+        self.assertEqual(self.client.get(reverse('overdue-report')).status_code, 403)
+
+    def test_report(self):
+        self.client.login(username='librarian', password='drowssap1')
+        # the borrower rows, their count and the bucket counts (besides the session and user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('overdue-report'))
+        self.assertEqual(len([query for query in queries if 'catalog_bookinstance' in query['sql']]), 3)
+        self.assertEqual(response.context['num_overdue'], 2)
+        self.assertEqual(response.context['buckets'], [(1, 7, 1), (8, 30, 0), (31, 90, 1), (91, None, 0)])
+        row = response.context['borrower_list'][0]
+        self.assertEqual((row['borrower__username'], row['num_overdue'], row['max_days_overdue']), ('borrower', 2, 40))
+
+    def test_all_borrowed_books_overdue_filter(self):
+        self.client.login(username='librarian', password='drowssap1')
+        response = self.client.get(reverse('all-borrowed-books'))
+        self.assertEqual([copy.is_overdue for copy in response.context['bookinstance_list']], [True, True, False])
+        response = self.client.get(reverse('all-borrowed-books') + '?overdue=1')
+        self.assertEqual(len(response.context['bookinstance_list']), 2)
+        self.assertContains(response, 'Show all')
@@ -0,0 +1,46 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.test import TransactionTestCase
+from django.urls import get_resolver
+from django.utils.translation import get_language
+
+from catalog.warmup import STEPS, warm_up
+
+
+# a TransactionTestCase, as the warm-up closes the database connections
+class WarmUpTest(TransactionTestCase):
+    def test_runs_every_step(self):
+        timings = warm_up()
+
+        self.assertEqual([name for name, _, _ in timings], [name for name, _ in STEPS])
+        counts = {name: count for name, count, _ in timings}
+        self.assertGreater(counts['templates'], 10)
+        self.assertGreater(counts['form templates'], 10)
+        self.assertGreater(counts['URL resolvers'], 30)
+        self.assertTrue(all(seconds >= 0 for _, _, seconds in timings))
+
+    def test_compiles_templates_and_populates_resolvers(self):
+        warm_up()
+
+        loader = engines['django'].engine.template_loaders[0]
+        if isinstance(loader, CachedLoader):
+            self.assertIn('index.html', loader.get_template_cache)
+            self.assertIn('registration/login.html', loader.get_template_cache)
+        # the resolver used during requests
+        self.assertIn(get_language(), get_resolver(settings.ROOT_URLCONF)._reverse_dict)
+
+    def test_closes_database_connections(self):
+        warm_up()
+        self.assertIsNone(connection.connection)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('warmup', stdout=out)
+
+        self.assertIn('URL resolvers', out.getvalue())
+        self.assertIn('Warmed up in', out.getvalue())
@@ -0,0 +1,22 @@
+from unittest import mock
+
+from django.test import TestCase
+
+
+class CommittingTestCase(TestCase):
+    """A TestCase running the transaction.on_commit() callbacks as soon as they are registered.
+
+    TestCase runs every test in a transaction that is rolled back, so the callbacks would never run
+    otherwise, and the changes made by the tests would not invalidate the caches (see catalog/cache.py).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls._on_commit = mock.patch('django.db.transaction.on_commit', lambda func, using=None: func())
+        cls._on_commit.start()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._on_commit.stop()
@@ -1,15 +1,26 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path("", views.index, name="index"),
     path("books/", views.BookListView.as_view(), name="books"),
     path("book/<int:pk>", views.BookDetailView.as_view(), name="book-detail"),
     path("authors/", views.AuthorListView.as_view(), name="authors"),
+    path("search/", views.search, name="search"),
     path("author/<int:pk>", views.AuthorDetailView.as_view(), name="author-detail"),
     path("mybooks/", views.LoanedBooksByUserListView.as_view(), name="my-borrowed"),
     path("all-borrowed-books/", views.AllBorrowedBooksListView.as_view(), name="all-borrowed-books"),
+    path("overdue/", views.OverdueReportView.as_view(), name="overdue-report"),
+    path("export/<str:dataset>.<str:file_format>", views.export, name="export"),
     path("book/<uuid:pk>/renew/", views.renew_book_librarian, name="renew-book-librarian"),
+    path("circulation/", views.circulation_desk, name="circulation-desk"),
+    path("api/books/", api.book_list, name="api-books"),
+    path("api/book/<int:pk>", api.book_detail, name="api-book-detail"),
+    path("api/book/<int:pk>/availability", api.book_availability, name="api-book-availability"),
+    path("api/authors/", api.author_list, name="api-authors"),
+    path("api/author/<int:pk>", api.author_detail, name="api-author-detail"),
+    path("api/circulation/checkout/", api.checkout, name="api-checkout"),
+    path("api/circulation/return/", api.checkin, name="api-return"),
     path("author/create/", views.AuthorCreate.as_view(), name="author_create"),
     path("author/<int:pk>/update/", views.AuthorUpdate.as_view(), name="author_update"),
     path("author/<int:pk>/delete/", views.AuthorDelete.as_view(), name="author_delete"),
@@ -1,59 +1,176 @@
-from .forms import RenewBookForm
+from .forms import BatchCirculationForm, RenewBookForm
+from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.http import HttpResponseRedirect
-from django.shortcuts import render, get_object_or_404
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
 from django.urls import reverse, reverse_lazy
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext as _
 from django.views import generic
+from django.views.decorators.cache import never_cache
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
-from .models import Book, Author, BookInstance, Genre
+from .cache import PageCacheMixin, add_versions, fragment_timeout, get_book_version
+from .circulation import renew_copies, return_copies
+from .conditional import ConditionalGetMixin
+from .exports import DATASETS, FORMATS, export_rows
+from .instrumentation import query_budget
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
+from .models import Book, Author, BookInstance, CatalogStatistics
+from .pagination import InvalidCursor, KeysetPaginationMixin
+from .replicas import read_from_primary, replica_reads
+from .search import search_books
+from .visits import count_visit, set_visits_cookie
 
 import datetime
 
 # Create your views here.
 
+# query_budget is the most queries a view should run per request, counting the session and user lookups
+# (see catalog/instrumentation.py). The list and detail views, and the function views marked with
+# @replica_reads, read the catalog from a replica database when there is one (see catalog/replicas.py).
 
-class AuthorListView(generic.ListView):
+
+class AuthorListView(ConditionalGetMixin, PageCacheMixin, KeysetPaginationMixin, generic.ListView):
     model = Author
     template_name = "authors/author_list.html"
     paginate_by = 10
+    keyset = ("last_name", "first_name", "id")
+    page_cache_versions = ("authors",)
+    watermark_versions = ("authors",)
+    query_budget = 4
 
 
-class AuthorDetailView(generic.DetailView):
+class AuthorDetailView(ConditionalGetMixin, PageCacheMixin, generic.DetailView):
     model = Author
     template_name = "authors/author_detail.html"
+    page_cache_versions = ("author:{pk}",)
+    watermark_versions = ("author:{pk}",)
+    query_budget = 7
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # fetch the author's books and their available copy counts in a single query
+        context["books"] = self.object.book_set.with_num_available_copies()
+        return context
 
 
-class BookListView(generic.ListView):
+class BookListView(ConditionalGetMixin, PageCacheMixin, KeysetPaginationMixin, generic.ListView):
     model = Book
     context_object_name = "my_book_list"  # your own name for the list as a template variable
     template_name = "books/book_list.html"  # Specify your own template name / location
     paginate_by = 10
+    keyset = ("id",)
+    page_cache_versions = ("books",)
+    watermark_versions = ("books",)
+    query_budget = 6
 
+    def get_queryset(self):
+        return Book.objects.for_list().order_by(*self.keyset)
 
-class BookDetailView(generic.DetailView):
+
+class BookDetailView(ConditionalGetMixin, PageCacheMixin, generic.DetailView):
     model = Book
     template_name = "books/book_detail.html"
+    page_cache_versions = ("book:{pk}",)
+    watermark_versions = ("book:{pk}",)
+    query_budget = 8
 
-
-class LoanedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+    def get_queryset(self):
+        return Book.objects.for_detail()
+
+    def get_object(self, queryset=None):
+        # the book is only loaded if a cached fragment of the template has to be rendered again, from the
+        # primary as the fragments are cached for every visitor
+        def load():
+            read_from_primary()
+            return super(BookDetailView, self).get_object(queryset)
+
+        return SimpleLazyObject(load)
+
+    def get_context_data(self, **kwargs):
+        # skip SingleObjectMixin.get_context_data(), which would load the book to name the context variable
+        book_pk = self.kwargs[self.pk_url_kwarg]
+        book_version = get_book_version(book_pk, create=False)
+        if book_version is None:
+            # the book only gets a token once it has been found
+            read_from_primary()
+            if not self.object_exists():
+                raise Http404(_("No %(verbose_name)s found matching the query") % {"verbose_name": Book._meta.verbose_name})
+            book_version = (add_versions(self.request, [f"book:{book_pk}"], [None]) or [get_book_version(book_pk)])[0]
+        kwargs.update({
+            "object": self.object,
+            "book": self.object,
+            "book_pk": book_pk,
+            "book_version": book_version,
+            "fragment_timeout": fragment_timeout(),
+        })
+        return generic.base.ContextMixin.get_context_data(self, **kwargs)
+
+
+class LoanedBooksByUserListView(LoginRequiredMixin, ConditionalGetMixin, KeysetPaginationMixin, generic.ListView):
     """Generic class-based view listing books on loan to current user."""
     model = BookInstance
     template_name = "users/bookinstance_list_borrowed_user.html"
     paginate_by = 10
+    keyset = ("due_back", "id")
+    watermark_versions = ("loans",)
+    watermark_daily = True
+    query_budget = 6
 
     def get_queryset(self):
-        return BookInstance.objects.filter(borrower=self.request.user).filter(status__exact='o')
+        return (
+            BookInstance.objects.filter(borrower=self.request.user).on_loan().with_overdue()
+            .select_related("book").order_by(*self.keyset)
+        )
 
 
-class AllBorrowedBooksListView(PermissionRequiredMixin, generic.ListView):
+class AllBorrowedBooksListView(PermissionRequiredMixin, ConditionalGetMixin, KeysetPaginationMixin, generic.ListView):
     model = BookInstance
     template_name = "books/all_borrowed_books.html"
     paginate_by = 10
     permission_required = 'catalog.can_view_all_borrowed_books'
+    keyset = ("due_back", "id")
+    watermark_versions = ("loans",)
+    watermark_daily = True
+    query_budget = 6
+
+    def get_queryset(self):
+        copies = BookInstance.objects.on_loan()
+        if self.request.GET.get("overdue"):
+            copies = copies.overdue()
+        return copies.with_overdue().select_related("book", "borrower").order_by(*self.keyset)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["overdue_only"] = bool(self.request.GET.get("overdue"))
+        return context
+
+
+class OverdueReportView(PermissionRequiredMixin, generic.ListView):
+    """Lists the borrowers of overdue copies, with the overdue copies counted by days overdue."""
+    template_name = "books/overdue_report.html"
+    context_object_name = "borrower_list"
+    paginate_by = 50
+    permission_required = 'catalog.can_view_all_borrowed_books'
+    query_budget = 7
 
     def get_queryset(self):
-        return BookInstance.objects.filter(status__exact='o')
+        self.today = datetime.date.today()
+        return BookInstance.objects.overdue_by_borrower(self.today)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        for row in context["borrower_list"]:
+            row["max_days_overdue"] = (self.today - row["earliest_due_back"]).days
+        buckets = BookInstance.objects.overdue_buckets(self.today)
+        context["buckets"] = buckets
+        context["num_overdue"] = sum(count for _, _, count in buckets)
+        return context
 
 
 class AuthorCreate(PermissionRequiredMixin, CreateView):
@@ -93,41 +210,75 @@ class BookDelete(PermissionRequiredMixin, DeleteView):
     permission_required = 'catalog.can_view_all_borrowed_books'
 
 
+@replica_reads
+@query_budget(5)
 def index(request):
     """View function for home page of site."""
 
-    num_fantasy_genres = Genre.objects.filter(name__icontains="fantasy").count()
-    num_book_titles_containing_code = Book.objects.filter(title__icontains="code").count()
-
-    # Generate counts of some of the main objects
-    num_books = Book.objects.all().count()
-    num_instances = BookInstance.objects.all().count()
+    # The record counts are kept up to date by signals (see catalog/signals.py), so this is a single read
+    stats = CatalogStatistics.load()
 
-    # Available books (status = "a")
-    num_instances_available = BookInstance.objects.filter(status__exact="a").count()
+    # Number of visits to this view, as counted in a signed cookie (buffered in memory rather than saved to the session).
+    visitor_id, num_visits = count_visit(request)
 
-    # The "all()" is implied by default
-    num_authors = Author.objects.count()
+    context = {
+        "num_books": stats.num_books,
+        "num_instances": stats.num_instances,
+        "num_instances_available": stats.num_instances_available,
+        "num_authors": stats.num_authors,
+        "num_fantasy_genres": stats.num_fantasy_genres,
+        "num_book_titles_containing_code": stats.num_book_titles_containing_code,
+        "num_visits": num_visits,
+    }
 
-    # Number of visits to this view, as counted in the session variable.
-    num_visits = request.session.get('num_visits', 1)  # Get the value of the num_visits session key, setting the value to 1 if it has not previously been set.
-    request.session['num_visits'] = num_visits + 1
+    # Render the HTML template index.html with the data in the context variable (a TemplateResponse, so that
+    # the instrumentation middleware can time the rendering)
+    response = TemplateResponse(request, "index.html", context=context)
+    set_visits_cookie(response, visitor_id, num_visits + 1)
+    return response
+
+
+@replica_reads
+@query_budget(2)
+def search(request):
+    """View function for searching the catalog by title, summary, author and genre."""
+    query = request.GET.get("q", "").strip()
+    page = None
+
+    if query:
+        try:
+            page = search_books(query, per_page=10, cursor=request.GET.get("cursor"))
+        except InvalidCursor:
+            raise Http404(_("Invalid cursor"))
+        if page.next_cursor:
+            querystring = request.GET.copy()
+            querystring["cursor"] = page.next_cursor
+            page.next_querystring = querystring.urlencode()
 
     context = {
-        "num_books": num_books,
-        "num_instances": num_instances,
-        "num_instances_available": num_instances_available,
-        "num_authors": num_authors,
-        "num_fantasy_genres": num_fantasy_genres,
-        "num_book_titles_containing_code": num_book_titles_containing_code,
-        "num_visits": num_visits,
+        "query": query,
+        "book_list": page.object_list if page else [],
+        "page_obj": page,
+        "is_paginated": page is not None and page.has_other_pages(),
     }
 
-    # Render the HTML template index.html with the data in the context variable
-    return render(request, "index.html", context=context)
+    return TemplateResponse(request, "books/search_results.html", context)
+
+
+@permission_required("catalog.can_view_all_borrowed_books")
+@query_budget(4)
+def export(request, dataset, file_format):
+    """View function streaming a catalog dataset (see catalog/exports.py) as CSV or JSON Lines."""
+    if dataset not in DATASETS or file_format not in FORMATS:
+        raise Http404(_("Unknown export"))
+
+    response = StreamingHttpResponse(export_rows(dataset, file_format), content_type=FORMATS[file_format])
+    response["Content-Disposition"] = f'attachment; filename="{dataset}.{file_format}"'
+    return response
 
 
 @permission_required("catalog.can_mark_returned")
+@query_budget(12)
 def renew_book_librarian(request, pk):
     """View function for a librarian to renew a specific BookInstance."""
     book_instance = get_object_or_404(BookInstance, pk=pk)
@@ -157,4 +308,50 @@ def renew_book_librarian(request, pk):
         "book_instance": book_instance,
     }
 
-    return render(request, "books/book_renew_librarian.html", context)
\ No newline at end of file
+    return TemplateResponse(request, "books/book_renew_librarian.html", context)
+
+
+@permission_required("catalog.can_mark_returned")
+def circulation_desk(request):
+    """View function for a librarian to renew or return several copies at once."""
+    if request.method == 'POST':
+        form = BatchCirculationForm(request.POST)
+
+        if form.is_valid():
+            copy_ids = form.cleaned_data["copies"]
+            if form.cleaned_data["action"] == BatchCirculationForm.RENEW:
+                results = renew_copies(copy_ids, form.cleaned_data["renewal_date"])
+            else:
+                results = return_copies(copy_ids)
+
+            # the outcomes are shown after the redirect, so that reloading the page does not submit again
+            num_succeeded = sum(result.succeeded for result in results)
+            messages.info(request, f"{num_succeeded} of {len(results)} copies processed.")
+            for result in results:
+                title = f" ({result.title})" if result.title else ""
+                level = messages.SUCCESS if result.succeeded else messages.ERROR
+                messages.add_message(request, level, f"{result.copy_id}{title}: {result.outcome}")
+            return HttpResponseRedirect(reverse("circulation-desk"))
+
+    else:
+        proposed_renewal_date = datetime.date.today() + datetime.timedelta(weeks=3)
+        form = BatchCirculationForm(initial={"renewal_date": proposed_renewal_date})
+
+    context = {
+        "form": form,
+    }
+
+    return TemplateResponse(request, "books/circulation_desk.html", context)
+
+
+@never_cache
+def metrics(request):
+    """View function serving the request metrics of all the worker processes in the Prometheus text format.
+
+    Open to staff users, and to scrapers sending the CATALOG_METRICS_TOKEN setting as a bearer token.
+    """
+    token = getattr(settings, "CATALOG_METRICS_TOKEN", None)
+    authorization = request.META.get("HTTP_AUTHORIZATION", "")
+    if not (request.user.is_staff or (token and constant_time_compare(authorization, f"Bearer {token}"))):
+        raise PermissionDenied
+    return HttpResponse(render_metrics(), content_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,138 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+VISITS_COOKIE_NAME = "num_visits"
+VISITS_COOKIE_SALT = "catalog.visits"
+
+
+def read_visits_cookie(request):
+    """Returns the (visitor id, number of visits) stored in the signed visits cookie, or (None, None)."""
+    try:
+        value = request.get_signed_cookie(VISITS_COOKIE_NAME, salt=VISITS_COOKIE_SALT)
+        visitor_id, num_visits = value.split(":")
+        return visitor_id, int(num_visits)
+    except (KeyError, ValueError, signing.BadSignature):
+        return None, None
+
+
+def set_visits_cookie(response, visitor_id, num_visits):
+    """Stores the visitor id and number of visits in the signed visits cookie."""
+    response.set_signed_cookie(
+        VISITS_COOKIE_NAME,
+        f"{visitor_id}:{num_visits}",
+        salt=VISITS_COOKIE_SALT,
+        max_age=settings.SESSION_COOKIE_AGE,
+        httponly=True,
+    )
+
+
+def count_visit(request):
+    """Counts a visit without touching the database.
+
+    The running total lives in a signed cookie and the increment is buffered in memory until the
+    buffer is flushed to the VisitCount table. Anonymous visitors are only stored once they send the cookie
+    back, so that clients ignoring cookies (e.g. bots) do not add a row per request. Returns (visitor id,
+    number of visits before this one).
+    """
+    visitor_id, num_visits = read_visits_cookie(request)
+    returning = visitor_id is not None
+    if not returning:
+        visitor_id = uuid.uuid4().hex
+        # carry over the count of visitors who were counted in their session before
+        num_visits = 1
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            num_visits = request.session.get("num_visits", 1)
+
+    if request.user.is_authenticated:
+        visit_buffer.record(f"user:{request.user.pk}", user_id=request.user.pk)
+    elif returning:
+        visit_buffer.record(f"visitor:{visitor_id}")
+
+    return visitor_id, num_visits
+
+
+class VisitBuffer:
+    """In-memory buffer of visit increments, flushed to the VisitCount table in batches."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, key, user_id=None):
+        with self._lock:
+            count, _ = self._pending.get(key, (0, None))
+            self._pending[key] = (count + 1, user_id)
+
+    def pending(self):
+        """Returns the number of buffered visits."""
+        with self._lock:
+            return sum(count for count, _ in self._pending.values())
+
+    def is_due(self):
+        threshold = getattr(settings, "VISIT_FLUSH_THRESHOLD", 100)
+        interval = getattr(settings, "VISIT_FLUSH_INTERVAL", 60)
+        with self._lock:
+            if not self._pending:
+                return False
+            return len(self._pending) >= threshold or time.monotonic() - self._last_flush >= interval
+
+    def flush(self):
+        """Writes the buffered increments to the database and empties the buffer.
+
+        Should the write fail, the increments are put back in the buffer for the next flush.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+
+        try:
+            self._write(pending)
+        except Exception:
+            with self._lock:
+                for key, (count, user_id) in pending.items():
+                    buffered, _ = self._pending.get(key, (0, None))
+                    self._pending[key] = (buffered + count, user_id)
+            raise
+
+    @staticmethod
+    def _write(pending):
+        from django.contrib.auth.models import User
+
+        from .models import VisitCount
+
+        now = timezone.now()
+        with transaction.atomic():
+            # the visits of users deleted since are dropped, like the counts of their earlier visits
+            user_ids = {user_id for _, user_id in pending.values() if user_id is not None}
+            deleted_user_ids = user_ids - set(User.objects.filter(pk__in=user_ids).values_list("pk", flat=True))
+            pending = {key: value for key, value in pending.items() if value[1] not in deleted_user_ids}
+
+            # create the missing rows, then increment every row: a row created by another process in between
+            # is incremented like the others
+            existing = set(VisitCount.objects.filter(key__in=pending).values_list("key", flat=True))
+            VisitCount.objects.bulk_create(
+                [VisitCount(key=key, user_id=user_id) for key, (_, user_id) in pending.items() if key not in existing],
+                ignore_conflicts=True,
+            )
+            keys_by_count = {}
+            for key, (count, _) in pending.items():
+                keys_by_count.setdefault(count, []).append(key)
+            for count, keys in keys_by_count.items():
+                VisitCount.objects.filter(key__in=keys).update(count=F("count") + count, last_visit=now)
+
+    def flush_if_due(self):
+        if self.is_due():
+            self.flush()
+
+
+visit_buffer = VisitBuffer()
@@ -0,0 +1,150 @@
+import logging
+import os
+import time
+from importlib import import_module
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_backends
+from django.contrib.auth.hashers import get_hashers
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db import connections
+from django.forms.renderers import get_default_renderer
+from django.template import TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+from django.urls import URLResolver, get_resolver
+from django.utils import formats, translation
+from django.utils.module_loading import import_string
+
+from .assets import critical_css
+
+# Warm-up of a server process before it handles requests.
+#
+# Django initializes a lot lazily: templates are compiled when first rendered (and kept by the cached loader,
+# which Django uses when DEBUG is off), URL resolvers are populated on the first resolve() or reverse(), and
+# content types, model metadata, translations and the backends named by settings are loaded when first
+# needed. warm_up() does all of it at once, so that it is done in the gunicorn master before the workers are
+# forked (see gunicorn.conf.py): the workers then start warm, share the memory of what was loaded
+# copy-on-write, and their first requests are as fast as the next ones. The duration of each step is logged,
+# and printed by the warmup management command, so that a step getting slower shows up.
+
+logger = logging.getLogger("catalog.warmup")
+
+TEMPLATE_EXTENSIONS = (".html", ".txt")
+
+
+def _template_names(directory):
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith(TEMPLATE_EXTENSIONS):
+                yield os.path.relpath(os.path.join(root, name), directory).replace(os.sep, "/")
+
+
+def _compile_templates(engine, prefix=""):
+    """Compiles the templates of a Django template engine (named prefix...), returning how many there are."""
+    names = {name for directory in engine.template_dirs for name in _template_names(directory) if name.startswith(prefix)}
+    for name in sorted(names):
+        try:
+            engine.get_template(name)
+        except TemplateSyntaxError as error:
+            # e.g. a template of an app that is not installed; it would fail when rendered anyway
+            logger.warning("Could not compile %s: %s", name, error)
+    return len(names)
+
+
+def compile_templates():
+    return sum(_compile_templates(engine) for engine in engines.all() if isinstance(engine, DjangoTemplates))
+
+
+def compile_form_templates():
+    renderer = get_default_renderer()
+    # the widget templates, rendered by an engine of their own
+    if not isinstance(getattr(renderer, "engine", None), DjangoTemplates):
+        return 0
+    return _compile_templates(renderer.engine, prefix="django/forms/")
+
+
+def _populate(resolver):
+    # reverse_dict populates the resolver; namespaced includes have their own
+    resolver.reverse_dict
+    count = 0
+    for pattern in resolver.url_patterns:
+        count += _populate(pattern) if isinstance(pattern, URLResolver) else 1
+    return count
+
+
+def populate_url_resolvers():
+    # get_resolver() caches a resolver per argument: None outside of requests, the URLconf during requests
+    return sum(_populate(get_resolver(urlconf)) for urlconf in (None, settings.ROOT_URLCONF))
+
+
+def load_models():
+    models = apps.get_models()
+    for model in models:
+        model._meta.get_fields()
+    ContentType.objects.get_for_models(*models)
+    return len(models)
+
+
+def import_lazily_imported_modules():
+    # the backends named by settings are imported on first use
+    import_module(settings.SESSION_ENGINE)
+    for name in (settings.MESSAGE_STORAGE, settings.SESSION_SERIALIZER):
+        import_string(name)
+    backends = get_backends()
+    hashers = get_hashers()
+    context_processors = [
+        engine.engine.template_context_processors for engine in engines.all() if isinstance(engine, DjangoTemplates)
+    ]
+    return 3 + len(backends) + len(hashers) + sum(map(len, context_processors))
+
+
+def load_translations():
+    with translation.override(settings.LANGUAGE_CODE):
+        translation.gettext("")
+        # the localized number and date formats
+        formats.get_format("DATE_FORMAT")
+        formats.number_format(0)
+    return 1
+
+
+def load_static_manifest():
+    # the manifest of hashed file names is read when the storage is first used
+    staticfiles_storage.base_url
+    return len(getattr(staticfiles_storage, "hashed_files", {}))
+
+
+def load_critical_css():
+    # inlined in every page by {% stylesheets %}
+    critical_css()
+    return 1
+
+
+STEPS = (
+    ("templates", compile_templates),
+    ("form templates", compile_form_templates),
+    ("URL resolvers", populate_url_resolvers),
+    ("models and content types", load_models),
+    ("lazily imported modules", import_lazily_imported_modules),
+    ("translations", load_translations),
+    ("static files manifest", load_static_manifest),
+    ("critical CSS", load_critical_css),
+)
+
+
+def warm_up():
+    """Runs the warm-up steps, returning (step, number of items, seconds) for each of them.
+
+    The database connections opened on the way are closed, so that forked processes do not share them.
+    """
+    timings = []
+    try:
+        for name, step in STEPS:
+            started = time.perf_counter()
+            count = step()
+            timings.append((name, count, time.perf_counter() - started))
+            logger.info("Warm-up: %s (%d) in %.1fms", name, count, timings[-1][2] * 1000)
+    finally:
+        connections.close_all()
+    return timings
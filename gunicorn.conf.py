@@ -0,0 +1,54 @@
+"""Gunicorn settings, see https://docs.gunicorn.org/en/stable/settings.html
+
+The application is loaded and warmed up (see catalog/warmup.py) once, in the master process, and the workers
+are forked from it: they start without first-request costs, also when a worker is replaced, and share the
+memory of the loaded code and compiled templates with the master.
+"""
+import gc
+
+preload_app = True
+
+
+def when_ready(server):
+    # runs in the master, after the application is loaded and before the first worker is forked
+    from catalog import metrics
+    from catalog.warmup import warm_up
+
+    # the request metrics of the previous run
+    metrics.clear()
+    timings = warm_up()
+    server.log.info("Warmed up in %.0fms: %s", sum(seconds for _, _, seconds in timings) * 1000, ", ".join(
+        f"{name} {seconds * 1000:.0f}ms" for name, _, seconds in timings
+    ))
+    # move everything allocated so far out of reach of the garbage collector, whose bookkeeping would
+    # otherwise write to (and so copy) the shared memory pages in every worker
+    gc.freeze()
+
+
+def pre_fork(server, worker):
+    from django.db import connections
+
+    # a connection must never be shared by several processes
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    from django.db import DatabaseError, connection
+
+    # connect before accepting requests rather than during the first one
+    try:
+        connection.ensure_connection()
+    except DatabaseError as error:
+        worker.log.warning("Could not connect to the database: %s", error)
+
+
+def worker_exit(server, worker):
+    # runs in the worker as it exits, with the visits it has not written yet (see catalog/visits.py)
+    from django.db import DatabaseError
+
+    from catalog.visits import visit_buffer
+
+    try:
+        visit_buffer.flush()
+    except DatabaseError as error:
+        worker.log.warning("Could not write the buffered visits: %s", error)
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import dj_database_url
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -44,7 +45,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'catalog.instrumentation.InstrumentationMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'catalog.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -83,6 +86,97 @@ DATABASES = {}
 # parses the DATABASE_URL environment variable
 db_from_env = dj_database_url.config(conn_max_age=500)  # conn_max_age=500 makes the connection persistent
 DATABASES.update({'default': db_from_env})
+if DATABASES['default'].get('ENGINE') == 'django.db.backends.sqlite3':
+    # test on a file rather than in memory: shared in-memory SQLite databases fail concurrent writes from
+    # several threads (e.g. the checkout concurrency test) instead of waiting for their turn. One file per
+    # process, so that test runs of several checkouts (or CI jobs) on the same machine do not share it
+    DATABASES['default']['TEST'] = {
+        'NAME': os.path.join(tempfile.gettempdir(), 'locallibrary_test_{}.sqlite3'.format(os.getpid())),
+    }
+
+# Read replicas of the default database, from DATABASE_REPLICA_URLS (space separated, like DJANGO_ALLOWED_HOSTS).
+# The catalog pages read from them, and writes go to the default database (see catalog/replicas.py)
+CATALOG_REPLICA_DATABASES = []
+for number, url in enumerate(os.environ.get('DATABASE_REPLICA_URLS', '').split(), start=1):
+    alias = 'replica{}'.format(number)
+    DATABASES[alias] = dj_database_url.parse(url, conn_max_age=500)
+    # the tests only create the test database of default
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    CATALOG_REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['catalog.replicas.ReplicaRouter']
+
+# Seconds for which a user reads from the default database after writing, so that they see their changes
+CATALOG_READ_YOUR_WRITES_SECONDS = 15
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+# The catalog invalidates cached pages by replacing version tokens, so every worker process must share the
+# same cache: by default a file-based cache on the local disk, or e.g. memcached on deployments with several
+# hosts (DJANGO_CACHE_BACKEND=django.core.cache.backends.memcached.PyLibMCCache DJANGO_CACHE_LOCATION=host:11211)
+if 'DJANGO_CACHE_BACKEND' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': os.environ['DJANGO_CACHE_BACKEND'],
+            'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', ''),
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'locallibrary_cache')),
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000,
+            },
+        },
+    }
+
+# Seconds for which rendered fragments of the book detail pages are kept
+CATALOG_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Seconds for which whole catalog pages are kept for anonymous visitors
+CATALOG_PAGE_CACHE_TIMEOUT = 10 * 60
+
+# Seconds for which the permissions of a user are kept (see catalog/permissions.py)
+CATALOG_PERMISSIONS_CACHE_TIMEOUT = 60 * 60
+
+
+# Request instrumentation (see catalog/instrumentation.py)
+
+# Share of the requests logged with their query counts and timings; slow requests are always logged
+CATALOG_INSTRUMENTATION_SAMPLE_RATE = 0.01
+CATALOG_SLOW_REQUEST_MS = 500
+
+# Send the query counts and timings in a Server-Timing header; staff users always get it
+CATALOG_SERVER_TIMING = DEBUG
+
+# Fail requests running more queries than their view's query_budget (set by locallibrary/test_settings.py)
+CATALOG_ENFORCE_QUERY_BUDGETS = False
+
+# Directory of the per-worker metrics files served at /metrics (see catalog/metrics.py), to staff users and
+# to scrapers sending "Authorization: Bearer <CATALOG_METRICS_TOKEN>"
+CATALOG_METRICS_DIR = os.environ.get('CATALOG_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'locallibrary_metrics'))
+CATALOG_METRICS_TOKEN = os.environ.get('CATALOG_METRICS_TOKEN')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'catalog.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
 
 
 # Password validation
@@ -103,6 +197,9 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# ModelBackend, with the permissions of each user cached between requests
+AUTHENTICATION_BACKENDS = ['catalog.permissions.CachedPermissionsBackend']
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
@@ -128,6 +225,22 @@ STATIC_URL = '/static/'
 
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+STATICFILES_FINDERS = [
+    'django.contrib.staticfiles.finders.FileSystemFinder',
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+    # css/site.css and css/critical.css, built from CATALOG_STYLESHEETS (see catalog/assets.py)
+    'catalog.assets.StylesheetFinder',
+]
+
+# Stylesheets bundled into css/site.css, without the rules for classes the templates do not use
+CATALOG_STYLESHEETS = ['vendor/bootstrap-4.1.3/css/bootstrap.min.css', 'css/styles.css']
+
+# Templates whose layout is styled by the CSS inlined in every page
+CATALOG_CRITICAL_TEMPLATES = ['base_generic.html']
+
+# Classes to keep although they are not in the class attributes of the templates
+CATALOG_CSS_SAFELIST = []
+
 # Redirect to home URL after login (default redirects to /accounts/profile/)
 LOGIN_REDIRECT_URL = '/'
 
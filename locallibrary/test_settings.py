@@ -0,0 +1,30 @@
+"""
+Django settings for running the tests of locallibrary: "python manage.py test" uses them (see manage.py), and
+so does pytest, with pytest-django (see pytest.ini).
+"""
+
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+# Test cases keep their data in a transaction of the default connection, which a replica would not see
+CATALOG_REPLICA_DATABASES = []
+
+CATALOG_INSTRUMENTATION_SAMPLE_RATE = 0
+CATALOG_SERVER_TIMING = True
+
+# Fail requests running more queries than their view's query_budget, so that the tests catch N+1 queries
+CATALOG_ENFORCE_QUERY_BUDGETS = True
+
+# A cache of the test process only: the tests clear it, which must not touch the cache of a server running on
+# the same host
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'locallibrary-tests',
+    },
+}
+
+# Worker files of the test process only: metrics.clear() removes every worker file of the directory
+CATALOG_METRICS_DIR = os.path.join(tempfile.gettempdir(), f'locallibrary_test_metrics_{os.getpid()}')
@@ -18,6 +18,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.contrib.auth import views
 
+from catalog.views import metrics
+
 from django.urls import path
 from django.urls import include
 
@@ -28,4 +30,5 @@ urlpatterns = [
     path('catalog/', include('catalog.urls')),
     path('', RedirectView.as_view(url='/catalog/', permanent=True)),  # '' implies a forward slash, /
     path('accounts/', include('django.contrib.auth.urls')),  # bug when logging out of admin site: https://code.djangoproject.com/ticket/20372#no1
+    path('metrics', metrics, name='metrics'),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
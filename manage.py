@@ -5,7 +5,9 @@ import sys
 
 
 def main():
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'locallibrary.settings')
+    # the tests run with settings of their own
+    settings_module = 'locallibrary.test_settings' if sys.argv[1:2] == ['test'] else 'locallibrary.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc: